@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+"""
+Benchmarks for the heat solver on the crucible problem.
+"""
+from __future__ import print_function
+
+import os
+import tempfile
+import time
+
+from dolfin import Constant, Expression, Measure, interpolate, project
+
+import maelstrom
+
+import problems
+
+
+def _convective_heat(problem, convection_solver, supg_preconditioner=False):
+    material = problem.subdomain_materials[problem.wpi]
+    # Some swirl in the melt of a magnitude typical for the driven flow
+    convection = Expression(
+        ("-0.05 * (x[1] - 0.388)", "0.05 * x[0]"), degree=1, domain=problem.Q.mesh()
+    )
+    return maelstrom.heat.Heat(
+        problem.Q,
+        kappa=material.thermal_conductivity,
+        rho=material.density(1550.0),
+        cp=material.specific_heat_capacity,
+        convection=convection,
+        source=Constant(0.0),
+        dirichlet_bcs=problem.theta_bcs_d,
+        neumann_bcs=problem.theta_bcs_n,
+        my_ds=Measure("ds")(subdomain_data=problem.wp_boundaries),
+        convection_solver=convection_solver,
+        supg_preconditioner=supg_preconditioner,
+    )
+
+
+def convection_solvers(num_steps=10, dt=1.0e-1):
+    """Compare the LU path with GMRES+AMG for implicit Euler steps of the
+    convective heat equation.
+    """
+    problem = problems.Crucible()
+    theta0 = project(Constant(1550.0), problem.Q)
+
+    print("Number of dofs: {}".format(problem.Q.dim()))
+    print()
+    print("solver          setup [s]  per step [s]  iterations")
+    for solver, supg_pc in [
+        ("lu", False),
+        ("amg", False),
+        ("amg", True),
+        ("air", False),
+    ]:
+        heat = _convective_heat(problem, solver, supg_pc)
+        theta = interpolate(theta0, problem.Q)
+
+        # The first solve includes the factorization or AMG setup.
+        t = time.time()
+        b = heat.M * theta.vector()
+        theta.assign(heat.solve_alpha_M_beta_F(1.0, -dt, b, 0.0))
+        setup = time.time() - t
+
+        t = time.time()
+        for _ in range(num_steps):
+            b = heat.M * theta.vector()
+            theta.assign(heat.solve_alpha_M_beta_F(1.0, -dt, b, 0.0))
+        per_step = (time.time() - t) / num_steps
+
+        # A fallback to LU is reported, too.
+        name = heat.convection_solver + (" (supg pc)" if supg_pc else "")
+        print(
+            "{:14s}  {:9.3e}  {:12.3e}  {}".format(
+                name, setup, per_step, heat.iteration_counts
+            )
+        )
+    return
+
+
+def _vector_creations():
+    """The number of PETSc vectors created so far, from the PETSc object log
+    (cf. :code:`-log_view`). This includes the temporaries created in C++,
+    e.g., by :code:`M * u`, :code:`assemble`, or the solvers.
+    """
+    from petsc4py import PETSc
+
+    # Only objects created after the start of logging are counted.
+    PETSc.Log.begin()
+    handle, filename = tempfile.mkstemp(suffix=".log")
+    os.close(handle)
+    try:
+        viewer = PETSc.Viewer().createASCII(filename, comm=PETSc.COMM_SELF)
+        PETSc.Log.view(viewer)
+        viewer.destroy()
+        with open(filename) as f:
+            lines = f.readlines()
+    finally:
+        os.remove(filename)
+
+    # Rows of the object table read
+    #
+    #     Vector  <creations>  <destructions>  <memory>  <descendants' memory>
+    #
+    # (one per log stage).
+    count = 0
+    for line in lines:
+        words = line.split()
+        if len(words) >= 3 and words[0] == "Vector" and words[1].isdigit():
+            count += int(words[1])
+    return count
+
+
+def count_vector_creations(fun, *args, **kwargs):
+    """Call :code:`fun(*args, **kwargs)` and count the PETSc vectors created
+    meanwhile. Returns the number of vectors and the return value of
+    :code:`fun`.
+    """
+    before = _vector_creations()
+    out = fun(*args, **kwargs)
+    return _vector_creations() - before, out
+
+
+def _count_allocations(fun, num_steps):
+    count = 0
+    for _ in range(num_steps):
+        num_vectors, _ = count_vector_creations(fun)
+        count += num_vectors
+    return float(count) / num_steps
+
+
+def allocations(num_steps=10, dt=1.0e-1):
+    """Number of vector allocations and time per implicit Euler step (one
+    evaluation of :code:`alpha*M*u + beta*F(u)` plus one solve), with
+    freshly allocated results and with the in-place variants.
+    """
+    problem = problems.Crucible()
+    heat = _convective_heat(problem, "amg")
+    theta = project(Constant(1550.0), problem.Q)
+
+    def allocating():
+        b = heat.eval_alpha_M_beta_F(1.0, 0.0, theta, 0.0)
+        theta.assign(heat.solve_alpha_M_beta_F(1.0, -dt, b, 0.0))
+        return
+
+    b = heat.b.copy()
+    theta1 = interpolate(theta, problem.Q)
+
+    def in_place():
+        heat.eval_alpha_M_beta_F(1.0, 0.0, theta, 0.0, out=b)
+        heat.solve_alpha_M_beta_F(1.0, -dt, b, 0.0, out=theta1)
+        theta.assign(theta1)
+        return
+
+    # Warm up: solver setup
+    allocating()
+
+    print("variant       allocations/step  time/step [s]")
+    for name, fun in [("allocating", allocating), ("in-place", in_place)]:
+        num_allocs = _count_allocations(fun, num_steps)
+        t = time.time()
+        for _ in range(num_steps):
+            fun()
+        per_step = (time.time() - t) / num_steps
+        print("{:12s}  {:16.1f}  {:13.3e}".format(name, num_allocs, per_step))
+    return
+
+
+if __name__ == "__main__":
+    convection_solvers()
+    allocations()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+"""
+Benchmarks for the Maxwell solver on the crucible problem.
+"""
+from __future__ import print_function
+
+import time
+
+from dolfin import FunctionSpace, Measure, SpatialCoordinate, assemble, pi
+import numpy
+
+import maelstrom.maxwell as cmx
+
+import problems
+
+
+def coil_models(omega=2 * pi * 10.0e3, voltages=(38.0, 38.0, 38.0, 25.0, 25.0)):
+    """Compare the meshed coils with skin-depth boundary layers to the coils
+    as impedance boundary conditions: number of cells and DOFs, time for mesh
+    generation and setup of the problem, time for the potential, and the
+    Joule power in the melt.
+    """
+    print("omega = 2 pi * {:.0f} Hz".format(omega / (2 * pi)))
+    print()
+    print(
+        "coil model      cells      dofs  setup [s]  solve [s]  "
+        "Joule power in melt [W]"
+    )
+    for coil_model in ["boundary_layer", "impedance"]:
+        t = time.time()
+        problem = problems.Crucible(coil_model=coil_model, omega=omega)
+        setup = time.time() - t
+
+        subdomain_indices = problem.subdomain_materials.keys()
+        mu = {
+            i: problem.subdomain_materials[i].magnetic_permeability
+            for i in subdomain_indices
+        }
+        sigma = {
+            i: problem.subdomain_materials[i].electrical_conductivity
+            for i in subdomain_indices
+        }
+        coils = [
+            {"rings": coil_domain, "c_type": "voltage", "c_value": voltage}
+            for coil_domain, voltage in zip(problem.coil_domains, voltages)
+        ]
+        ds = None
+        impedance = None
+        if coil_model == "impedance":
+            ds = Measure("ds", subdomain_data=problem.coil_boundaries)
+            impedance = problem.coil_impedance
+
+        V = FunctionSpace(problem.mesh, "CG", 1)
+        dx = Measure("dx", subdomain_data=problem.subdomains)
+        t = time.time()
+        Phi, _ = cmx.compute_potential(
+            coils,
+            V,
+            dx,
+            mu,
+            sigma,
+            omega,
+            convections={},
+            verbose=False,
+            ds=ds,
+            impedance=impedance,
+        )
+        solve = time.time() - t
+
+        # No voltage is applied to the workpiece.
+        joule = cmx.compute_joule(Phi, {}, omega, sigma, mu, [problem.wpi])
+        r = SpatialCoordinate(problem.mesh)[0]
+        power = assemble(joule[problem.wpi] * 2 * pi * r * dx(problem.wpi))
+
+        print(
+            "{:14s}  {:5d}  {:8d}  {:9.3e}  {:9.3e}  {:e}".format(
+                coil_model, problem.mesh.num_cells(), 2 * V.dim(), setup, solve, power,
+            )
+        )
+
+    # The impedance conditions are only accurate if the skin depth is small
+    # compared to the coil cross sections.
+    mu_coil, sigma_coil = list(problem.coil_impedance.values())[0]
+    delta = numpy.sqrt(2.0 / (mu_coil * sigma_coil * omega))
+    print()
+    print("Skin depth in the coils: {:e} m".format(delta))
+    return
+
+
+if __name__ == "__main__":
+    coil_models()
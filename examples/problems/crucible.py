@@ -10,6 +10,7 @@ from dolfin import (
     Mesh,
     SubMesh,
     SubDomain,
+    CompiledSubDomain,
     MeshFunction,
     DirichletBC,
     dot,
@@ -34,13 +35,41 @@ from tempfile import TemporaryDirectory
 DEBUG = False
 
 
+def _mark_coil_boundaries(mesh, first_index):
+    """Facet markers with consecutive indices, starting at
+    :code:`first_index`, for the boundaries of the coil holes.
+    """
+    boundaries = MeshFunction("size_t", mesh, mesh.topology().dim() - 1)
+    boundaries.set_all(0)
+    rectangles = meshes.crucible_with_coils.coil_rectangles()
+    for k, (xmin, xmax, ymin, ymax) in enumerate(rectangles):
+        CompiledSubDomain(
+            "on_boundary"
+            " && x[0] > xmin - eps && x[0] < xmax + eps"
+            " && x[1] > ymin - eps && x[1] < ymax + eps",
+            xmin=xmin,
+            xmax=xmax,
+            ymin=ymin,
+            ymax=ymax,
+            eps=1.0e-10,
+        ).mark(boundaries, first_index + k)
+    return boundaries
+
+
 class Crucible:
-    def __init__(self):
+    def __init__(self, coil_model="boundary_layer", omega=2 * pi * 300.0):
+        """With :code:`coil_model="impedance"`, the coils aren't meshed, but
+        given as boundaries :code:`coil_boundaries` with impedance conditions
+        for the Maxwell problem; see
+        :func:`meshes.crucible_with_coils.generate`.
+        """
 
         GMSH_EPS = 1.0e-15
 
         # https://fenicsproject.org/qa/12891/initialize-mesh-from-vertices-connectivities-at-once
-        points, cells, point_data, cell_data, _ = meshes.crucible_with_coils.generate()
+        points, cells, point_data, cell_data, _ = meshes.crucible_with_coils.generate(
+            coil_model=coil_model, omega=omega
+        )
 
         # Convert the cell data to 'uint' so we can pick a size_t MeshFunction
         # below as usual.
@@ -69,14 +98,11 @@ class Crucible:
             2: materials.argon,
             3: materials.gallium_arsenide_solid,
             4: materials.gallium_arsenide_liquid,
-            27: materials.air,
         }
 
-        # coils
-        for k in range(5, 27):
-            self.subdomain_materials[k] = my_materials.ek90
-
-        # Define the subdomains which together form a single coil.
+        # Define the subdomains (or, for impedance conditions, the
+        # boundaries) which together form a single coil.
+        self.coil_model = coil_model
         self.coil_domains = [
             [5, 6, 7, 8, 9],
             [10, 11, 12, 13, 14],
@@ -85,6 +111,24 @@ class Crucible:
             [24, 25, 26],
         ]
 
+        if coil_model == "impedance":
+            # Without the coil surfaces, air is the fifth physical surface.
+            self.subdomain_materials[5] = materials.air
+            self.coil_boundaries = _mark_coil_boundaries(self.mesh, 5)
+            # (mu, sigma) of the coils behind the impedance boundaries
+            self.coil_impedance = {
+                k: (
+                    my_materials.ek90.magnetic_permeability,
+                    my_materials.ek90.electrical_conductivity,
+                )
+                for k in range(5, 27)
+            }
+        else:
+            self.subdomain_materials[27] = materials.air
+            # coils
+            for k in range(5, 27):
+                self.subdomain_materials[k] = my_materials.ek90
+
         self.wpi = 4
 
         self.submesh_workpiece = SubMesh(self.mesh, self.subdomains, self.wpi)
@@ -453,7 +497,6 @@ class Crucible:
 
         self.background_temp = 1400.0
 
-        # self.omega = 2 * pi * 10.0e3
-        self.omega = 2 * pi * 300.0
+        self.omega = omega
 
         return
@@ -12,6 +12,37 @@ import os
 import pygmsh
 
 
+def coil_rectangles():
+    """The coil rings as rows :code:`[xmin, xmax, ymin, ymax]`.
+    """
+    # Coils to the right.
+    step = 0.0132
+    coils_right = numpy.array(
+        [[0.092, 0.107, 0.2792 + k * step, 0.2892 + k * step] for k in range(15)]
+    )
+    # coils at the bottom
+    step = 0.008
+    coils_bottom = numpy.array(
+        [[0.031 + k * step, 0.036 + k * step, 0.33, 0.354] for k in range(7)]
+    )
+    return numpy.vstack([coils_right, coils_bottom])
+
+
+def _add_coil_holes(geom, lcar_coil, z):
+    # For the impedance boundary conditions, the coils are holes in the air
+    # domain. Their interiors aren't meshed, and no boundary layers are
+    # needed.
+    line_loops = []
+    for xmin, xmax, ymin, ymax in coil_rectangles():
+        points = [
+            geom.add_point([x, y, z], lcar_coil)
+            for x, y in [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)]
+        ]
+        lines = [geom.add_line(points[k], points[(k + 1) % 4]) for k in range(4)]
+        line_loops.append(geom.add_line_loop(lines))
+    return line_loops
+
+
 def _add_coils(geom, mu0, omega, lcar_coil, z, lcar_far):
     # Coils.
     # For layer-adapted meshes for reaction-diffusion problems, check out
@@ -52,23 +83,10 @@ def _add_coils(geom, mu0, omega, lcar_coil, z, lcar_far):
     print("lcar boundary: {:f}".format(lcar_b))
     print("Coil boundary layer width: {:f}".format(w_b0))
 
-    # Coils to the right.
-    step = 0.0132
-    coils_right = numpy.array(
-        [[0.092, 0.107, 0.2792 + k * step, 0.2892 + k * step] for k in range(15)]
-    )
-    # coils at the bottom
-    step = 0.008
-    coils_bottom = numpy.array(
-        [[0.031 + k * step, 0.036 + k * step, 0.33, 0.354] for k in range(7)]
-    )
-
-    coils = numpy.vstack([coils_right, coils_bottom])
-
     line_loops = []
     fields = []
 
-    for k, data in enumerate(coils):
+    for k, data in enumerate(coil_rectangles()):
         xmin, xmax, ymin, ymax = data
         rect = geom.add_rectangle(xmin, xmax, ymin, ymax, z, lcar_coil)
         line_loops.append(rect.line_loop)
@@ -87,7 +105,7 @@ def _add_coils(geom, mu0, omega, lcar_coil, z, lcar_far):
     return line_loops, fields
 
 
-def _define():
+def _define(coil_model, omega):
     geom = pygmsh.built_in.Geometry()
 
     line_loops = []
@@ -101,10 +119,6 @@ def _define():
     lcar_gas = 4 * lcar_base
     lcar_crucible = 1.0e-1
 
-    # omega: current frequency (for boundary layer width)
-    omega = 2 * numpy.pi * 300.0
-    # omega = 2 * numpy.pi * 10.0e3;
-
     mu0 = numpy.pi * 4e-7
 
     # symmetry axis
@@ -339,9 +353,15 @@ def _define():
     )
     fields.append(b_id)
 
-    coil_ll, coil_fields = _add_coils(geom, mu0, omega, lcar_coil, z, lcar_far)
-    line_loops.extend(coil_ll)
-    fields.extend(coil_fields)
+    if coil_model == "impedance":
+        line_loops.extend(_add_coil_holes(geom, lcar_coil, z))
+    else:
+        assert coil_model == "boundary_layer", "Unknown coil model '{}'".format(
+            coil_model
+        )
+        coil_ll, coil_fields = _add_coils(geom, mu0, omega, lcar_coil, z, lcar_far)
+        line_loops.extend(coil_ll)
+        fields.extend(coil_fields)
 
     # Hold-all domain.
     r = 1.0
@@ -379,14 +399,26 @@ def _define():
     return geom
 
 
-def generate(verbose=False):
-    cache_file = "cruc_cache.msh"
+def generate(verbose=False, coil_model="boundary_layer", omega=2 * numpy.pi * 300.0):
+    """Mesh of the crucible, the coils, and the surrounding air. The boundary
+    layers are fit to the current frequency :code:`omega`.
+
+    With :code:`coil_model="boundary_layer"`, the coils are meshed with
+    boundary layers of the width of the skin depth. With
+    :code:`coil_model="impedance"`, they are holes in the mesh, to be treated
+    by impedance boundary conditions (see :class:`maelstrom.maxwell.MaxwellSystem`);
+    the coil boundaries are given by :func:`coil_rectangles`.
+    """
+    if coil_model == "boundary_layer" and omega == 2 * numpy.pi * 300.0:
+        cache_file = "cruc_cache.msh"
+    else:
+        cache_file = "cruc_{}_{:.0f}_cache.msh".format(coil_model, omega)
     if os.path.isfile(cache_file):
         print("Using mesh from cache '{}'.".format(cache_file))
         mesh = meshio.read(cache_file)
         out = mesh.points, mesh.cells, mesh.point_data, mesh.cell_data, mesh.field_data
     else:
-        out = pygmsh.generate_mesh(_define(), verbose=verbose)
+        out = pygmsh.generate_mesh(_define(coil_model, omega), verbose=verbose)
         points, cells, point_data, cell_data, _ = out
         meshio.write_points_cells(
             cache_file, points, cells, point_data=point_data, cell_data=cell_data
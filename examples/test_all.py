@@ -51,11 +51,10 @@ from test_maxwell import get_lorentz_joule
 # https://www.allanswered.com/post/lknbq/assemble-quadrature-representation-vs-uflacs/
 warnings.simplefilter("once", QuadratureRepresentationDeprecationWarning)
 
-# We need to allow extrapolation here since otherwise, the equation systems
-# for Maxwell cannot be constructed: They contain the velocity `u` (from
-# Navier-Stokes) which is only defined on the workpiece subdomain.
-# Cf. <https://answers.launchpad.net/dolfin/+question/210508>.
-parameters["allow_extrapolation"] = True
+# No extrapolation is needed: The Lorentz force and the Joule heat are
+# restricted to the workpiece submesh exactly (see `get_lorentz_joule`), and
+# fields on the submesh can be extended to the full mesh with
+# `maelstrom.helpers.SubMeshTransfer`.
 parameters["std_out_all_processes"] = False
 
 
@@ -287,6 +286,37 @@ def _compute_boussinesq(
             _plot(p0, theta0)
             plt.show()
 
+        # The heat problem is set up once; the velocity u0 is updated in place
+        # in every step, so only the convective terms need reassembly.
+        heat_problem = cyl_heat.Heat(
+            problem.Q,
+            kappa=k_wpi,
+            rho=rho_wpi(theta_average),
+            cp=cp_wpi,
+            convection=u0,
+            source=joule,
+            dirichlet_bcs=problem.theta_bcs_d,
+            neumann_bcs=problem.theta_bcs_n,
+            my_dx=dx(submesh_workpiece),
+            my_ds=ds_workpiece,
+        )
+        # For time-stepping in buoyancy-driven flows, see
+        #
+        # Numerical solution of buoyancy-driven flows;
+        # Einar Rossebø Christensen;
+        # Master's thesis;
+        # <http://www.diva-portal.org/smash/get/diva2:348831/FULLTEXT01.pdf>.
+        #
+        # Similar to the present approach, one first solves for
+        # velocity and pressure, then for temperature.
+        #
+        heat_stepper = parabolic.ImplicitEuler(heat_problem)
+        ns_stepper = cyl_ns.IPCS(time_step_method="backward euler")
+        # Density and viscosity of the Navier-Stokes problem; the values are
+        # assigned in every step so that the forms need not be recompiled.
+        rho_ns = Constant(rho_wpi(theta_average))
+        mu_ns = Constant(mu_wpi(theta_average))
+
         successful_steps = 0
         failed_steps = 0
         while t < target_time + DOLFIN_EPS:
@@ -298,36 +328,13 @@ def _compute_boussinesq(
             with Message("Time step {:e} -> {:e}...".format(t, t + dt)):
                 # Do one heat time step.
                 with Message("Computing heat..."):
-                    # Redefine the heat problem with the new u0.
-                    heat_problem = cyl_heat.Heat(
-                        problem.Q,
-                        kappa=k_wpi,
-                        rho=rho_wpi(theta_average),
-                        cp=cp_wpi,
-                        convection=u0,
-                        source=joule,
-                        dirichlet_bcs=problem.theta_bcs_d,
-                        neumann_bcs=problem.theta_bcs_n,
-                        my_dx=dx(submesh_workpiece),
-                        my_ds=ds_workpiece,
-                    )
-
-                    # For time-stepping in buoyancy-driven flows, see
-                    #
-                    # Numerical solution of buoyancy-driven flows;
-                    # Einar Rossebø Christensen;
-                    # Master's thesis;
-                    # <http://www.diva-portal.org/smash/get/diva2:348831/FULLTEXT01.pdf>.
-                    #
-                    # Similar to the present approach, one first solves for
-                    # velocity and pressure, then for temperature.
-                    #
-                    heat_stepper = parabolic.ImplicitEuler(heat_problem)
-
-                    ns_stepper = cyl_ns.IPCS(time_step_method="backward euler")
+                    # Update the heat problem with the new u0.
+                    heat_problem.update(convection=u0)
                     theta1 = heat_stepper.step(theta0, t, dt)
 
                 theta0_average = average(theta0)
+                rho_ns.assign(rho_wpi(theta0_average))
+                mu_ns.assign(mu_wpi(theta0_average))
                 try:
                     # Do one Navier-Stokes time step.
                     with Message("Computing flux and pressure..."):
@@ -347,9 +354,8 @@ def _compute_boussinesq(
                             problem.P,
                             problem.u_bcs,
                             problem.p_bcs,
-                            # Make constant TODO
-                            Constant(rho_wpi(theta0_average)),
-                            Constant(mu_wpi(theta0_average)),
+                            rho_ns,
+                            mu_ns,
                             f={0: f0, 1: f1},
                             tol=1.0e-10,
                             my_dx=dx(submesh_workpiece),
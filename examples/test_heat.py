@@ -3,9 +3,26 @@
 #
 from __future__ import print_function
 
-from dolfin import plot, dx, Constant, Measure, Function, project, XDMFFile
+from dolfin import (
+    plot,
+    dx,
+    Constant,
+    Measure,
+    Function,
+    project,
+    XDMFFile,
+    DirichletBC,
+    Expression,
+    FunctionSpace,
+    UnitSquareMesh,
+    VectorFunctionSpace,
+    errornorm,
+    interpolate,
+    norm,
+)
 import matplotlib.pyplot as plt
 import numpy
+import pytest
 
 import problems
 
@@ -13,6 +30,8 @@ import maelstrom
 
 import parabolic
 
+from benchmark_heat import count_vector_creations
+
 
 def _parameter_quest():
     """Find parameter sets fitting crucible data.
@@ -189,6 +208,49 @@ def test_time_step():
     return
 
 
+def test_in_place_allocations():
+    """The in-place variants must create fewer PETSc vectors than the default
+    ones.
+    """
+    pytest.importorskip("petsc4py")
+    mesh = UnitSquareMesh(16, 16, "left/right")
+    Q = FunctionSpace(mesh, "CG", 1)
+    W = VectorFunctionSpace(mesh, "CG", 1)
+    heat = maelstrom.heat.Heat(
+        Q,
+        kappa=2.0,
+        rho=3.0,
+        cp=5.0,
+        convection=interpolate(Constant((1.0, 2.0)), W),
+        source=Constant(1.0),
+        dirichlet_bcs=[DirichletBC(Q, 0.0, "on_boundary")],
+    )
+    theta0 = interpolate(Expression("x[0] * x[1]", degree=2), Q)
+    dt = 1.0e-2
+
+    def allocating():
+        b = heat.eval_alpha_M_beta_F(1.0, -dt, theta0, 0.0)
+        return heat.solve_alpha_M_beta_F(1.0, -dt, b, 0.0)
+
+    out = heat.b.copy()
+    theta1 = Function(Q)
+
+    def in_place():
+        heat.eval_alpha_M_beta_F(1.0, -dt, theta0, 0.0, out=out)
+        return heat.solve_alpha_M_beta_F(1.0, -dt, out, 0.0, out=theta1)
+
+    # Solver setup
+    allocating()
+
+    num_allocating, theta_ref = count_vector_creations(allocating)
+    num_in_place, theta = count_vector_creations(in_place)
+    # At least the right-hand side and the solution
+    assert num_allocating >= 2
+    assert num_in_place < num_allocating
+    assert errornorm(theta_ref, theta) < 1.0e-10 * norm(theta_ref)
+    return
+
+
 if __name__ == "__main__":
     # # for boundary conditions
     # heat_transfer_coefficient = {
@@ -7,7 +7,6 @@ from dolfin import (
     XDMFFile,
     Measure,
     FunctionSpace,
-    SubMesh,
     project,
     Function,
     info,
@@ -26,6 +25,7 @@ import numpy
 from numpy import pi
 from numpy import sin, cos
 
+from maelstrom.helpers import SubMeshTransfer
 import maelstrom.maxwell as cmx
 from maelstrom.message import Message
 
@@ -164,7 +164,69 @@ def test(show=False):
     return
 
 
-def get_lorentz_joule(problem, input_voltages, show=False):
+def test_cache(tmpdir):
+    """The second run must load the reference potentials from the cache and
+    give the same result, also for different voltages.
+    """
+    problem = problems.Crucible()
+    voltages = [38.0, 38.0, 38.0, 25.0, 25.0]
+    cache_dir = str(tmpdir)
+
+    _, _, Phi0 = get_lorentz_joule(problem, voltages, cache_dir=cache_dir)
+    assert len(tmpdir.listdir()) == 1
+
+    _, _, Phi1 = get_lorentz_joule(problem, voltages, cache_dir=cache_dir)
+    assert len(tmpdir.listdir()) == 1
+    for k in range(2):
+        diff = Phi1[k].vector() - Phi0[k].vector()
+        assert diff.norm("l2") < 1.0e-14 * Phi0[k].vector().norm("l2")
+
+    # Only the voltages change: still no new cache entry
+    get_lorentz_joule(problem, [2 * v for v in voltages], cache_dir=cache_dir)
+    assert len(tmpdir.listdir()) == 1
+    return
+
+
+def test_superposition():
+    """Lorentz force and Joule heat from the superposition of the stored ring
+    potentials must match the ones computed via :func:`compute_potential`.
+    """
+    problem = problems.Crucible()
+    subdomain_indices = problem.subdomain_materials.keys()
+    mu_const = {
+        i: problem.subdomain_materials[i].magnetic_permeability
+        for i in subdomain_indices
+    }
+    sigma_const = {
+        i: problem.subdomain_materials[i].electrical_conductivity
+        for i in subdomain_indices
+    }
+    V = FunctionSpace(problem.mesh, "CG", 1)
+    dx_subdomains = Measure("dx", subdomain_data=problem.subdomains)
+    superposition = cmx.Superposition(
+        problem.coil_domains,
+        V,
+        dx_subdomains,
+        mu_const,
+        sigma_const,
+        problem.omega,
+        problem.submesh_workpiece,
+        problem.wpi,
+    )
+
+    for voltages in [[38.0, 38.0, 38.0, 25.0, 25.0], [10.0, 0.0, 0.0, 0.0, 30.0]]:
+        lorentz, joule, _ = get_lorentz_joule(problem, voltages)
+        V_submesh = FunctionSpace(problem.submesh_workpiece, "CG", 1)
+        ref = norm(project(joule, V_submesh), "L2")
+        assert abs(norm(superposition.joule(voltages), "L2") - ref) < 1.0e-2 * ref
+        # The reference is the L2 projection of the force onto the submesh,
+        # the superposition uses lumped projections of the gradients.
+        ref = norm(lorentz, "L2")
+        assert abs(norm(superposition.lorentz(voltages), "L2") - ref) < 2.0e-2 * ref
+    return
+
+
+def get_lorentz_joule(problem, input_voltages, show=False, cache_dir=None):
     submesh_workpiece = problem.W.mesh()
 
     subdomain_indices = problem.subdomain_materials.keys()
@@ -199,6 +261,11 @@ def get_lorentz_joule(problem, input_voltages, show=False):
     # influence the magnetic field. Consequently, we precompute all associated
     # values.
     dx_subdomains = Measure("dx", subdomain_data=problem.subdomains)
+    ds_coils = None
+    impedance = None
+    if problem.coil_model == "impedance":
+        ds_coils = Measure("ds", subdomain_data=problem.coil_boundaries)
+        impedance = problem.coil_impedance
     with Message("Computing magnetic field..."):
         Phi, voltages = cmx.compute_potential(
             coils,
@@ -207,20 +274,29 @@ def get_lorentz_joule(problem, input_voltages, show=False):
             mu_const,
             sigma_const,
             problem.omega,
-            convections={}
+            convections={},
             # io_submesh=submesh_workpiece
+            cache_dir=cache_dir,
+            ds=ds_coils,
+            impedance=impedance,
+        )
+        # The Lorentz force and the Joule heat are only needed in the
+        # workpiece. Restricting Phi to the submesh first is exact for CG1 and
+        # avoids evaluating full-mesh functions on the submesh (which needs
+        # extrapolation at its boundary).
+        V_submesh = FunctionSpace(submesh_workpiece, "CG", 1)
+        transfer = SubMeshTransfer(V, V_submesh)
+        Phi_workpiece = [transfer.restrict(phi) for phi in Phi]
+
+        # Get resulting Lorentz force. Since it is built from the restricted
+        # potential, it lives on the submesh and can be projected there
+        # directly; the full mesh isn't involved (cf. the dolfin issue
+        # <https://bitbucket.org/fenics-project/dolfin/issues/869/projecting-grad-onto-submesh-error>).
+        lorentz = cmx.compute_lorentz(
+            Phi_workpiece, problem.omega, sigma_const[problem.wpi]
         )
-        # Get resulting Lorentz force.
-        lorentz = cmx.compute_lorentz(Phi, problem.omega, sigma_const[problem.wpi])
-
-        # Show the Lorentz force in the workpiece.
-        # W_element = VectorElement('CG', submesh_workpiece.ufl_cell(), 1)
-        # First project onto the entire mesh, then onto the submesh; see bug
-        # <https://bitbucket.org/fenics-project/dolfin/issues/869/projecting-grad-onto-submesh-error>.
-        W = VectorFunctionSpace(problem.mesh, "CG", 1)
-        pl = project(lorentz, W)
-        W2 = VectorFunctionSpace(submesh_workpiece, "CG", 1)
-        pl = project(pl, W2)
+        W_submesh = VectorFunctionSpace(submesh_workpiece, "CG", 1)
+        pl = project(lorentz, W_submesh)
         pl.rename("Lorentz force", "Lorentz force")
         with XDMFFile(submesh_workpiece.mpi_comm(), "lorentz.xdmf") as f:
             f.parameters["flush_output"] = True
@@ -233,15 +309,18 @@ def get_lorentz_joule(problem, input_voltages, show=False):
 
         # Get Joule heat source.
         joule = cmx.compute_joule(
-            Phi, voltages, problem.omega, sigma_const, mu_const, subdomain_indices
+            Phi_workpiece,
+            voltages,
+            problem.omega,
+            sigma_const,
+            mu_const,
+            [problem.wpi],
         )
 
         if show:
             # Show Joule heat source.
-            submesh = SubMesh(problem.mesh, problem.subdomains, problem.wpi)
-            W_submesh = FunctionSpace(submesh, "CG", 1)
-            jp = Function(W_submesh, name="Joule heat source")
-            jp.assign(project(joule[problem.wpi], W_submesh))
+            jp = Function(V_submesh, name="Joule heat source")
+            jp.assign(project(joule[problem.wpi], V_submesh))
             tri = plot(jp)
             plt.title("Joule heat source")
             plt.colorbar(tri)
@@ -249,10 +328,6 @@ def get_lorentz_joule(problem, input_voltages, show=False):
 
         joule_wpi = joule[problem.wpi]
 
-    # To work around bug
-    # <https://bitbucket.org/fenics-project/dolfin/issues/869/projecting-grad-onto-submesh-error>.
-    # return the projection `pl` and not `lorentz` itself.
-    # TODO remove this workaround
     return pl, joule_wpi, Phi
 
 
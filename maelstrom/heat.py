@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 #
+from collections import OrderedDict
 import warnings
 
 from dolfin import (
@@ -15,13 +16,23 @@ from dolfin import (
     TrialFunction,
     TestFunction,
     KrylovSolver,
+    PETScKrylovSolver,
+    PETScOptions,
     Function,
-    assemble_system,
     LUSolver,
     div,
     as_vector,
+    Form,
+    DirichletBC,
+    derivative,
+    MPI,
+    Constant,
 )
 from ffc.quadrature.deprecation import QuadratureRepresentationDeprecationWarning
+import numpy
+from ufl import as_ufl
+from ufl.constantvalue import Zero
+from ufl.core.expr import Expr
 
 from . import stabilization as stab
 
@@ -69,15 +80,24 @@ def F(
 
         u' = F(u).
     """
+    F0 = _F_fixed(u, v, kappa, rho, cp, source, r, neumann_bcs, robin_bcs, my_dx, my_ds)
+    if convection is not None:
+        F0 += _F_convection(
+            u, v, kappa, rho, cp, convection, source, r, my_dx, stabilization
+        )
+    else:
+        assert stabilization is None
+    return F0
+
+
+def _F_fixed(u, v, kappa, rho, cp, source, r, neumann_bcs, robin_bcs, my_dx, my_ds):
+    """The part of :func:`F` that doesn't depend on the convection, i.e.,
+    diffusion, source, and boundary terms.
+    """
     rho_cp = rho * cp
 
     F0 = kappa * r * dot(grad(u), grad(v / rho_cp)) * 2 * pi * my_dx
 
-    # F -= dot(b, grad(u)) * v * 2*pi*r * dx_workpiece(0)
-    if convection is not None:
-        c = as_vector([convection[0], convection[1]])
-        F0 += dot(c, grad(u)) * v * 2 * pi * r * my_dx
-
     # Joule heat
     F0 -= source * v / rho_cp * 2 * pi * r * my_dx
 
@@ -90,18 +110,34 @@ def F(
         alpha, u0 = value
         F0 -= r * kappa * alpha * (u - u0) * v / rho_cp * 2 * pi * my_ds(k)
 
+    return F0
+
+
+def _F_convection(
+    u, v, kappa, rho, cp, convection, source, r, my_dx, stabilization, tau=None
+):
+    """The convective part of :func:`F`, including the SUPG stabilization.
+    If given, :code:`tau` is used as the SUPG parameter, e.g., the DG0
+    function of a :class:`maelstrom.stabilization.Supg` object.
+    """
+    rho_cp = rho * cp
+
+    # F -= dot(b, grad(u)) * v * 2*pi*r * dx_workpiece(0)
+    c = as_vector([convection[0], convection[1]])
+    F0 = dot(c, grad(u)) * v * 2 * pi * r * my_dx
+
     if stabilization == "supg":
         # Add SUPG stabilization.
-        assert convection is not None
         # TODO u_t?
         R = (
             -div(kappa * r * grad(u)) / rho_cp * 2 * pi
             + dot(c, grad(u)) * 2 * pi * r
             - source / rho_cp * 2 * pi * r
         )
-        mesh = v.function_space().mesh()
-        element_degree = v.ufl_element().degree()
-        tau = stab.supg(mesh, convection, kappa, element_degree)
+        if tau is None:
+            mesh = v.function_space().mesh()
+            element_degree = v.ufl_element().degree()
+            tau = stab.supg(mesh, convection, kappa, element_degree)
         F0 += R * tau * dot(convection, grad(v)) * my_dx
     else:
         assert stabilization is None
@@ -109,6 +145,39 @@ def F(
     return F0
 
 
+def _as_constant(value):
+    """Numbers become :class:`Constant` coefficients. Their values then don't
+    enter the form signatures, so forms with new values don't need to be
+    compiled again, and they can be changed with :code:`assign()`.
+    """
+    if isinstance(value, (float, int)):
+        return Constant(value)
+    return value
+
+
+def _mass_matrix(Q):
+    """The mass matrix of the time derivative.
+    """
+    u = TrialFunction(Q)
+    v = TestFunction(Q)
+    # If there are sharp temperature gradients, numerical oscillations may
+    # occur. This happens because the resulting matrix is not an M-matrix,
+    # caused by the fact that A1 puts positive elements in places other
+    # than the main diagonal. To prevent that, it is suggested by
+    # Großmann/Roos to use a vertex-centered discretization for the mass
+    # matrix part.
+    # Check
+    # https://bitbucket.org/fenics-project/ffc/issues/145/uflacs-error-for-vertex-quadrature-scheme
+    #
+    return assemble(
+        u * v * dx,
+        form_compiler_parameters={
+            "representation": "quadrature",
+            "quadrature_rule": "vertex",
+        },
+    )
+
+
 class Heat(object):
     """
     Class for interfacing the parabolic library for time stepping.
@@ -118,8 +187,49 @@ class Heat(object):
     positive off-diagonal entries makes the mass matrix a non-M-matrix, leading
     to oscillations whenever the temperature gradient is sharp. See
     :cite:`GR2007` for background.
+
+    The object is meant to be long-lived in time stepping loops: The mass
+    matrix and the convection-independent parts of the operator are assembled
+    only once. When the convection (or the source) changes, call
+    :meth:`update`; only the convective and SUPG terms are then reassembled,
+    into the already allocated matrices.
+
+    With convection, the linear systems are solved with GMRES and an AMG
+    preconditioner configured by :code:`convection_solver` (see
+    :attr:`convection_solver_options`); optionally, the SUPG-stabilized
+    operator is used to build the preconditioner. If the Krylov solver fails
+    to converge, LU is used from then on. The iteration counts of all solves
+    are recorded in :code:`iteration_counts`.
     """
 
+    # Maximum number of `(alpha, beta)` pairs for which solvers are cached.
+    solver_cache_size = 4
+
+    # PETSc options for the solvers of the convective operator. "amg" is
+    # BoomerAMG with settings that are known to work for nonsymmetric
+    # problems (HMIS coarsening, extended+i interpolation, hybrid
+    # Gauss-Seidel smoothing). "air" uses approximate ideal restriction
+    # (lAIR) which targets advection-dominated problems; it requires PETSc
+    # >= 3.12 with hypre >= 2.18. "lu" uses a direct solver.
+    convection_solver_options = {
+        "amg": {
+            "pc_hypre_boomeramg_coarsen_type": "HMIS",
+            "pc_hypre_boomeramg_interp_type": "ext+i",
+            "pc_hypre_boomeramg_relax_type_all": "SOR/Jacobi",
+            "pc_hypre_boomeramg_strong_threshold": 0.5,
+            "pc_hypre_boomeramg_P_max": 4,
+        },
+        "air": {
+            "pc_hypre_boomeramg_restriction_type": 1,
+            "pc_hypre_boomeramg_coarsen_type": "PMIS",
+            "pc_hypre_boomeramg_relax_type_all": "Jacobi",
+            "pc_hypre_boomeramg_postrelax": "F",
+            "pc_hypre_boomeramg_grid_sweeps_down": 0,
+            "pc_hypre_boomeramg_strong_threshold": 0.25,
+        },
+        "lu": {},
+    }
+
     def __init__(
         self,
         Q,
@@ -134,6 +244,8 @@ class Heat(object):
         my_dx=dx,
         my_ds=ds,
         stabilization=None,
+        convection_solver="amg",
+        supg_preconditioner=False,
     ):
         super(Heat, self).__init__()
         self.Q = Q
@@ -143,53 +255,319 @@ class Heat(object):
         robin_bcs = robin_bcs or {}
 
         self.convection = convection
+        self.source = source
 
-        u = TrialFunction(Q)
-        v = TestFunction(Q)
+        self._u = TrialFunction(Q)
+        self._v = TestFunction(Q)
 
-        # If there are sharp temperature gradients, numerical oscillations may
-        # occur. This happens because the resulting matrix is not an M-matrix,
-        # caused by the fact that A1 puts positive elements in places other
-        # than the main diagonal. To prevent that, it is suggested by
-        # Großmann/Roos to use a vertex-centered discretization for the mass
-        # matrix part.
-        # Check
-        # https://bitbucket.org/fenics-project/ffc/issues/145/uflacs-error-for-vertex-quadrature-scheme
-        #
-        self.M = assemble(
-            u * v * dx,
-            form_compiler_parameters={
-                "representation": "quadrature",
-                "quadrature_rule": "vertex",
-            },
-        )
+        self.M = _mass_matrix(Q)
 
         mesh = Q.mesh()
-        r = SpatialCoordinate(mesh)[0]
-        self.F0 = F(
-            u,
-            v,
-            kappa,
-            rho,
-            cp,
-            convection,
-            source,
-            r,
-            neumann_bcs,
-            robin_bcs,
-            my_dx,
-            my_ds,
-            stabilization,
-        )
+        self._r = SpatialCoordinate(mesh)[0]
+        # Wrap numbers in Constants, see `update()`.
+        self._kappa = _as_constant(kappa)
+        self._rho = _as_constant(rho)
+        self._cp = _as_constant(cp)
+        self._neumann_bcs = neumann_bcs
+        self._robin_bcs = robin_bcs
+        self._my_dx = my_dx
+        self._my_ds = my_ds
+        self._stabilization = stabilization
 
         self.dirichlet_bcs = dirichlet_bcs
 
-        self.A, self.b = assemble_system(-lhs(self.F0), rhs(self.F0))
+        # Solvers for `alpha * M + beta * A`, see `_get_solver()`. The version
+        # is bumped whenever A changes and invalidates the cached matrices.
+        self._operator_version = 0
+        self._solver_cache = OrderedDict()
+        self.solver_cache_hits = 0
+        self.solver_cache_misses = 0
+
+        # Linear solver for the nonsymmetric operator with convection
+        assert convection_solver in self.convection_solver_options
+        self.convection_solver = convection_solver
+        # Number of iterations of the linear solves, in order
+        self.iteration_counts = []
+
+        # Lumped mass matrix and spectral radius estimate, computed on demand
+        self._M_lumped = None
+        self._M_lumped_inv = None
+        self._spectral_radius = None
+        self._spectral_radius_version = None
+
+        # Work vectors for eval_alpha_M_beta_F() and solve_alpha_M_beta_F()
+        self._work = None
+        self._rhs = None
+
+        # The convection-independent part of the operator. Its matrix is
+        # assembled exactly once; `self.A` is kept as a matrix with the same
+        # sparsity pattern into which the convective part is added.
+        F_fixed = self._F_fixed()
+        self._a_fixed = Form(-lhs(F_fixed))
+        self._A_fixed = assemble(self._a_fixed)
+        self._L_fixed = Form(rhs(F_fixed))
+        self._b_fixed = assemble(self._L_fixed)
+
+        self.A = self._A_fixed.copy()
+        self.b = self._b_fixed.copy()
+
+        self._a_conv = None
+        self._L_conv = None
+        self._A_conv = None
+        self._b_conv = None
+        # If requested, the Krylov solver for an unstabilized operator is
+        # preconditioned with the SUPG-stabilized one, which is much better
+        # suited for AMG.
+        self._supg_preconditioner = supg_preconditioner and stabilization is None
+        self._a_conv_pc = None
+        self._A_conv_pc = None
+        self._A_pc = None
+        self._supg = None
+        if convection is not None:
+            self._build_convection_forms()
+            self._assemble_convection()
+        else:
+            assert stabilization is None
+        return
+
+    def _F_fixed(self):
+        return _F_fixed(
+            self._u,
+            self._v,
+            self._kappa,
+            self._rho,
+            self._cp,
+            self.source,
+            self._r,
+            self._neumann_bcs,
+            self._robin_bcs,
+            self._my_dx,
+            self._my_ds,
+        )
+
+    def _build_convection_forms(self):
+        # The SUPG parameter is a DG0 function which is updated in place
+        # along with the convection; the forms need not be rebuilt for that.
+        self._supg = None
+        if self._stabilization == "supg" or self._supg_preconditioner:
+            self._supg = stab.Supg(
+                self.Q.mesh(),
+                self.convection,
+                self._kappa,
+                self.Q.ufl_element().degree(),
+            )
+        tau = None if self._supg is None else self._supg.tau
+
+        F_conv = _F_convection(
+            self._u,
+            self._v,
+            self._kappa,
+            self._rho,
+            self._cp,
+            self.convection,
+            self.source,
+            self._r,
+            self._my_dx,
+            self._stabilization,
+            tau,
+        )
+        self._a_conv = Form(-lhs(F_conv))
+        # Only the SUPG terms contribute to the right-hand side.
+        self._L_conv = Form(rhs(F_conv)) if self._stabilization else None
+
+        if self._supg_preconditioner:
+            F_conv_pc = _F_convection(
+                self._u,
+                self._v,
+                self._kappa,
+                self._rho,
+                self._cp,
+                self.convection,
+                self.source,
+                self._r,
+                self._my_dx,
+                "supg",
+                tau,
+            )
+            self._a_conv_pc = Form(-lhs(F_conv_pc))
+        return
+
+    def _assemble_convection(self, operator=True):
+        """Reassemble the convective terms into the preallocated tensors and
+        refresh :code:`self.A`, :code:`self.b`. With :code:`operator=False`,
+        only the right-hand side is refreshed, and cached solvers stay valid.
+        """
+        if operator:
+            self._assemble_convection_operator()
+
+        self.b.zero()
+        self.b.axpy(1.0, self._b_fixed)
+        if self._L_conv is not None:
+            self._b_conv = assemble(self._L_conv, tensor=self._b_conv)
+            self.b.axpy(1.0, self._b_conv)
+        return
+
+    def _assemble_convection_operator(self):
+        # `assemble` with `tensor=None` only happens once; afterwards, the
+        # sparsity pattern is reused.
+        if self._supg is not None:
+            self._supg.update()
+        self._A_conv = assemble(self._a_conv, tensor=self._A_conv)
+        # All matrices share the sparsity pattern of the cell-cell couplings
+        # of Q, so the additions can be carried out in place.
+        self.A.zero()
+        self.A.axpy(1.0, self._A_fixed, True)
+        self.A.axpy(1.0, self._A_conv, True)
+
+        if self._a_conv_pc is not None:
+            self._A_conv_pc = assemble(self._a_conv_pc, tensor=self._A_conv_pc)
+            if self._A_pc is None:
+                self._A_pc = self._A_fixed.copy()
+            self._A_pc.zero()
+            self._A_pc.axpy(1.0, self._A_fixed, True)
+            self._A_pc.axpy(1.0, self._A_conv_pc, True)
+
+        self._operator_version += 1
+        return
+
+    def update(self, convection=None, source=None, kappa=None, rho=None, cp=None):
+        """Update the operator after a change of the convection, the source, or
+        the material parameters.
+
+        If the same objects as before are passed (e.g., the convection is a
+        :class:`Function` whose values were :code:`assign`ed), the forms are
+        not rebuilt but merely reassembled. The convective and SUPG terms are
+        reassembled only if :code:`convection` is given or a parameter changes,
+        so an update of the source alone keeps the cached solvers of
+        :meth:`solve_alpha_M_beta_F`; the source term is reassembled only if
+        :code:`source` is given.
+        New values of :code:`kappa`, :code:`rho`, :code:`cp` are
+        :code:`assign`ed to the :class:`Constant` coefficients in the forms
+        (if the parameters were given as numbers or :class:`Constant`s), so no
+        form is recompiled either. Other parameter values raise a
+        :code:`ValueError`.
+        """
+        parameters_changed = False
+        for name, coefficient, value in [
+            ("kappa", self._kappa, kappa),
+            ("rho", self._rho, rho),
+            ("cp", self._cp, cp),
+        ]:
+            if value is None:
+                continue
+            if not isinstance(value, (float, int, Constant)):
+                raise ValueError(
+                    "Unsupported argument {}={!r}; only numbers and Constants "
+                    "can be assigned.".format(name, value)
+                )
+            if not isinstance(coefficient, Constant):
+                raise ValueError(
+                    "Unsupported argument {}: the parameter was given as {!r}, "
+                    "not as a number or Constant.".format(name, coefficient)
+                )
+            coefficient.assign(value)
+            parameters_changed = True
+        if parameters_changed:
+            self._A_fixed = assemble(self._a_fixed, tensor=self._A_fixed)
+
+        rebuild_convection = False
+        if source is not None and source is not self.source:
+            self.source = source
+            self._L_fixed = Form(rhs(self._F_fixed()))
+            # The SUPG residual contains the source, too.
+            rebuild_convection = self._stabilization is not None
+        if source is not None or parameters_changed:
+            self._b_fixed = assemble(self._L_fixed, tensor=self._b_fixed)
+
+        if convection is not None and convection is not self.convection:
+            self.convection = convection
+            rebuild_convection = True
+
+        if self.convection is None:
+            if parameters_changed:
+                self.A.zero()
+                self.A.axpy(1.0, self._A_fixed, True)
+                self._operator_version += 1
+            self.b.zero()
+            self.b.axpy(1.0, self._b_fixed)
+            return
+
+        if rebuild_convection or self._a_conv is None:
+            self._build_convection_forms()
+        # The source only enters the right-hand side (also with SUPG), so A
+        # and everything derived from it is kept.
+        self._assemble_convection(operator=convection is not None or parameters_changed)
         return
 
+    def lumped_mass(self, inverse=False):
+        """The mass matrix :math:`M` (or its inverse) as a vector of diagonal
+        entries.
+
+        With the vertex quadrature, :math:`M` is diagonal already for linear
+        elements. For higher-order elements, the vertex rule gives zero
+        diagonal entries (e.g., in the edge midpoints of P2); in this case, the
+        diagonal of the consistent mass matrix is scaled to preserve the total
+        mass (HRZ lumping).
+        """
+        if self._M_lumped is None:
+            d = Function(self.Q).vector()
+            self.M.get_diagonal(d)
+            if d.min() <= 0.0:
+                Mc = assemble(self._u * self._v * dx)
+                Mc.get_diagonal(d)
+                total_mass = assemble(1.0 * dx(self.Q.mesh()))
+                d *= total_mass / d.sum()
+            d_inv = d.copy()
+            d_inv.set_local(1.0 / d.get_local())
+            d_inv.apply("insert")
+            self._M_lumped = d
+            self._M_lumped_inv = d_inv
+        return self._M_lumped_inv if inverse else self._M_lumped
+
+    def homogeneous_dirichlet_bcs(self):
+        """Copies of the Dirichlet conditions with zero boundary values.
+        """
+        return _homogenized(self.dirichlet_bcs)
+
+    def spectral_radius(self, num_iterations=20):
+        """Estimate the spectral radius of :math:`M^{-1}A` (with the lumped
+        mass matrix and homogeneous Dirichlet conditions) by power iteration.
+        The estimate is cached until the operator changes.
+        """
+        if self._spectral_radius_version == self._operator_version:
+            return self._spectral_radius
+
+        m_inv = self.lumped_mass(inverse=True)
+        bcs0 = self.homogeneous_dirichlet_bcs()
+
+        x = Function(self.Q).vector()
+        # Fixed seed for reproducibility; a random start vector makes it
+        # unlikely to be orthogonal to the dominant eigenvector.
+        x.set_local(numpy.random.RandomState(0).rand(x.local_size()))
+        x.apply("insert")
+        y = x.copy()
+        lmbda = 0.0
+        for _ in range(num_iterations):
+            for bc in bcs0:
+                bc.apply(x)
+            x /= x.norm("l2")
+            self.A.mult(x, y)
+            y *= m_inv
+            for bc in bcs0:
+                bc.apply(y)
+            lmbda = y.norm("l2")
+            x, y = y, x
+
+        self._spectral_radius = lmbda
+        self._spectral_radius_version = self._operator_version
+        return lmbda
+
     # pylint: disable=unused-argument
-    def eval_alpha_M_beta_F(self, alpha, beta, u, t):
+    def eval_alpha_M_beta_F(self, alpha, beta, u, t, out=None):
         """Evaluate  :code:`alpha * M * u + beta * F(u, t)`.
+
+        The result is written into the vector :code:`out` (which must not be
+        :code:`u.vector()`) if given; no temporary vectors are created then.
         """
         uvec = u.vector()
         # Convert to proper `float`s to avoid accidental conversion to
@@ -197,44 +575,683 @@ class Heat(object):
         # <https://bitbucket.org/fenics-project/dolfin/issues/874/genericvector-numpyfloat-numpyarray-not>
         alpha = float(alpha)
         beta = float(beta)
-        return alpha * (self.M * uvec) + beta * (self.A * uvec + self.b)
+        if out is None:
+            out = self.b.copy()
+        if self._work is None:
+            self._work = self.b.copy()
 
-    def solve_alpha_M_beta_F(self, alpha, beta, b, t):
+        self.A.mult(uvec, self._work)
+        if alpha == 0.0:
+            out.zero()
+        else:
+            self.M.mult(uvec, out)
+            out *= alpha
+        out.axpy(beta, self._work)
+        out.axpy(beta, self.b)
+        return out
+
+    def solve_alpha_M_beta_F(self, alpha, beta, b, t, out=None):
         """Solve  :code:`alpha * M * u + beta * F(u, t) = b`  with Dirichlet
         conditions.
-        """
-        matrix = alpha * self.M + beta * self.A
 
+        If given, the solution is written into the :class:`Function`
+        :code:`out`; the right-hand side is formed in a work vector.
+        """
         # See above for float conversion
-        right_hand_side = -float(beta) * self.b.copy()
+        alpha = float(alpha)
+        beta = float(beta)
+        entry = self._get_solver(alpha, beta)
+
+        if self._rhs is None:
+            self._rhs = self.b.copy()
+        right_hand_side = self._rhs
+        right_hand_side.zero()
+        right_hand_side.axpy(-beta, self.b)
         if b:
-            right_hand_side += b
+            right_hand_side.axpy(1.0, b)
 
         for bc in self.dirichlet_bcs:
-            bc.apply(matrix, right_hand_side)
-
-        # TODO proper preconditioner for convection
-        if self.convection:
-            # Use HYPRE-Euclid instead of ILU for parallel computation.
-            # However, this PC sometimes fails.
-            # solver = KrylovSolver('gmres', 'hypre_euclid')
-            # Fallback:
-            solver = LUSolver()
+            bc.apply(right_hand_side)
+
+        if out is None:
+            out = Function(self.Q)
+        self._solve(entry, out.vector(), right_hand_side)
+        return out
+
+    def _solve(self, entry, x, b):
+        """Solve with the solver from a cache entry. If a Krylov solver for the
+        convective operator fails to converge, fall back to LU for this and
+        all subsequent solves; the other cached solvers are replaced when they
+        are next requested, see :meth:`_get_solver`.
+        """
+        try:
+            num_iter = entry["solver"].solve(x, b)
+        except RuntimeError as e:
+            if self.convection is None or isinstance(entry["solver"], LUSolver):
+                raise
+            warnings.warn(
+                "Krylov solver for the convective heat operator failed ({}). "
+                "Falling back to LU.".format(e.args[0])
+            )
+            self.convection_solver = "lu"
+            entry["solver"] = LUSolver()
+            entry["solver"].set_operator(entry["matrix"])
+            entry["kind"] = self._solver_kind()
+            entry.pop("pc_matrix", None)
+            x.zero()
+            num_iter = entry["solver"].solve(x, b)
+        self.iteration_counts.append(num_iter)
+        return
+
+    def _get_solver(self, alpha, beta):
+        """Get a solver for :code:`alpha * M + beta * A` from the cache.
+
+        The cache is keyed on :code:`(alpha, beta)`. As long as the operator
+        hasn't changed (see :meth:`update`), the solver is returned as is, i.e.,
+        with the LU factorization or the AMG hierarchy already computed. If
+        the operator did change, the values of the cached matrix are
+        overwritten in place. Since the sparsity pattern is unchanged, the
+        symbolic factorization is reused. Solvers of another kind than the one
+        currently required (see :meth:`_solver_kind`) are created anew.
+        """
+        key = (alpha, beta)
+        kind = self._solver_kind()
+        entry = self._solver_cache.pop(key, None)
+        if entry is not None and entry["kind"] != kind:
+            entry = None
+        if entry is not None and entry["version"] == self._operator_version:
+            self.solver_cache_hits += 1
+            self._solver_cache[key] = entry
+            return entry
+
+        self.solver_cache_misses += 1
+        if entry is None:
+            if len(self._solver_cache) >= self.solver_cache_size:
+                # Evict the least recently used entry.
+                self._solver_cache.popitem(last=False)
+            entry = {
+                "matrix": self.A.copy(),
+                "solver": self._create_solver(),
+                "kind": kind,
+            }
+            if self._A_pc is not None and not isinstance(entry["solver"], LUSolver):
+                entry["pc_matrix"] = self._A_pc.copy()
+
+        matrix = entry["matrix"]
+        _fill(matrix, alpha, self.M, beta, self.A, self.dirichlet_bcs)
+        if "pc_matrix" in entry:
+            pc_matrix = entry["pc_matrix"]
+            _fill(pc_matrix, alpha, self.M, beta, self._A_pc, self.dirichlet_bcs)
+            entry["solver"].set_operators(matrix, pc_matrix)
         else:
+            entry["solver"].set_operator(matrix)
+        entry["version"] = self._operator_version
+
+        self._solver_cache[key] = entry
+        return entry
+
+    def _solver_kind(self):
+        """The kind of solver :meth:`_create_solver` currently creates.
+        """
+        if self.convection is None:
+            return "symmetric"
+        return self.convection_solver
+
+    def _create_solver(self):
+        if self.convection is None:
             solver = KrylovSolver("gmres", "hypre_amg")
             solver.parameters["relative_tolerance"] = 1.0e-13
             solver.parameters["absolute_tolerance"] = 0.0
             solver.parameters["maximum_iterations"] = 100
             solver.parameters["monitor_convergence"] = True
+            return solver
 
-        solver.set_operator(matrix)
+        if self.convection_solver == "lu":
+            # Robust, but neither memory- nor MPI-scalable.
+            return LUSolver()
 
-        u = Function(self.Q)
-        solver.solve(u.vector(), right_hand_side)
-        return u
+        return _nonsymmetric_amg_solver(
+            "maelstrom_heat_{}_".format(self.convection_solver),
+            self.convection_solver_options[self.convection_solver],
+        )
 
     def solve_stationary(self):
         """Solve the stationary problem :code:`F(u, t) = 0`  with Dirichlet
         conditions.
         """
         return self.solve_alpha_M_beta_F(alpha=0.0, beta=1.0, b=None, t=0.0)
+
+    def _source_load(self, source):
+        """The linear form of the source term (including its SUPG part) in
+        :math:`b`; :code:`source` may also be a :class:`TrialFunction`. For
+        :code:`None` or a source which UFL recognizes as zero (e.g.,
+        :code:`0`), the form is empty and :code:`None` is returned.
+        """
+        # UFL folds a zero source times v to Zero, which can't be integrated
+        # over the domain-less default measure.
+        if source is None or isinstance(as_ufl(source), Zero):
+            return None
+        rho_cp = self._rho * self._cp
+        L = source * self._v / rho_cp * 2 * pi * self._r * self._my_dx
+        if self._stabilization == "supg" and self.convection is not None:
+            tau = self._supg.tau
+            weight = 2 * pi * self._r * tau * dot(self.convection, grad(self._v))
+            L += source / rho_cp * weight * self._my_dx
+        return L
+
+    def _source_vector(self, source):
+        """The assembled :meth:`_source_load`, zero if the form is empty.
+        """
+        L = self._source_load(source)
+        if L is None:
+            b = self.b.copy()
+            b.zero()
+            return b
+        return assemble(L)
+
+    def solve_stationary_many(self, sources):
+        """Solve the stationary problem for each of the given sources, all
+        other data being equal.
+
+        The operator is set up (factorized, or the AMG hierarchy is built)
+        only once; the right-hand sides are then merely back-solves with the
+        cached solver. If the sources are :class:`Function` objects on the
+        temperature space, their load vectors are computed in one pass as
+        products with the assembled source-to-load matrix, without any
+        further assembly.
+
+        The right-hand sides are not solved for as a block, though: Each one
+        is a separate back-solve with the cached solver, in a loop. (DOLFIN's
+        solvers only take one vector at a time.) There is no process-pool
+        split of large batches either, since the cached PETSc solver can't be
+        handed to worker processes; use MPI instead.
+        """
+        # The right-hand side without the contribution of `self.source`
+        b0 = self.b.copy()
+        b0.axpy(-1.0, self._source_vector(self.source))
+
+        if all(
+            isinstance(source, Function) and source.function_space() == self.Q
+            for source in sources
+        ):
+            S = assemble(self._source_load(self._u))
+            loads = [S * source.vector() for source in sources]
+        else:
+            loads = [self._source_vector(source) for source in sources]
+
+        entry = self._get_solver(0.0, 1.0)
+        thetas = []
+        for load in loads:
+            # A u = -b, cf. solve_alpha_M_beta_F()
+            load.axpy(1.0, b0)
+            load *= -1.0
+            for bc in self.dirichlet_bcs:
+                bc.apply(load)
+            theta = Function(self.Q)
+            self._solve(entry, theta.vector(), load)
+            thetas.append(theta)
+        return thetas
+
+
+def _homogenized(bcs):
+    """Copies of the Dirichlet conditions :code:`bcs` with zero boundary
+    values.
+    """
+    bcs0 = []
+    for bc in bcs:
+        bc0 = DirichletBC(bc)
+        bc0.homogenize()
+        bcs0.append(bc0)
+    return bcs0
+
+
+def _nonsymmetric_amg_solver(prefix, options):
+    """GMRES with BoomerAMG set up for nonsymmetric operators. The options
+    are passed through PETSc with the solver-specific :code:`prefix`.
+    """
+    for key, value in options.items():
+        PETScOptions.set(prefix + key, value)
+    solver = PETScKrylovSolver("gmres", "hypre_amg")
+    solver.set_options_prefix(prefix)
+    solver.set_from_options()
+    solver.parameters["relative_tolerance"] = 1.0e-10
+    solver.parameters["absolute_tolerance"] = 0.0
+    solver.parameters["maximum_iterations"] = 200
+    solver.parameters["error_on_nonconvergence"] = True
+    return solver
+
+
+def _fill(matrix, alpha, M, beta, A, bcs):
+    """Overwrite the values of :code:`matrix` by :code:`alpha * M + beta * A`
+    with Dirichlet conditions; all matrices share the same sparsity pattern.
+    """
+    matrix.zero()
+    matrix.axpy(beta, A, True)
+    matrix.axpy(alpha, M, True)
+    for bc in bcs:
+        bc.apply(matrix)
+    return
+
+
+def _rkc_coefficients(s, damping):
+    """Coefficients of the second-order RKC scheme with :code:`s` stages, cf.
+    :cite:`SSV1998`.
+    """
+    w0 = 1.0 + damping / s ** 2
+    # Chebyshev polynomials T_j and their first two derivatives at w0.
+    T = numpy.zeros(s + 1)
+    dT = numpy.zeros(s + 1)
+    ddT = numpy.zeros(s + 1)
+    T[0] = 1.0
+    T[1] = w0
+    dT[1] = 1.0
+    for j in range(2, s + 1):
+        T[j] = 2 * w0 * T[j - 1] - T[j - 2]
+        dT[j] = 2 * T[j - 1] + 2 * w0 * dT[j - 1] - dT[j - 2]
+        ddT[j] = 4 * dT[j - 1] + 2 * w0 * ddT[j - 1] - ddT[j - 2]
+    w1 = dT[s] / ddT[s]
+
+    b = numpy.empty(s + 1)
+    b[2:] = ddT[2:] / dT[2:] ** 2
+    b[0] = b[2]
+    b[1] = b[2]
+
+    mu = numpy.zeros(s + 1)
+    nu = numpy.zeros(s + 1)
+    mu_t = numpy.zeros(s + 1)
+    gamma_t = numpy.zeros(s + 1)
+    mu_t[1] = b[1] * w1
+    for j in range(2, s + 1):
+        mu[j] = 2 * b[j] * w0 / b[j - 1]
+        nu[j] = -b[j] / b[j - 2]
+        mu_t[j] = 2 * b[j] * w1 / b[j - 1]
+        gamma_t[j] = -(1.0 - b[j - 1] * T[j - 1]) * mu_t[j]
+
+    # Return proper `float`s, see the comment in Heat.eval_alpha_M_beta_F.
+    return mu.tolist(), nu.tolist(), mu_t.tolist(), gamma_t.tolist()
+
+
+class RKC(object):
+    """Explicit, stabilized Runge--Kutta--Chebyshev time stepper of second
+    order :cite:`SSV1998` for
+
+    .. math::
+
+        u' = M^{-1} F(u)
+
+    with the lumped mass matrix :math:`M` of a :class:`Heat` problem. Only
+    matrix-vector products and vector updates are needed, no linear solves.
+
+    The number of stages :math:`s` is chosen in every step such that the real
+    stability interval, roughly :math:`[-0.65 s^2, 0]`, covers
+    :math:`\\Delta t` times the spectral radius of :math:`M^{-1}A`. Note that
+    the scheme is meant for diffusion-dominated problems; with dominating
+    convection, the eigenvalues move away from the real axis.
+    """
+
+    def __init__(self, problem, damping=2.0 / 13.0, safety_factor=1.2):
+        self.problem = problem
+        self.damping = damping
+        self.safety_factor = safety_factor
+        # Number of stages used in the last step
+        self.num_stages = None
+
+        self._m_inv = problem.lumped_mass(inverse=True)
+        self._bcs0 = problem.homogeneous_dirichlet_bcs()
+        return
+
+    def _f(self, y):
+        """:math:`M^{-1} F(y)`, zero at Dirichlet nodes.
+        """
+        f = self.problem.A * y
+        f.axpy(1.0, self.problem.b)
+        f *= self._m_inv
+        for bc in self._bcs0:
+            bc.apply(f)
+        return f
+
+    # pylint: disable=unused-argument
+    def step(self, u0, t, dt):
+        dt = float(dt)
+        rho = self.safety_factor * self.problem.spectral_radius()
+        s = max(2, 1 + int(numpy.sqrt(1.0 + 1.54 * dt * rho)))
+        self.num_stages = s
+        mu, nu, mu_t, gamma_t = _rkc_coefficients(s, self.damping)
+
+        y0 = u0.vector().copy()
+        for bc in self.problem.dirichlet_bcs:
+            bc.apply(y0)
+        f0 = self._f(y0)
+
+        y_prev2 = y0
+        y_prev = y0.copy()
+        y_prev.axpy(mu_t[1] * dt, f0)
+        for j in range(2, s + 1):
+            y = y0.copy()
+            y *= 1.0 - mu[j] - nu[j]
+            y.axpy(mu[j], y_prev)
+            y.axpy(nu[j], y_prev2)
+            y.axpy(mu_t[j] * dt, self._f(y_prev))
+            y.axpy(gamma_t[j] * dt, f0)
+            y_prev2, y_prev = y_prev, y
+
+        u1 = Function(self.problem.Q)
+        u1.vector().axpy(1.0, y_prev)
+        return u1
+
+
+class AdaptiveImplicitEuler(object):
+    """Implicit Euler with adaptive step sizes for :class:`Heat` problems.
+
+    The local error is estimated by the difference to the trapezoidal rule,
+
+    .. math::
+
+        e = \\frac{\\Delta t}{2} M^{-1} (F(u_1) - F(u_0)),
+
+    with the lumped mass matrix :math:`M`, and measured in the weighted RMS
+    norm with weights :math:`\\text{atol} + \\text{rtol} \\max(|u_0|, |u_1|)`.
+    A step is accepted if that norm is at most 1; the next step size is then
+    chosen by a PI controller :cite:`GLS1988`. Rejected steps are repeated
+    with a step size from the elementary controller with exponent
+    :math:`1/2`.
+
+    Changes of the step size by a factor in :code:`keep_factors` are
+    ignored: The solvers of :class:`Heat` are cached per step size, so
+    keeping it saves the setup of the linear solver.
+    """
+
+    def __init__(
+        self,
+        problem,
+        atol=1.0e-2,
+        rtol=1.0e-4,
+        safety=0.9,
+        min_factor=0.2,
+        max_factor=5.0,
+        keep_factors=(1.0, 1.2),
+    ):
+        self.problem = problem
+        self.atol = atol
+        self.rtol = rtol
+        self.safety = safety
+        self.min_factor = min_factor
+        self.max_factor = max_factor
+        self.keep_factors = keep_factors
+
+        self._m_inv = problem.lumped_mass(inverse=True)
+        self._bcs0 = problem.homogeneous_dirichlet_bcs()
+        # Error norm of the last accepted step, for the PI controller
+        self._error_prev = None
+        # Work vectors
+        self._err = None
+        self._f0 = None
+
+        self.num_accepted = 0
+        self.num_rejected = 0
+        return
+
+    def _error_norm(self, u0, u1, t, dt):
+        if self._err is None:
+            self._err = self.problem.b.copy()
+            self._f0 = self.problem.b.copy()
+        err = self.problem.eval_alpha_M_beta_F(0.0, 1.0, u1, t + dt, out=self._err)
+        f0 = self.problem.eval_alpha_M_beta_F(0.0, 1.0, u0, t, out=self._f0)
+        err.axpy(-1.0, f0)
+        err *= self._m_inv
+        err *= 0.5 * dt
+        for bc in self._bcs0:
+            bc.apply(err)
+
+        scale = numpy.maximum(
+            abs(u0.vector().get_local()), abs(u1.vector().get_local())
+        )
+        e = err.get_local() / (self.atol + self.rtol * scale)
+        comm = self.problem.Q.mesh().mpi_comm()
+        return numpy.sqrt(MPI.sum(comm, float(numpy.dot(e, e))) / err.size())
+
+    def step(self, u0, t, dt):
+        """Step from :code:`t`, trying :code:`dt` first. Returns the solution,
+        the step size actually taken, and the proposed next step size.
+        """
+        dt = float(dt)
+        b = self.problem.M * u0.vector()
+        while True:
+            u1 = self.problem.solve_alpha_M_beta_F(1.0, -dt, b, t + dt)
+            # Avoid division by zero for exact steps
+            error = max(self._error_norm(u0, u1, t, dt), 1.0e-10)
+            if error <= 1.0:
+                break
+            self.num_rejected += 1
+            dt *= max(self.min_factor, self.safety * error ** -0.5)
+
+        self.num_accepted += 1
+        # PI controller; the estimator is of order k=2.
+        factor = self.safety * error ** (-0.7 / 2)
+        if self._error_prev is not None:
+            factor *= self._error_prev ** (0.4 / 2)
+        factor = min(self.max_factor, max(self.min_factor, factor))
+        if self.keep_factors[0] <= factor <= self.keep_factors[1]:
+            factor = 1.0
+        self._error_prev = error
+        return u1, dt, dt * factor
+
+    def integrate(self, u0, t0, t1, dt):
+        """Integrate from :code:`t0` to :code:`t1`, starting with step size
+        :code:`dt`. Returns the solution and the proposed next step size.
+        """
+        u = Function(self.problem.Q)
+        u.assign(u0)
+        t = t0
+        # Avoid a spurious last step due to round-off.
+        while t1 - t > 1.0e-12 * abs(t1):
+            u1, dt_taken, dt = self.step(u, t, min(dt, t1 - t))
+            u.assign(u1)
+            t += dt_taken
+        return u, dt
+
+
+def _evaluate(parameter, theta):
+    """Material parameters are given either as values or, as in the
+    :code:`materials` package, as functions of the temperature.
+    """
+    if isinstance(parameter, Expr) or not callable(parameter):
+        return _as_constant(parameter)
+    return _as_constant(parameter(theta))
+
+
+class NonlinearHeat(object):
+    """
+    Heat equation with temperature-dependent material parameters
+    :math:`\\kappa(\\theta)`, :math:`\\rho(\\theta)`, :math:`c_p(\\theta)`,
+    i.e., the quasilinear problem
+
+    .. math::
+
+        M \\theta' + F(\\theta) = 0
+
+    with :math:`F` from :func:`F`. The parameters are numbers or callables;
+    the latter are evaluated on the temperature :class:`Function` and hence
+    must be made up of operations that UFL understands (like the polynomials
+    in the :code:`materials` package).
+
+    Stationary problems and implicit Euler steps are solved with a chord
+    Newton method: The Jacobian and its AMG preconditioner are kept across
+    iterations *and* time steps. They are only rebuilt if the residual
+    contraction ratio of an iteration exceeds :code:`max_contraction` or if
+    the time step size changes. If a freshly assembled Newton Jacobian
+    doesn't reduce the residual, the Picard linearization (all parameters
+    frozen at the current iterate) is used for the rest of the solve; it is
+    more robust far away from the solution.
+    """
+
+    def __init__(
+        self,
+        Q,
+        kappa,
+        rho,
+        cp,
+        convection,
+        source,
+        dirichlet_bcs=None,
+        neumann_bcs=None,
+        robin_bcs=None,
+        my_dx=dx,
+        my_ds=ds,
+        tol=1.0e-10,
+        max_iter=50,
+        max_contraction=0.5,
+    ):
+        super(NonlinearHeat, self).__init__()
+        self.Q = Q
+        self.dirichlet_bcs = dirichlet_bcs or []
+        self.tol = tol
+        self.max_iter = max_iter
+        self.max_contraction = max_contraction
+
+        self.M = _mass_matrix(Q)
+
+        # The current iterate and the point of the Picard linearization
+        self.theta = Function(Q)
+        self._theta_frozen = Function(Q)
+
+        v = TestFunction(Q)
+        r = SpatialCoordinate(Q.mesh())[0]
+
+        def residual_form(state):
+            return F(
+                self.theta,
+                v,
+                _evaluate(kappa, state),
+                _evaluate(rho, state),
+                _evaluate(cp, state),
+                convection,
+                source,
+                r,
+                neumann_bcs or {},
+                robin_bcs or {},
+                my_dx,
+                my_ds,
+                None,
+            )
+
+        F_newton = residual_form(self.theta)
+        F_picard = residual_form(self._theta_frozen)
+        du = TrialFunction(Q)
+        self._F = Form(F_newton)
+        self._jacobian_forms = {
+            "newton": Form(derivative(F_newton, self.theta, du)),
+            "picard": Form(derivative(F_picard, self.theta, du)),
+        }
+
+        self._bcs0 = _homogenized(self.dirichlet_bcs)
+
+        self._residual = None
+        self._jacobian = None
+        # Time step size the Jacobian was assembled for (None: stationary)
+        self._jacobian_dt = None
+        self._jacobian_valid = False
+
+        # GMRES with BoomerAMG; the preconditioner is rebuilt only along with
+        # the Jacobian.
+        self._solver = _nonsymmetric_amg_solver(
+            "maelstrom_nonlinear_heat_", Heat.convection_solver_options["amg"]
+        )
+
+        # Statistics
+        self.num_jacobian_assemblies = 0
+        # Number of nonlinear iterations of each solve, in order
+        self.num_iterations = []
+        return
+
+    def _assemble_residual(self, theta0, dt):
+        """Assemble :math:`\\frac{1}{\\Delta t} M (\\theta - \\theta_0) +
+        F(\\theta)`, or just :math:`F(\\theta)` for :code:`dt=None`, with
+        zeros at the Dirichlet nodes. Returns its norm.
+        """
+        self._residual = assemble(self._F, tensor=self._residual)
+        if dt is not None:
+            diff = self.theta.vector().copy()
+            diff.axpy(-1.0, theta0.vector())
+            self._residual.axpy(1.0 / dt, self.M * diff)
+        for bc in self._bcs0:
+            bc.apply(self._residual)
+        return self._residual.norm("l2")
+
+    def _assemble_jacobian(self, dt, linearization):
+        if linearization == "picard":
+            self._theta_frozen.assign(self.theta)
+        self._jacobian = assemble(
+            self._jacobian_forms[linearization], tensor=self._jacobian
+        )
+        if dt is not None:
+            self._jacobian.axpy(1.0 / dt, self.M, True)
+        for bc in self._bcs0:
+            bc.apply(self._jacobian)
+        self._solver.set_operator(self._jacobian)
+        self._jacobian_dt = dt
+        self._jacobian_valid = True
+        self.num_jacobian_assemblies += 1
+        return
+
+    def _solve(self, theta0, dt):
+        """Solve the nonlinear system with :code:`self.theta` as initial
+        guess.
+        """
+        for bc in self.dirichlet_bcs:
+            bc.apply(self.theta.vector())
+
+        linearization = "newton"
+        residual_norm = self._assemble_residual(theta0, dt)
+        delta = Function(self.Q).vector()
+        for k in range(self.max_iter):
+            is_fresh = not self._jacobian_valid or dt != self._jacobian_dt
+            if is_fresh:
+                self._assemble_jacobian(dt, linearization)
+
+            delta.zero()
+            self._solver.solve(delta, self._residual)
+            self.theta.vector().axpy(-1.0, delta)
+
+            new_residual_norm = self._assemble_residual(theta0, dt)
+            contraction = (
+                new_residual_norm / residual_norm if residual_norm > 0.0 else 0.0
+            )
+            residual_norm = new_residual_norm
+
+            # Keep the Jacobian as long as it's good enough; it carries over
+            # to the next solve.
+            self._jacobian_valid = contraction <= self.max_contraction
+            if is_fresh and contraction >= 1.0:
+                linearization = "picard"
+
+            if delta.norm("l2") <= self.tol * self.theta.vector().norm("l2"):
+                self.num_iterations.append(k + 1)
+                return
+
+        raise RuntimeError(
+            "Nonlinear heat solver didn't converge in {} iterations "
+            "(||residual|| = {:e}).".format(self.max_iter, residual_norm)
+        )
+
+    def solve_stationary(self, theta_guess=None):
+        """Solve :math:`F(\\theta) = 0` with Dirichlet conditions.
+        """
+        if theta_guess is None:
+            self.theta.vector().zero()
+        else:
+            self.theta.assign(theta_guess)
+        self._solve(None, None)
+        theta = Function(self.Q)
+        theta.assign(self.theta)
+        return theta
+
+    # pylint: disable=unused-argument
+    def step(self, theta0, t, dt):
+        """Implicit Euler step from :code:`theta0` with step size :code:`dt`.
+        """
+        self.theta.assign(theta0)
+        self._solve(theta0, float(dt))
+        theta1 = Function(self.Q)
+        theta1.assign(self.theta)
+        return theta1
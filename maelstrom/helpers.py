@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 #
-from dolfin import DirichletBC, assemble, dx
+from dolfin import DirichletBC, Function, assemble, dx
+import numpy
 
 
 def dbcs_to_productspace(W, bcs_list):
@@ -24,3 +25,63 @@ def average(u):
     """Computes the average value of a function u over its domain.
     """
     return assemble(u * dx) / assemble(1.0 * dx(u.function_space().mesh()))
+
+
+def dg0_cell_dofs(DG):
+    """Map from cell indices to the DOFs of the DG0 space :code:`DG`. Since
+    DG0 has exactly one DOF per cell, these are the DOFs of all cells in the
+    order of the cell indices.
+    """
+    mesh = DG.mesh()
+    return numpy.array(DG.dofmap().entity_dofs(mesh, mesh.topology().dim()), dtype=int)
+
+
+class SubMeshTransfer(object):
+    """Transfer of functions between a function space :code:`V` on a mesh and
+    the same kind of function space :code:`V_submesh` on a :class:`SubMesh` of
+    it.
+
+    The DOFs of a submesh cell are those of its parent cell, in the same
+    order. The map from submesh DOFs to parent DOFs is hence built once from
+    the parent cell indices of the submesh; restriction and prolongation are
+    then plain index operations on the coefficient vectors (i.e.,
+    multiplications with a 0-1 matrix). This is exact and neither needs
+    projections nor point evaluations with extrapolation. Serial only, like
+    :class:`SubMesh`.
+    """
+
+    def __init__(self, V, V_submesh):
+        submesh = V_submesh.mesh()
+        tdim = submesh.topology().dim()
+        parent_cells = submesh.data().array("parent_cell_indices", tdim)
+        dofmap = V.dofmap()
+        submesh_dofmap = V_submesh.dofmap()
+        self.parent_dofs = numpy.empty(V_submesh.dim(), dtype=int)
+        for cell, parent_cell in enumerate(parent_cells):
+            self.parent_dofs[submesh_dofmap.cell_dofs(cell)] = dofmap.cell_dofs(
+                parent_cell
+            )
+        self.V = V
+        self.V_submesh = V_submesh
+        return
+
+    def restrict(self, f, out=None):
+        """Restrict the function :code:`f` on :code:`V` to the submesh.
+        """
+        if out is None:
+            out = Function(self.V_submesh)
+        out.vector().set_local(f.vector().get_local()[self.parent_dofs])
+        out.vector().apply("insert")
+        return out
+
+    def prolong(self, f, out=None):
+        """Extend the function :code:`f` on the submesh to :code:`V`. Outside
+        the submesh, the values of :code:`out` are kept (zero by default).
+        """
+        if out is None:
+            out = Function(self.V)
+        values = out.vector().get_local()
+        values[self.parent_dofs] = f.vector().get_local()
+        out.vector().set_local(values)
+        out.vector().apply("insert")
+        return out
@@ -73,12 +73,15 @@ Here with no convection in direction :math:`\\theta`:
      + \\text{i} \\sigma \\omega u 2 \\pi r v
    = \\int_\\Omega \\sigma v_k v.
 """
+import hashlib
+import os
+
 from dolfin import (
     info,
     DOLFIN_EPS,
     DirichletBC,
     Function,
-    KrylovSolver,
+    PETScKrylovSolver,
     dot,
     grad,
     pi,
@@ -86,13 +89,33 @@ from dolfin import (
     TestFunctions,
     assemble,
     Constant,
-    project,
     FunctionSpace,
     SpatialCoordinate,
     mpi_comm_world,
+    FunctionAssigner,
+    MPI,
+    as_backend_type,
+    Measure,
+    TestFunction,
+    TrialFunction,
+    VectorFunctionSpace,
+    dof_to_vertex_map,
+    vertex_to_dof_map,
+    Circumradius,
+    CompiledSubDomain,
+    FacetNormal,
+    MeshFunction,
+    adapt as dolfin_adapt,
+    avg,
+    dS,
+    div,
+    refine,
+    split,
 )
 import numpy
 
+from . import helpers
+
 
 def solve(
     V,
@@ -106,6 +129,12 @@ def solve(
     bcs=None,
     tol=1.0e-12,
     verbose=False,
+    recycle=True,
+    return_iterations=False,
+    backend="petsc",
+    ds=None,
+    impedance=None,
+    maxiter=100,
 ):
     """Solve the complex-valued time-harmonic Maxwell system in 2D cylindrical
     coordinates
@@ -145,7 +174,35 @@ def solve(
     :param verbose: solver verbosity
     :type verbose: boolean
 
-    :rtype: list of functions
+    :param recycle: use previous solutions for the initial guesses
+    :type recycle: boolean
+
+    :param return_iterations: also return the numbers of Krylov iterations
+                              for all right-hand sides
+    :type return_iterations: boolean
+
+    :param maxiter: maximum number of Krylov iterations; a
+                    :class:`RuntimeError` is raised if the solver doesn't
+                    converge within them
+    :type maxiter: int
+
+    :param backend: :code:`"petsc"` for the real-valued block formulation
+                    (:class:`MaxwellSystem`), :code:`"scipy"` for the
+                    complex-valued one (:class:`ComplexMaxwellSystem`)
+    :type backend: string
+
+    :param ds: boundary measure for :code:`impedance`
+
+    :param impedance: :math:`(\\mu, \\sigma)` of the conductors behind
+                      impedance boundaries, per boundary index of :code:`ds`;
+                      see :class:`MaxwellSystem`
+    :type impedance: dictionary
+
+    For :code:`omega=0` without convections, the magnetostatic problem is
+    solved on :code:`V` only, see :func:`_solve_dc`; the solutions are then
+    :class:`DCPotential` s instead of functions on :math:`V\\times V`.
+
+    :rtype: list of functions (and list of ints)
     """
     # For the exact solution of the magnetic scalar potential, see
     # <http://www.physics.udel.edu/~jim/PHYS809_10F/Class_Notes/Class_26.pdf>.
@@ -178,12 +235,7 @@ def solve(
         # Also, this makes sure that the system is well-defined (see comment
         # below).
         #
-        def xzero(x, on_boundary):
-            return on_boundary and abs(x[0]) < DOLFIN_EPS
-
-        ee = V.ufl_element() * V.ufl_element()
-        VV = FunctionSpace(V.mesh(), ee)
-        bcs = DirichletBC(VV, (0.0, 0.0), xzero)
+        bcs = _axis_bcs(V)
         #
         # Concerning the boundary conditions for the rest of the system:
         # At the other boundaries, it is not uncommon (?) to set so-called
@@ -199,7 +251,6 @@ def solve(
         #
         # <ftp://ftp.math.ethz.ch/pub/sam-reports/reports/reports2010/2010-39.pdf>.
         #
-        # TODO review those, references don't seem to be too accurate
         # Those translate into Robin-type boundary conditions (and are in fact
         # sometimes called that, cf.
         # https://en.wikipedia.org/wiki/Robin_boundary_condition).
@@ -209,25 +260,19 @@ def solve(
         #   T.B.A. Senior,
         #   <http://link.springer.com/content/pdf/10.1007/BF02920074>.
         #
-        # class OuterBoundary(SubDomain):
-        #     def inside(self, x, on_boundary):
-        #         return on_boundary and abs(x[0]) > DOLFIN_EPS
-        # boundaries = MeshFunction(
-        #     'size_t', mesh,
-        #     mesh.topology().dim() - 1
-        #     )
-        # boundaries.set_all(0)
-        # outer_boundary = OuterBoundary()
-        # outer_boundary.mark(boundaries, 1)
-        # ds = Measure('ds')[boundaries]
-        # #n = FacetNormal(mesh)
-        # #a += - 1.0/Mu[i] * dot(grad(r*ur), n) * vr * ds(1) \
-        # #     - 1.0/Mu[i] * dot(grad(r*ui), n) * vi * ds(1)
-        # #L += - 1.0/Mu[i] * 1.0 * vr * ds(1) \
-        # #     - 1.0/Mu[i] * 1.0 * vi * ds(1)
-        # # This is -n.grad(r u) = u:
-        # a += 1.0/Mu[i] * ur * vr * ds(1) \
-        #    + 1.0/Mu[i] * ui * vi * ds(1)
+        # They are available for conductors which aren't part of the mesh
+        # (typically the coils) via `impedance`, see MaxwellSystem.
+
+    if omega == 0.0 and not convections:
+        # Magnetostatics: The real and imaginary parts decouple, and both are
+        # governed by the same symmetric positive definite operator. (The
+        # impedance conditions vanish for omega=0, too.)
+        phi_list, iterations = _solve_dc(
+            V, dx, Mu, f_list, f_degree, bcs, tol=tol, verbose=verbose, maxiter=maxiter
+        )
+        if return_iterations:
+            return phi_list, iterations
+        return phi_list
 
     # Create the system matrix, preconditioner, and the right-hand sides.
     # For preconditioners, there are two approaches. The first one, described
@@ -238,20 +283,383 @@ def solve(
     #     <https://ieeexplore.ieee.org/stamp/stamp.jsp?tp=&arnumber=877730>
     #
     # doesn't work too well here.
-    # The matrix P, created in build_system(), provides a better alternative.
-    # For more details, see documentation in build_system().
+    # The matrix P, created in MaxwellSystem, provides a better alternative.
+    # For more details, see documentation there.
     #
-    A, P, b_list, _, W = build_system(
-        V, dx, Mu, Sigma, omega, f_list, f_degree, convections, bcs
+    if backend == "petsc":
+        System = MaxwellSystem
+    else:
+        assert backend == "scipy", "Unknown backend '{}'".format(backend)
+        System = ComplexMaxwellSystem
+    system = System(
+        V,
+        dx,
+        Mu,
+        Sigma,
+        f_list,
+        f_degree,
+        convections,
+        bcs,
+        ds=ds,
+        impedance=impedance,
     )
+    return system.solve_at(
+        [omega],
+        tol=tol,
+        verbose=verbose,
+        recycle=recycle,
+        return_iterations=return_iterations,
+        maxiter=maxiter,
+    )[0]
+
+
+def _axis_bcs(V):
+    """Homogeneous Dirichlet conditions for :math:`\\phi` at :math:`r=0`, see
+    :func:`solve`.
+    """
+
+    def xzero(x, on_boundary):
+        return on_boundary and abs(x[0]) < DOLFIN_EPS
+
+    ee = V.ufl_element() * V.ufl_element()
+    VV = FunctionSpace(V.mesh(), ee)
+    return DirichletBC(VV, (0.0, 0.0), xzero)
+
+
+def _solve_dc(
+    V, dx, Mu, f_list, f_degree, bcs, tol=1.0e-12, verbose=False, maxiter=100
+):
+    """Solve :func:`solve` for :math:`\\omega=0` without convections. Then,
+    real and imaginary part are decoupled solutions of
+
+    .. math::
+        -\\div\\left(\\frac{1}{\\mu r} \\nabla(r\\phi)\\right) = f,
+
+    so only the scalar operator on :code:`V` is assembled and solved for with
+    CG and BoomerAMG. Imaginary parts which are zero (i.e., with zero source
+    terms and boundary values) are neither solved for nor stored, see
+    :class:`DCPotential`.
+
+    :code:`bcs` is a :class:`DirichletBC` on :math:`V\\times V` with a constant
+    value, cf. :func:`_axis_bcs`. Returns the solutions as
+    :class:`DCPotential` s and the total numbers of CG iterations per
+    right-hand side.
+    """
+    bc_values = bcs.value().values()
+    bcs_dc = [_component_bc(bcs, V, k) for k in range(2)]
+
+    u = TrialFunction(V)
+    v = TestFunction(V)
+    r = SpatialCoordinate(V.mesh())[0]
+    inv_mu = _dg0_field(dx.subdomain_data(), {i: 1.0 / Mu[i] for i in Mu})
+    K = assemble(_stiffness(u, v, r, dx, inv_mu, {}))
+    # The rows of the Dirichlet DOFs are the same for both components.
+    bcs_dc[0].apply(K)
+
+    solver = PETScKrylovSolver("cg", "hypre_amg")
+    solver.parameters["relative_tolerance"] = tol
+    solver.parameters["absolute_tolerance"] = 0.0
+    solver.parameters["maximum_iterations"] = maxiter
+    solver.parameters["report"] = verbose
+    solver.parameters["monitor_convergence"] = verbose
+    solver.set_operator(K)
+
+    phi_list = []
+    iterations = []
+    for k, f in enumerate(f_list):
+        parts = [Function(V), None]
+        num_iterations = 0
+        for part in range(2):
+            if bc_values[part] == 0.0 and _vanishes(f, part):
+                continue
+            b = assemble(_source(v, r, dx, f, f_degree, part))
+            bcs_dc[part].apply(b)
+            if parts[part] is None:
+                parts[part] = Function(V)
+            num_iterations += solver.solve(parts[part].vector(), b)
+        phi_list.append(DCPotential(*parts))
+        phi_list[-1].rename("phi{}".format(k), "phi{}".format(k))
+        iterations.append(num_iterations)
+
+    return phi_list, iterations
+
+
+class DCPotential(object):
+    """Potential of the magnetostatic problem (:math:`\\omega=0`), see
+    :func:`_solve_dc`, with the real and the imaginary part as functions on
+    :code:`V`. If the imaginary part vanishes (:code:`imag=None`), it isn't
+    stored at all; :code:`is_real` is set then.
+
+    Like functions on :math:`V\\times V` and the potentials from
+    :func:`compute_potential`, it is indexed by 0 (real part) and 1
+    (imaginary part, a zero :class:`Constant` if it vanishes), so it can be
+    passed to :func:`compute_joule`, :func:`compute_lorentz`, and
+    :func:`error_indicators`.
+    """
+
+    def __init__(self, real, imag=None):
+        self.real = real
+        self.imag = imag
+        self.is_real = imag is None
+        return
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, k):
+        if k == 0:
+            return self.real
+        if k == 1:
+            return Constant(0.0) if self.is_real else self.imag
+        raise IndexError("DCPotential index out of range")
+
+    def rename(self, name, label):
+        self.real.rename("Re({})".format(name), "Re({})".format(label))
+        if not self.is_real:
+            self.imag.rename("Im({})".format(name), "Im({})".format(label))
+        return
+
+
+def _potential_vectors(phi, V):
+    """The coefficient vectors of the real and the imaginary part of the
+    potential :code:`phi` (a function on :math:`V\\times V` or a
+    :class:`DCPotential`) on :code:`V`. The imaginary one is :code:`None` if
+    it isn't stored.
+    """
+    if isinstance(phi, DCPotential):
+        imag = None if phi.is_real else phi.imag.vector()
+        return phi.real.vector(), imag
+    parts = [Function(V), Function(V)]
+    FunctionAssigner([V, V], phi.function_space()).assign(parts, phi)
+    return parts[0].vector(), parts[1].vector()
+
+
+def _scalar_space(phi):
+    """The space :code:`V` of the real and the imaginary part of the
+    potential :code:`phi`, cf. :func:`_potential_vectors`.
+    """
+    if isinstance(phi, DCPotential):
+        return phi.real.function_space()
+    return phi.function_space().sub(0).collapse()
+
+
+def _potential_values(phi, V):
+    """The complex values of the potential :code:`phi` at the DOFs of
+    :code:`V`, cf. :func:`_potential_vectors`.
+    """
+    real, imag = _potential_vectors(phi, V)
+    values = real.get_local().astype(complex)
+    if imag is not None:
+        values += 1j * imag.get_local()
+    return values
+
+
+def _component_bc(bc, V, k):
+    """The Dirichlet condition :code:`bc` on :math:`V\\times V` for the
+    component :code:`k` only, on :code:`V`.
+    """
+    return DirichletBC(V, Constant(float(bc.value().values()[k])), *bc.domain_args)
+
+
+def _vanishes(f, part):
+    """Whether the real (:code:`part=0`) or imaginary (:code:`part=1`) part of
+    the right-hand side :code:`f` is known to be zero without evaluating it,
+    i.e., if all its values are zero numbers or :class:`Constant` s.
+    """
+    for fval in f.values():
+        value = fval[part]
+        if isinstance(value, Constant):
+            value = value.values()[0]
+        if not isinstance(value, (int, float)) or value != 0.0:
+            return False
+    return True
+
+
+def adapt(
+    subdomains,
+    Mu,
+    Sigma,
+    omega,
+    f_list,
+    convections,
+    f_degree=None,
+    tol=1.0e-3,
+    theta=0.5,
+    max_levels=10,
+    verbose=True,
+    **kwargs
+):
+    """Adaptive version of :func:`solve`: Starting from the mesh of the
+    subdomain markers :code:`subdomains`, repeatedly solve on piecewise linear
+    elements, estimate the error (see :func:`error_indicators`), and refine
+    the cells with the largest indicators (:func:`doerfler_marking`) until
+    the estimate falls below :code:`tol` or :code:`max_levels` refinements
+    are reached. The subdomain markers are transferred to each refined mesh.
+
+    Since the potential in conductors decays within the skin depth, the
+    refinement concentrates in thin layers along their surfaces, and a given
+    accuracy is reached with far fewer DOFs than on uniformly fine meshes.
+
+    All other arguments are passed on to :func:`solve`. Returns the solutions
+    on the final mesh and the subdomain markers on it.
+    """
+    for level in range(max_levels + 1):
+        mesh = subdomains.mesh()
+        V = FunctionSpace(mesh, "CG", 1)
+        dx = Measure("dx", subdomain_data=subdomains)
+        phi_list = solve(
+            V, dx, Mu, Sigma, omega, f_list, convections, f_degree=f_degree, **kwargs
+        )
+
+        eta2 = sum(
+            error_indicators(
+                phi, f, f_degree, subdomains, Mu, Sigma, omega, convections
+            )
+            for phi, f in zip(phi_list, f_list)
+        )
+        estimate = numpy.sqrt(MPI.sum(mesh.mpi_comm(), numpy.sum(eta2)))
+        if verbose:
+            info(
+                "Level {}: {} cells, error estimate {:e} (tol {:e})".format(
+                    level, mesh.num_cells(), estimate, tol
+                )
+            )
+        if estimate < tol or level == max_levels:
+            break
+
+        mesh = refine(mesh, doerfler_marking(mesh, eta2, theta))
+        subdomains = dolfin_adapt(subdomains, mesh)
+
+    return phi_list, subdomains
+
+
+def error_indicators(phi, f, f_degree, subdomains, Mu, Sigma, omega, convections):
+    """Residual-based error indicators :math:`\\eta_T^2` (:cite:`Ver1994`) for
+    the solution :code:`phi` of :func:`solve` with right-hand side :code:`f`,
+
+    .. math::
+        \\eta_T^2 = h_T^2 \\|R\\|_T^2
+            + \\frac{1}{2} \\sum_{E\\subset\\partial T\\setminus\\Gamma} h_E
+              \\left\\|\\left[n\\cdot\\frac{1}{\\mu r}\\nabla(r\\phi)\\right]
+              \\right\\|_E^2
+            + \\sum_{E\\subset\\partial T\\cap\\Gamma_N} h_E
+              \\left\\|n\\cdot\\frac{1}{\\mu r}\\nabla(r\\phi)\\right\\|_E^2
+
+    with the cell residual
+
+    .. math::
+        R = f + \\div\\left(\\frac{1}{\\mu r} \\nabla(r\\phi)\\right)
+          - \\left\\langle u, \\frac{1}{r} \\nabla(r\\phi)\\right\\rangle
+          - \\text{i} \\sigma \\omega \\phi,
+
+    all in the norms with weight :math:`2\\pi r`. The flux residual is taken
+    across interior facets (including material interfaces) and on the
+    natural boundary :math:`\\Gamma_N`, i.e., all of the boundary except the
+    axis :math:`r=0` where :math:`\\phi` is prescribed (cf. :func:`solve`).
+    All indicators are assembled at once as the coefficients of a DG0 test
+    function. Returns a numpy array ordered by cell index.
+    """
+    mesh = subdomains.mesh()
+    DG = FunctionSpace(mesh, "DG", 0)
+    v = TestFunction(DG)
+    r = SpatialCoordinate(mesh)[0]
+    h = 2 * Circumradius(mesh)
+    n = FacetNormal(mesh)
+
+    # The boundary facets on the axis get the marker 1.
+    axis = MeshFunction("size_t", mesh, mesh.topology().dim() - 1)
+    axis.set_all(0)
+    CompiledSubDomain("on_boundary && near(x[0], 0.0)").mark(axis, 1)
+    ds = Measure("ds", subdomain_data=axis)
+    dx = Measure("dx", domain=mesh)
+
+    # Material parameters, sources, and convections as DG0 fields (the latter
+    # two via subdomain indicators) give a single cell integral.
+    cell_dofs = helpers.dg0_cell_dofs(DG)
+    inv_mu = _dg0_field(subdomains, {i: 1.0 / Mu[i] for i in Mu}, cell_dofs=cell_dofs)
+    sigma = _dg0_field(subdomains, Sigma, cell_dofs=cell_dofs)
+
+    if not isinstance(phi, DCPotential):
+        phi = split(phi)
+    R = [div(inv_mu / r * grad(r * phi[k])) for k in range(2)]
+    R[0] += sigma * omega * phi[1]
+    R[1] -= sigma * omega * phi[0]
+    for i in set(f) | set(convections):
+        indicator = _dg0_field(subdomains, {i: 1.0}, cell_dofs=cell_dofs)
+        if i in f:
+            R = [R[k] + indicator * f[i][k] for k in range(2)]
+        if i in convections:
+            R = [
+                R[k] - indicator * dot(convections[i], grad(r * phi[k])) / r
+                for k in range(2)
+            ]
+
+    eta2 = h ** 2 * (R[0] ** 2 + R[1] ** 2) * v * 2 * pi * r * dx(degree=f_degree)
+    for k in range(2):
+        flux = inv_mu / r * grad(r * phi[k])
+        jump_flux = dot(flux("+"), n("+")) + dot(flux("-"), n("-"))
+        eta2 += avg(h) * jump_flux ** 2 * avg(v) * 2 * pi * avg(r) * dS
+        eta2 += h * dot(flux, n) ** 2 * v * 2 * pi * r * ds(0)
+
+    return assemble(eta2).get_local()[cell_dofs]
+
+
+def doerfler_marking(mesh, eta2, theta):
+    """Mark the smallest set of cells whose indicators :code:`eta2` make up
+    the fraction :code:`theta` of the total estimate :math:`\\sum_T\\eta_T^2`
+    (:cite:`Doe1996`). The marking is done on each process separately.
+    """
+    order = numpy.argsort(eta2)[::-1]
+    cumulative = numpy.cumsum(eta2[order])
+    num_marked = numpy.searchsorted(cumulative, theta * cumulative[-1]) + 1
+    is_marked = numpy.zeros(len(eta2), dtype=bool)
+    is_marked[order[:num_marked]] = True
+
+    markers = MeshFunction("bool", mesh, mesh.topology().dim())
+    markers.set_values(is_marked)
+    return markers
+
 
-    # prepare solver
-    # Don't use 'amg', since that defaults to `ml_amg` if available which
-    # crashes
-    # <https://bitbucket.org/fenics-project/docker/issues/61/petsc-vectorfunctionspace-amg-malloc>.
-    solver = KrylovSolver("gmres", "hypre_amg")
+def _krylov_solver(A, P, W, block_amg=True, bcs=None):
+    """GMRES for :math:`A x = b` with the preconditioner :math:`P`.
+
+    If :code:`block_amg` is set, only one AMG hierarchy is built for the
+    block :math:`K+M` of :math:`P` (see :class:`_BlockAMG`). This requires
+    petsc4py and a serial run; otherwise, BoomerAMG is applied to all of
+    :math:`P`. :code:`bcs` are the Dirichlet conditions applied to :math:`P`.
+
+    The preconditioner is set up in the first solve and kept when the
+    operators are replaced later on, see :meth:`MaxwellSystem.solve_at`.
+    """
+    context = None
+    if block_amg and MPI.size(W.mesh().mpi_comm()) == 1:
+        try:
+            dofs = _complex_dofs(W.sub(0).collapse(), W)
+            bc_dofs = list(bcs.get_boundary_values().keys()) if bcs else []
+            context = _BlockAMG(P, dofs, bc_dofs)
+        except ImportError:
+            pass
+
+    if context is None:
+        # Don't use 'amg', since that defaults to `ml_amg` if available which
+        # crashes
+        # <https://bitbucket.org/fenics-project/docker/issues/61/petsc-vectorfunctionspace-amg-malloc>.
+        solver = PETScKrylovSolver("gmres", "hypre_amg")
+    else:
+        solver = PETScKrylovSolver("gmres")
+        pc = solver.ksp().getPC()
+        pc.setType("python")
+        pc.setPythonContext(context)
+    solver.set_reuse_preconditioner(True)
     solver.set_operators(A, P)
+    return solver
+
 
+def _solve_all(solver, A, b_list, W, tol, verbose, recycle, x0_list=None, maxiter=100):
+    """Solve :math:`A x = b` for all right-hand sides with the
+    :func:`_krylov_solver` :code:`solver`. If given, :code:`x0_list` are the
+    initial guesses. Returns the solutions and the numbers of iterations.
+    """
     # The PDE for A has huge coefficients (order 10^8) all over. Hence, if
     # relative residual is set to 10^-6, the actual residual will still be of
     # the order 10^2. While this isn't too bad (after all the equations are
@@ -259,21 +667,234 @@ def solve(
     # tolerance here to get a visually pleasing residual norm.
     solver.parameters["relative_tolerance"] = tol
     solver.parameters["absolute_tolerance"] = 0.0
-    solver.parameters["maximum_iterations"] = 100
+    solver.parameters["maximum_iterations"] = maxiter
     solver.parameters["report"] = verbose
     solver.parameters["monitor_convergence"] = verbose
 
+    # All right-hand sides are solved with the same operator and
+    # preconditioner; the AMG setup only happens in the first solve.
+    #
+    # The right-hand sides of neighboring coil rings are similar, and so are
+    # the solutions. For the initial guess, take the combination of all
+    # previous solutions x_j with minimal residual, i.e., minimize
+    # ||b - sum_j c_j A x_j||. This only takes one extra matrix-vector product
+    # per right-hand side. The Gram matrix G of the A x_j is extended by one
+    # row and column per solution.
+    #
+    # Initial guesses from an earlier solve (e.g., before a small change of
+    # the conductivity) take precedence.
+    solver.parameters["nonzero_initial_guess"] = recycle or x0_list is not None
+    AX = []
+    G = numpy.empty((len(b_list), len(b_list)))
     phi_list = []
+    iterations = []
     for k, b in enumerate(b_list):
         phi_list.append(Function(W))
         phi_list[-1].rename("phi{}".format(k), "phi{}".format(k))
-        solver.solve(phi_list[-1].vector(), b)
+        x = phi_list[-1].vector()
+        if x0_list is not None:
+            x.axpy(1.0, x0_list[k].vector())
+        elif recycle and AX:
+            rhs = numpy.array([ax.inner(b) for ax in AX])
+            c = numpy.linalg.lstsq(G[:k, :k], rhs, rcond=1.0e-12)[0]
+            for cj, phi in zip(c, phi_list[:-1]):
+                x.axpy(float(cj), phi.vector())
+        iterations.append(solver.solve(x, b))
+        if recycle:
+            AX.append(A * x)
+            G[k, : k + 1] = [AX[k].inner(ax) for ax in AX]
+            G[: k + 1, k] = G[k, : k + 1]
+
+    return phi_list, iterations
+
+
+def _source(v, r, dx, f, f_degree, part):
+    """The form of the real (:code:`part=0`) or imaginary (:code:`part=1`)
+    part of the right-hand side :code:`f`, multiplied by :math:`2\\pi r v`.
+    """
+    L = Constant(0.0) * v * dx(0)
+    for i, fval in f.items():
+        L += fval[part] * v * 2 * pi * r * dx(i, degree=f_degree)
+    return L
 
-    return phi_list
 
+def _stiffness(u, v, r, dx, inv_mu, convections):
+    """The form of
 
-def build_system(V, dx, Mu, Sigma, omega, f_list, f_degree, convections, bcs):
-    """Build FEM system for
+    .. math::
+        -\\div\\left(\\frac{1}{\\mu r} \\nabla(r u)\\right)
+        + \\left\\langle b, \\frac{1}{r} \\nabla(r u)\\right\\rangle,
+
+    multiplied by :math:`2\\pi r v` and integrated over the domain.
+    :code:`inv_mu` is the DG0 field of :math:`1/\\mu`, see
+    :func:`_dg0_field`.
+    """
+    # The term 1/r looks like it might cause problems. The dubious
+    # term is
+    #
+    #  1/r d/dr (r u_r) = u_r + 1/r du_r/dr,
+    #
+    # so we have to make sure that 1/r du_r/dr is bounded for all
+    # trial functions u. This is guaranteed when taking Dirichlet
+    # boundary conditions at r=0.
+    #
+    # The material parameters are DG0 fields rather than one integral per
+    # subdomain. This gives a single cell integral, independent of the number
+    # of subdomains; the values don't end up in the form signature either, so
+    # no JIT compilation is needed for new values.
+    k = inv_mu / r * dot(grad(r * u), grad(r * v)) * 2 * pi * dx
+    # Don't do anything at the interior boundary. Taking the Poisson
+    # problem as an example, the weak formulation is
+    #
+    #     \int \Delta(u) v = -\int grad(u).grad(v) + \int_ n.grad(u) v.
+    #
+    # If we have 'artificial' boundaries through the domain, we would
+    # like to make sure that along those boundaries, the equation is
+    # exactly what it would be without the them. The important case
+    # to look at are the trial and test functions which are nonzero on
+    # the boundary. It is clear that the integral along the interface
+    # boundary has to be omitted.
+
+    if convections:
+        k += _convection(u, v, r, dx, convections)
+    return k
+
+
+def _convection(u, v, r, dx, convections):
+    """The form of :math:`\\left\\langle b, \\frac{1}{r} \\nabla(r u)\\right\\rangle`
+    with the convections :math:`b` per subdomain, multiplied by
+    :math:`2\\pi r v`.
+    """
+    # Add the convective component for the workpiece,
+    #   a += <u, 1/r grad(r phi)> *2*pi*r*dx
+    c = 0
+    for i, conv in convections.items():
+        c += dot(conv, grad(r * u)) * v * 2 * pi * dx(i)
+    return c
+
+
+def _sigma_mass(u, v, r, dx, sigma):
+    """The :math:`\\sigma`-weighted mass form :math:`\\int \\sigma u v 2\\pi r`
+    with the DG0 field :code:`sigma`.
+    """
+    return sigma * u * v * 2 * pi * r * dx
+
+
+def _impedance_mass(u, v, r, ds, impedance):
+    """The form :math:`\\int_\\Gamma \\kappa_1 u v 2\\pi r` over the impedance
+    boundaries, see :class:`MaxwellSystem`. :code:`impedance` maps boundary
+    indices of :code:`ds` to the :math:`(\\mu, \\sigma)` of the conductor
+    behind them, and
+
+    .. math::
+        \\kappa_1 = \\sqrt{\\frac{\\sigma}{2\\mu}}
+        = \\frac{1}{\\sqrt{\\omega}\\,\\mu\\delta}
+
+    with the skin depth :math:`\\delta`, i.e., the form is scaled to
+    :math:`\\omega=1`.
+    """
+    z = 0
+    for i, (mu, sigma) in impedance.items():
+        kappa = numpy.sqrt(0.5 * sigma / mu)
+        z += Constant(kappa) * u * v * 2 * pi * r * ds(i)
+    return z
+
+
+def _restrict_keys(values, subdomains):
+    """The keys of :code:`values` which are among :code:`subdomains` (a tuple of
+    subdomain indices, or a :class:`MeshFunction` for all).
+    """
+    if isinstance(subdomains, tuple):
+        return [i for i in values if i in subdomains]
+    return list(values)
+
+
+def _dg0_field(subdomains, values, out=None, cell_dofs=None):
+    """DG0 function with the value :code:`values[i]` in all cells of subdomain
+    :code:`i`. If given, the function :code:`out` is filled in place, and
+    the cells of all other subdomains keep their values (0 for new
+    functions). :code:`cell_dofs` is the output of :func:`helpers.dg0_cell_dofs`
+    and can be passed to avoid recomputing it.
+    """
+    if out is None:
+        out = Function(FunctionSpace(subdomains.mesh(), "DG", 0))
+    if not values:
+        return out
+    if cell_dofs is None:
+        cell_dofs = helpers.dg0_cell_dofs(out.function_space())
+    markers = subdomains.array()
+    table = numpy.full(max(markers.max(), max(values)) + 1, numpy.nan)
+    table[list(values.keys())] = list(values.values())
+    cell_values = out.vector().get_local()
+    new_values = table[markers]
+    is_set = ~numpy.isnan(new_values)
+    cell_values[cell_dofs[is_set]] = new_values[is_set]
+    out.vector().set_local(cell_values)
+    out.vector().apply("insert")
+    return out
+
+
+class _BlockAMG(object):
+    """petsc4py Python context for the preconditioner
+
+    .. math::
+        P = \\begin{pmatrix} K+M & \\\\ & -(K+M) \\end{pmatrix}
+
+    of :cite:`KL2012`. BoomerAMG isn't given the interleaved 2-by-2 system,
+    but only the scalar diffusion-reaction block :math:`K+M`. Its hierarchy
+    is then applied to the real and (with flipped sign) to the imaginary
+    part. :code:`dofs` are the DOFs of the real and imaginary parts in
+    corresponding order, see :func:`_complex_dofs`.
+
+    The Dirichlet rows of both blocks of :math:`P` are rows of the identity,
+    i.e., they aren't negated in the imaginary block. With the real block
+    :math:`B` and the diagonal matrix :math:`S` of signs (:math:`+1` in the
+    rows of :code:`bc_dofs`, the Dirichlet DOFs of :math:`P`, and
+    :math:`-1` elsewhere), the imaginary block is :math:`SB`. Its inverse
+    :math:`B^{-1}S` is applied by flipping the signs of the input.
+    """
+
+    def __init__(self, P, dofs, bc_dofs=()):
+        from petsc4py import PETSc
+
+        P = as_backend_type(P).mat()
+        self._index_sets = [
+            PETSc.IS().createGeneral(numpy.asarray(d, dtype=PETSc.IntType))
+            for d in dofs
+        ]
+        block = P.createSubMatrix(self._index_sets[0], self._index_sets[0])
+        self._amg = PETSc.PC().create(P.getComm())
+        self._amg.setType("hypre")
+        self._amg.setHYPREType("boomeramg")
+        self._amg.setOperators(block)
+        self._amg.setUp()
+
+        # Signs for the imaginary part: -1, except for the Dirichlet rows.
+        is_bc = numpy.isin(dofs[1], numpy.asarray(bc_dofs, dtype=int))
+        self._signs = block.createVecLeft()
+        self._signs.setArray(numpy.where(is_bc, 1.0, -1.0))
+        self._work = block.createVecLeft()
+        return
+
+    def setUp(self, pc):
+        return
+
+    def apply(self, pc, x, y):
+        for k, index_set in enumerate(self._index_sets):
+            x_k = x.getSubVector(index_set)
+            y_k = y.getSubVector(index_set)
+            if k == 0:
+                self._amg.apply(x_k, y_k)
+            else:
+                self._work.pointwiseMult(x_k, self._signs)
+                self._amg.apply(self._work, y_k)
+            x.restoreSubVector(index_set, x_k)
+            y.restoreSubVector(index_set, y_k)
+        return
+
+
+class MaxwellSystem(object):
+    """FEM system for
 
     .. math::
          \\div\\left(\\frac{1}{\\mu r} \\nabla(r\\phi)\\right)
@@ -281,144 +902,769 @@ def build_system(V, dx, Mu, Sigma, omega, f_list, f_degree, convections, bcs):
          + \\text{i} \\sigma \\omega \\phi
             = f
 
-    by multiplying with :math:`2\\pi r v` and integrating over the domain and
-    the preconditioner given by :cite:`KL2012`.
-    """
-    r = SpatialCoordinate(V.mesh())[0]
+    by multiplying with :math:`2\\pi r v` and integrating over the domain,
+    and the preconditioner given by :cite:`KL2012`.
 
-    subdomain_indices = Mu.keys()
+    Only the term with :math:`\\omega` depends on the frequency. The
+    stiffness and the :math:`\\sigma`-weighted mass blocks are hence assembled
+    once, and the system matrix and the preconditioner for any given
+    :math:`\\omega` are formed as linear combinations of them, see
+    :meth:`assemble_at`. Frequency sweeps are done with :meth:`solve_at`.
 
-    ee = V.ufl_element() * V.ufl_element()
-    W = FunctionSpace(V.mesh(), ee)
+    Optionally, conductors (typically the coils) aren't meshed, but enter as
+    impedance boundary conditions (:cite:`Sen1960`, :cite:`Cha97`) on the
+    boundaries :code:`impedance` of :code:`ds`, see :func:`_impedance_mass`.
+    At high frequencies, the potential decays within the skin depth
+    :math:`\\delta` behind the surface like
+    :math:`\\exp(-(1+\\text{i})x/\\delta)`. This gives the flux
+    :math:`\\frac{1}{\\mu} n\\cdot\\nabla\\phi = -(1+\\text{i})\\kappa\\phi` with
+    :math:`\\kappa = 1/(\\mu\\delta)`, i.e., the boundary term
 
-    # Bilinear form.
-    ur, ui = TrialFunctions(W)
-    vr, vi = TestFunctions(W)
+    .. math::
+        \\int_\\Gamma \\kappa [(u_r-u_i) v_r + (u_r+u_i) v_i] 2\\pi r.
 
-    # build right-hand sides
-    b_list = []
-    for f in f_list:
-        L = +Constant(0.0) * vr * dx(0) + Constant(0.0) * vi * dx(0)
-        for i, fval in f.items():
-            L += +fval[0] * vr * 2 * pi * r * dx(i, degree=f_degree) + fval[
-                1
-            ] * vi * 2 * pi * r * dx(i, degree=f_degree)
-        b_list.append(assemble(L))
-
-    # div(1/(mu r) grad(r phi)) + i sigma omega phi
-    #
-    # Split up diffusive and reactive terms to be able to assemble them with
-    # different FFC parameters.
-    #
-    # Make omega a constant function to avoid rebuilding the equation system
-    # when omega changes.
-    om = Constant(omega)
-    a1 = Constant(0.0) * ur * vr * dx(0)
-    a2 = Constant(0.0) * ur * vr * dx(0)
-    for i in subdomain_indices:
-        # The term 1/r looks like it might cause problems. The dubious term is
-        #
-        #  1/r d/dr (r u_r) = u_r + 1/r du_r/dr,
-        #
-        # so we have to make sure that 1/r du_r/dr is bounded for all trial
-        # functions u. This is guaranteed when taking Dirichlet boundary
-        # conditions at r=0.
-        sigma = Constant(Sigma[i])
-        a1 += +1.0 / (Mu[i] * r) * dot(grad(r * ur), grad(r * vr)) * 2 * pi * dx(
-            i
-        ) + 1.0 / (Mu[i] * r) * dot(grad(r * ui), grad(r * vi)) * 2 * pi * dx(i)
-        a2 += -om * sigma * ui * vr * 2 * pi * r * dx(
-            i
-        ) + om * sigma * ur * vi * 2 * pi * r * dx(i)
-        # Don't do anything at the interior boundary. Taking the Poisson
-        # problem as an example, the weak formulation is
-        #
-        #     \int \Delta(u) v = -\int grad(u).grad(v) + \int_ n.grad(u) v.
-        #
-        # If we have 'artificial' boundaries through the domain, we would
-        # like to make sure that along those boundaries, the equation is
-        # exactly what it would be without the them. The important case to
-        # look at are the trial and test functions which are nonzero on
-        # the boundary. It is clear that the integral along the interface
-        # boundary has to be omitted.
+    Since :math:`\\kappa` is proportional to :math:`\\sqrt{\\omega}`, the
+    matrix is assembled for :math:`\\omega=1` and scaled in
+    :meth:`assemble_at`. The mesh then needs no boundary layers in the
+    conductors.
+    """
 
-    # Add the convective component for the workpiece,
-    #   a += <u, 1/r grad(r phi)> *2*pi*r*dx
-    for i, conv in convections.items():
-        a1 += +dot(conv, grad(r * ur)) * vr * 2 * pi * dx(i) + dot(
-            conv, grad(r * ui)
-        ) * vi * 2 * pi * dx(i)
-
-    force_m_matrix = False
-    if force_m_matrix:
-        A1 = assemble(a1)
-        A2 = assemble(
-            a2,
-            form_compiler_parameters={
-                "quadrature_rule": "vertex",
-                "quadrature_degree": 1,
-            },
+    def __init__(
+        self,
+        V,
+        dx,
+        Mu,
+        Sigma,
+        f_list,
+        f_degree,
+        convections,
+        bcs,
+        ds=None,
+        impedance=None,
+    ):
+        r = SpatialCoordinate(V.mesh())[0]
+
+        ee = V.ufl_element() * V.ufl_element()
+        self.W = FunctionSpace(V.mesh(), ee)
+        self.bcs = bcs
+
+        # Material fields
+        self._subdomains = dx.subdomain_data()
+        DG = FunctionSpace(V.mesh(), "DG", 0)
+        self._cell_dofs = helpers.dg0_cell_dofs(DG)
+        self.inv_mu = Function(DG, name="1/mu")
+        self.sigma = Function(DG, name="sigma")
+        self.update_materials(Mu, Sigma, reassemble=False)
+
+        # Bilinear form.
+        ur, ui = TrialFunctions(self.W)
+        vr, vi = TestFunctions(self.W)
+
+        # build right-hand sides
+        self.b_list = []
+        for f in f_list:
+            L = _source(vr, r, dx, f, f_degree, 0) + _source(vi, r, dx, f, f_degree, 1)
+            self.b_list.append(assemble(L))
+
+        # div(1/(mu r) grad(r phi)) + i sigma omega phi
+        #
+        # The system matrix is
+        #
+        #     A(omega) = K + omega * M_sigma,
+        #
+        # with the stiffness K and the off-diagonal sigma-weighted mass
+        # M_sigma. K is the sum of the material part and the convection
+        # K_conv, which are kept separately so that either can be updated
+        # alone.
+        #
+        # All forms are defined on W x W, so all matrices share the same
+        # sparsity pattern and can be combined in place.
+        self._r = r
+        self._dx = dx
+        self._forms = self._material_forms(self.inv_mu, self.sigma, dx)
+        self._tensors = [assemble(form) for form in self._forms]
+        # Work storage for updates restricted to subdomains: the changes of
+        # the material fields, the previous values, and per set of
+        # subdomains the forms of the changes with their tensors.
+        self._deltas = [Function(self.inv_mu.function_space()) for _ in range(2)]
+        self._old_values = [self.inv_mu.vector().copy(), self.sigma.vector().copy()]
+        self._delta_forms = {}
+        self.M_sigma, self.K_pc, self.M_sigma_pc = self._tensors[1:]
+        self.K = self._tensors[0]
+        self.K_conv = None
+        self.update_convections(convections)
+
+        # Assembling the system into one single object makes it possible to
+        # extract .data() for conversion to SciPy's sparse types later.
+        self.A = self.K.copy()
+        self.P = self.K_pc.copy()
+
+        # Impedance boundary conditions at omega=1, and the corresponding
+        # blocks of the preconditioner,
+        #
+        #     ( 2 Z      )
+        #     (     -2 Z ),
+        #
+        # analogous to K + M_sigma. The zero cell integral gives the matrices
+        # the same sparsity pattern as all others.
+        self._ds = ds
+        self._impedance = impedance if impedance else {}
+        self.Z = None
+        self.Z_pc = None
+        if self._impedance:
+            imp = self._impedance
+            zero = Constant(0.0) * (ur + ui) * (vr + vi) * dx
+            self.Z = assemble(
+                zero
+                + _impedance_mass(ur, vr, r, ds, imp)
+                - _impedance_mass(ui, vr, r, ds, imp)
+                + _impedance_mass(ur, vi, r, ds, imp)
+                + _impedance_mass(ui, vi, r, ds, imp)
+            )
+            self.Z_pc = assemble(
+                zero
+                + 2 * _impedance_mass(ur, vr, r, ds, imp)
+                - 2 * _impedance_mass(ui, vi, r, ds, imp)
+            )
+
+        # build mass matrix over all subdomains with materials
+        indicator = _dg0_field(
+            self._subdomains, {i: 1.0 for i in Mu}, cell_dofs=self._cell_dofs
+        )
+        mm = indicator * (ur * vr + ui * vi) * 2 * pi * r * dx
+        self.M = assemble(mm)
+
+        # Apply boundary conditions.
+        if bcs:
+            bcs.apply(self.M)
+            for b in self.b_list:
+                bcs.apply(b)
+
+        # Solver state for warm starts, see solve_at.
+        self._solver = None
+        self._solver_omega = None
+        self._setup_iterations = None
+        self._last_iterations = None
+        self._phi_list = None
+        return
+
+    def _material_forms(self, inv_mu, sigma, dx):
+        """The forms of the material part of :math:`K`, of :math:`M_\\sigma`,
+        and of the corresponding blocks of the preconditioner. They are
+        linear in the material fields :code:`inv_mu`, :code:`sigma`.
+        """
+        r = self._r
+        ur, ui = TrialFunctions(self.W)
+        vr, vi = TestFunctions(self.W)
+        k = _stiffness(ur, vr, r, dx, inv_mu, {}) + _stiffness(
+            ui, vi, r, dx, inv_mu, {}
+        )
+        m_sigma = -_sigma_mass(ui, vr, r, dx, sigma) + _sigma_mass(ur, vi, r, dx, sigma)
+
+        # Compute the preconditioner as described in
+        #
+        #     A robust preconditioned MINRES-solver for time-periodic
+        #     eddy-current problems;
+        #     M. Kolmbauer, U. Langer;
+        #     <http://www.numa.uni-linz.ac.at/Publications/List/2012/2012-02.pdf>.
+        #
+        # For the real-imag system
+        #
+        #     ( K  M )
+        #     (-M  K ),
+        #
+        # Kolmbauer and Langer suggest the preconditioner
+        #
+        #     ( K+M        )
+        #     (     -(K+M) ).
+        #
+        # The diagonal blocks can, for example, be solved with standard AMG
+        # methods. Again, this is
+        #
+        #     P(omega) = K_pc + omega * M_sigma_pc.
+        #
+        # Only the diffusive terms go into the preconditioner.
+        k_pc = _stiffness(ur, vr, r, dx, inv_mu, {}) - _stiffness(
+            ui, vi, r, dx, inv_mu, {}
         )
-        A = A1 + A2
+        m_sigma_pc = _sigma_mass(ur, vr, r, dx, sigma) - _sigma_mass(
+            ui, vi, r, dx, sigma
+        )
+        return [k, m_sigma, k_pc, m_sigma_pc]
+
+    def update_materials(
+        self, Mu=None, Sigma=None, reassemble=True, subdomain_indices=None
+    ):
+        """Assign new values of :math:`\\mu` and/or :math:`\\sigma` per subdomain
+        to the DG0 fields :code:`self.inv_mu`, :code:`self.sigma` in place and
+        reassemble the frequency-independent matrices into the existing
+        tensors. The forms are neither rebuilt nor recompiled.
+
+        If :code:`subdomain_indices` is given, only the values in those
+        subdomains (e.g., the workpiece with a temperature-dependent
+        :math:`\\sigma`) are changed, and only their cells are reassembled:
+        Since the forms are linear in the material fields, the forms of the
+        changes, integrated over these subdomains, are added to the matrices.
+        """
+        if subdomain_indices is None:
+            subdomains = self._subdomains
+        else:
+            subdomain_indices = tuple(subdomain_indices)
+            subdomains = subdomain_indices
+            for old, field in zip(self._old_values, [self.inv_mu, self.sigma]):
+                old.zero()
+                old.axpy(1.0, field.vector())
+
+        if Mu is not None:
+            _dg0_field(
+                self._subdomains,
+                {i: 1.0 / Mu[i] for i in _restrict_keys(Mu, subdomains)},
+                out=self.inv_mu,
+                cell_dofs=self._cell_dofs,
+            )
+        if Sigma is not None:
+            _dg0_field(
+                self._subdomains,
+                {i: Sigma[i] for i in _restrict_keys(Sigma, subdomains)},
+                out=self.sigma,
+                cell_dofs=self._cell_dofs,
+            )
+        if not reassemble:
+            return
+
+        if subdomain_indices is None:
+            for form, tensor in zip(self._forms, self._tensors):
+                assemble(form, tensor=tensor)
+        else:
+            fields = [self.inv_mu, self.sigma]
+            for delta, field, old in zip(self._deltas, fields, self._old_values):
+                delta.vector().zero()
+                delta.vector().axpy(1.0, field.vector())
+                delta.vector().axpy(-1.0, old)
+            # The forms of the changes and their tensors are set up on the
+            # first update of these subdomains; later updates assemble into
+            # the same tensors.
+            if subdomain_indices not in self._delta_forms:
+                forms = self._material_forms(
+                    self._deltas[0], self._deltas[1], self._dx(subdomain_indices)
+                )
+                self._delta_forms[subdomain_indices] = (
+                    forms,
+                    [assemble(form) for form in forms],
+                )
+            else:
+                forms, work = self._delta_forms[subdomain_indices]
+                for form, tensor in zip(forms, work):
+                    assemble(form, tensor=tensor)
+            _, work = self._delta_forms[subdomain_indices]
+            for delta_tensor, tensor in zip(work, self._tensors):
+                tensor.axpy(1.0, delta_tensor, True)
+        self._update_stiffness()
+        return
+
+    def update_convections(self, convections):
+        """Replace the convections :math:`u` (per subdomain, typically the melt
+        velocity in the workpiece) by :code:`convections`. Only the
+        convection matrix is reassembled.
+        """
+        if convections:
+            ur, ui = TrialFunctions(self.W)
+            vr, vi = TestFunctions(self.W)
+            k_conv = _convection(ur, vr, self._r, self._dx, convections) + _convection(
+                ui, vi, self._r, self._dx, convections
+            )
+            self.K_conv = assemble(k_conv, tensor=self.K_conv)
+        elif self.K_conv is not None:
+            self.K_conv.zero()
+        self._update_stiffness()
+        return
+
+    def _update_stiffness(self):
+        """K = material part + convection.
+        """
+        K_materials = self._tensors[0]
+        if self.K_conv is None:
+            self.K = K_materials
+            return
+        if self.K is K_materials:
+            self.K = K_materials.copy()
+        self.K.zero()
+        self.K.axpy(1.0, K_materials, True)
+        self.K.axpy(1.0, self.K_conv, True)
+        return
+
+    def add_ring_loads(self, ring_indices, v_ref):
+        """Append the right-hand sides
+
+        .. math::
+            f_k = \\frac{\\sigma_k v_{\\text{ref}}}{2\\pi r}
+            \\quad\\text{in ring } k
+
+        for all :code:`ring_indices` to :code:`self.b_list`, cf.
+        :func:`compute_potential`. Instead of one assembly per ring, the
+        matrix
+
+        .. math::
+            B_{jc} = \\int_c \\sigma v_{\\text{ref}} v_j
+
+        for the DG0 basis functions (i.e., cells) :math:`c` is assembled once.
+        The load vector of ring :math:`k` is then :math:`B` times the
+        indicator vector of its cells.
+        """
+        DG = self.sigma.function_space()
+        w = TrialFunction(DG)
+        vr, _ = TestFunctions(self.W)
+        dx = Measure("dx", domain=self.W.mesh())
+        B = assemble(Constant(v_ref) * self.sigma * w * vr * dx)
+
+        markers = self._subdomains.array()
+        indicator = Function(DG).vector()
+        for k in ring_indices:
+            values = numpy.zeros(len(self._cell_dofs))
+            values[self._cell_dofs[markers == k]] = 1.0
+            indicator.set_local(values)
+            indicator.apply("insert")
+            b = B * indicator
+            if self.bcs:
+                self.bcs.apply(b)
+            self.b_list.append(b)
+        return
+
+    def add_surface_ring_loads(self, boundary_indices, v_ref, omega):
+        """Like :meth:`add_ring_loads` for coil rings given as impedance
+        boundaries. Deep inside ring :math:`k`, the current density
+        :math:`\\sigma(-\\text{i}\\omega\\phi + v_{\\text{ref}}/(2\\pi r))`
+        vanishes, so the impedance condition holds for
+        :math:`\\phi - \\phi_\\infty` with
+        :math:`\\phi_\\infty = -\\text{i}v_{\\text{ref}}/(2\\pi\\omega r)`.
+        This moves
+
+        .. math::
+            \\int_{\\Gamma_k} \\kappa(1+\\text{i})\\phi_\\infty v 2\\pi r
+            = \\int_{\\Gamma_k}
+              \\frac{\\kappa v_{\\text{ref}}}{\\omega} (v_r - v_i)
+
+        to the right-hand side. Since :math:`\\kappa` depends on
+        :math:`\\omega`, the loads are only valid at this frequency.
+        """
+        if omega <= 0.0:
+            raise ValueError(
+                "Impedance boundaries need omega > 0, got omega={}.".format(omega)
+            )
+        vr, vi = TestFunctions(self.W)
+        for k in boundary_indices:
+            mu, sigma = self._impedance[k]
+            kappa = numpy.sqrt(0.5 * sigma * omega / mu)
+            b = assemble((vr - vi) * self._ds(k))
+            b *= kappa * v_ref / omega
+            if self.bcs:
+                self.bcs.apply(b)
+            self.b_list.append(b)
+        return
+
+    def assemble_at(self, omega):
+        """Form the system matrix :math:`A(\\omega)` and the preconditioner
+        :math:`P(\\omega)` in place, with boundary conditions.
+        """
+        omega = float(omega)
+        for T, K, M_sigma, Z in [
+            (self.A, self.K, self.M_sigma, self.Z),
+            (self.P, self.K_pc, self.M_sigma_pc, self.Z_pc),
+        ]:
+            T.zero()
+            T.axpy(1.0, K, True)
+            T.axpy(omega, M_sigma, True)
+            if Z is not None:
+                T.axpy(numpy.sqrt(omega), Z, True)
+            if self.bcs:
+                self.bcs.apply(T)
+        return self.A, self.P
+
+    def solve_at(
+        self,
+        omegas,
+        tol=1.0e-12,
+        verbose=False,
+        recycle=True,
+        return_iterations=False,
+        block_amg=True,
+        warm_start=False,
+        reuse_factor=1.5,
+        maxiter=100,
+    ):
+        """Solve for all right-hand sides at each of the frequencies
+        :code:`omegas`. Returns a list with the result of :func:`solve` for
+        each frequency. For :code:`block_amg`, see :func:`_krylov_solver`.
+
+        With :code:`warm_start`, meant for re-solves after
+        :meth:`update_materials` or :meth:`update_convections`, the solutions
+        of the previous call are the initial guesses. Also, the
+        preconditioner from the previous call at the same frequency is kept
+        as long as the maximum number of iterations stays below
+        :code:`reuse_factor` times the one right after its setup.
+        """
+        out = []
+        for omega in omegas:
+            omega = float(omega)
+            A, P = self.assemble_at(omega)
+
+            x0_list = None
+            if warm_start and self._phi_list is not None:
+                if len(self._phi_list) == len(self.b_list):
+                    x0_list = self._phi_list
+
+            reuse = (
+                warm_start
+                and self._solver is not None
+                and self._solver_omega == omega
+                and self._last_iterations < reuse_factor * self._setup_iterations
+            )
+            if reuse:
+                self._solver.set_operators(A, P)
+            else:
+                self._solver = _krylov_solver(A, P, self.W, block_amg, self.bcs)
+                self._solver_omega = omega
+                self._setup_iterations = None
+
+            phi_list, iterations = _solve_all(
+                self._solver,
+                A,
+                self.b_list,
+                self.W,
+                tol,
+                verbose,
+                recycle,
+                x0_list,
+                maxiter=maxiter,
+            )
+            self._last_iterations = max(iterations) if iterations else 0
+            if self._setup_iterations is None:
+                self._setup_iterations = max(self._last_iterations, 1)
+            self._phi_list = phi_list
+            out.append((phi_list, iterations) if return_iterations else phi_list)
+        return out
+
+
+class ComplexMaxwellSystem(object):
+    """The system of :class:`MaxwellSystem` in native complex-valued form,
+
+    .. math::
+        A(\\omega) = K + \\text{i}\\omega M_\\sigma,
+
+    with the scalar stiffness :math:`K` and the :math:`\\sigma`-weighted mass
+    :math:`M_\\sigma` on :code:`V`. Compared to the real 2-by-2 block form,
+    this stores only a quarter of the matrix entries and keeps the complex
+    symmetry of :math:`A`, which the solver exploits: Without convection,
+    the systems are solved with the conjugate orthogonal conjugate gradient
+    method (COCG, :cite:`VM1990`), otherwise with GMRES. Both are
+    preconditioned with the real :math:`K + \\omega M_\\sigma`
+    (:cite:`KL2012`), approximately inverted with pyamg if available, or
+    factorized otherwise.
+
+    The forms are the ones of :class:`MaxwellSystem`; the matrices are
+    assembled with dolfin and then handed to SciPy. The solutions are
+    returned as functions on :code:`V*V` like those of
+    :class:`MaxwellSystem`. Only for serial runs.
+
+    Impedance boundary conditions enter as
+    :math:`(1+\\text{i})\\sqrt{\\omega} Z` with the scalar
+    :func:`_impedance_mass` :math:`Z`.
+    """
+
+    def __init__(
+        self,
+        V,
+        dx,
+        Mu,
+        Sigma,
+        f_list,
+        f_degree,
+        convections,
+        bcs,
+        ds=None,
+        impedance=None,
+    ):
+        assert MPI.size(V.mesh().mpi_comm()) == 1
+        r = SpatialCoordinate(V.mesh())[0]
+
+        ee = V.ufl_element() * V.ufl_element()
+        self.W = FunctionSpace(V.mesh(), ee)
+        self._W_dofs = _complex_dofs(V, self.W)
+
+        u = TrialFunction(V)
+        v = TestFunction(V)
+        self.b_list = [
+            assemble(_source(v, r, dx, f, f_degree, 0)).get_local()
+            + 1j * assemble(_source(v, r, dx, f, f_degree, 1)).get_local()
+            for f in f_list
+        ]
+
+        subdomains = dx.subdomain_data()
+        inv_mu = _dg0_field(subdomains, {i: 1.0 / Mu[i] for i in Mu})
+        sigma = _dg0_field(subdomains, Sigma)
+        self.K = _to_scipy(assemble(_stiffness(u, v, r, dx, inv_mu, convections)))
+        self.M_sigma = _to_scipy(assemble(_sigma_mass(u, v, r, dx, sigma)))
+        if convections:
+            self.K_pc = _to_scipy(assemble(_stiffness(u, v, r, dx, inv_mu, {})))
+        else:
+            self.K_pc = self.K
+        self._symmetric = not convections
+        self.Z = None
+        if impedance:
+            self.Z = _to_scipy(assemble(_impedance_mass(u, v, r, ds, impedance)))
+
+        # The Dirichlet conditions are given on W; translate them to V.
+        self._bc_dofs = numpy.array([], dtype=int)
+        self._bc_values = numpy.array([], dtype=complex)
+        if bcs:
+            w2v = numpy.empty(self.W.dim(), dtype=int)
+            w_dofs = self._W_dofs[0]
+            w2v[w_dofs] = numpy.arange(len(w_dofs))
+            w2v[self._W_dofs[1]] = numpy.arange(len(w_dofs))
+            bc_values = numpy.zeros(V.dim(), dtype=complex)
+            is_bc = numpy.zeros(V.dim(), dtype=bool)
+            for dof, value in bcs.get_boundary_values().items():
+                factor = 1.0 if w_dofs[w2v[dof]] == dof else 1j
+                bc_values[w2v[dof]] += factor * value
+                is_bc[w2v[dof]] = True
+            self._bc_dofs = numpy.where(is_bc)[0]
+            self._bc_values = bc_values[self._bc_dofs]
+        return
+
+    def _apply_bcs(self, A):
+        """Dirichlet conditions with the symmetry of :code:`A` preserved: The
+        constrained rows and columns are replaced by those of the identity.
+        """
+        import scipy.sparse
+
+        free = numpy.ones(A.shape[0])
+        free[self._bc_dofs] = 0.0
+        D = scipy.sparse.diags(free)
+        return (D * A * D + scipy.sparse.diags(1.0 - free)).tocsr()
+
+    def _lift(self, omega, b):
+        """Move the known Dirichlet values to the right-hand side.
+        """
+        g = numpy.zeros(len(b), dtype=complex)
+        g[self._bc_dofs] = self._bc_values
+        out = b - self.K * g - 1j * omega * (self.M_sigma * g)
+        if self.Z is not None:
+            out -= (1 + 1j) * numpy.sqrt(omega) * (self.Z * g)
+        out[self._bc_dofs] = self._bc_values
+        return out
+
+    def assemble_at(self, omega):
+        """The system matrix :math:`A(\\omega)` and the real preconditioner
+        matrix :math:`P(\\omega)` as SciPy matrices, both with boundary
+        conditions.
+        """
+        omega = float(omega)
+        A = self.K + 1j * omega * self.M_sigma
+        P = self.K_pc + omega * self.M_sigma
+        if self.Z is not None:
+            A = A + (1 + 1j) * numpy.sqrt(omega) * self.Z
+            P = P + 2 * numpy.sqrt(omega) * self.Z
+        return self._apply_bcs(A), self._apply_bcs(P)
+
+    def solve_at(
+        self,
+        omegas,
+        tol=1.0e-12,
+        verbose=False,
+        recycle=True,
+        return_iterations=False,
+        maxiter=100,
+    ):
+        """Like :meth:`MaxwellSystem.solve_at`. Raises a :class:`RuntimeError`
+        if a solve doesn't converge within :code:`maxiter` iterations.
+        """
+        out = []
+        for omega in omegas:
+            omega = float(omega)
+            A, P = self.assemble_at(omega)
+            M = _real_preconditioner(P)
+
+            AX = []
+            G = numpy.empty((len(self.b_list), len(self.b_list)), dtype=complex)
+            x_list = []
+            iterations = []
+            for k, b in enumerate(self.b_list):
+                b = self._lift(omega, b)
+                x0 = numpy.zeros(len(b), dtype=complex)
+                if recycle and AX:
+                    # Minimal-residual combination of the previous solutions,
+                    # cf. _solve_all.
+                    rhs = numpy.array([numpy.vdot(a, b) for a in AX])
+                    c = numpy.linalg.lstsq(G[:k, :k], rhs, rcond=1.0e-12)[0]
+                    x0 = numpy.dot(numpy.array(x_list).T, c)
+                if self._symmetric:
+                    x, num_steps = _cocg(A, b, x0, M, tol, maxiter)
+                else:
+                    x, num_steps = _gmres(A, b, x0, M, tol, maxiter)
+                if verbose:
+                    info("{} iterations".format(num_steps))
+                x_list.append(x)
+                iterations.append(num_steps)
+                if recycle:
+                    AX.append(A * x)
+                    # The (Hermitian) Gram matrix grows by one row and column.
+                    G[k, : k + 1] = [numpy.vdot(AX[k], a) for a in AX]
+                    G[: k + 1, k] = G[k, : k + 1].conj()
+
+            phi_list = []
+            for k, x in enumerate(x_list):
+                phi = Function(self.W)
+                phi.rename("phi{}".format(k), "phi{}".format(k))
+                values = numpy.empty(self.W.dim())
+                values[self._W_dofs[0]] = x.real
+                values[self._W_dofs[1]] = x.imag
+                phi.vector().set_local(values)
+                phi.vector().apply("insert")
+                phi_list.append(phi)
+            out.append((phi_list, iterations) if return_iterations else phi_list)
+        return out
+
+
+def _complex_dofs(V, W):
+    """The DOFs of :code:`W = V*V` which belong to the real and the imaginary
+    part, each in the order of the DOFs of :code:`V`.
+    """
+    index = Function(V)
+    index.vector().set_local(numpy.arange(V.dim(), dtype=float))
+    index.vector().apply("insert")
+    marker = Function(W)
+    out = []
+    for k in range(2):
+        marker.vector().set_local(-numpy.ones(W.dim()))
+        marker.vector().apply("insert")
+        FunctionAssigner(W.sub(k), V).assign(marker.sub(k), index)
+        values = marker.vector().get_local()
+        w_dofs = numpy.where(values > -0.5)[0]
+        dofs = numpy.empty(V.dim(), dtype=int)
+        dofs[numpy.rint(values[w_dofs]).astype(int)] = w_dofs
+        out.append(dofs)
+    return out
+
+
+def _to_scipy(A):
+    """Convert a (PETSc) dolfin matrix to a SciPy CSR matrix.
+    """
+    import scipy.sparse
+
+    rows, cols, values = as_backend_type(A).mat().getValuesCSR()
+    return scipy.sparse.csr_matrix((values, cols, rows), shape=(A.size(0), A.size(1)))
+
+
+def _real_preconditioner(P):
+    """Approximate inverse of the real-valued SPD matrix :code:`P`, applied to
+    the real and the imaginary part of complex vectors separately. Uses one
+    AMG V-cycle if pyamg is installed, a sparse LU factorization otherwise.
+    """
+    try:
+        import pyamg
+    except ImportError:
+        import scipy.sparse.linalg
+
+        inverse = scipy.sparse.linalg.splu(P.tocsc()).solve
     else:
-        # Assembling the thing into one single object makes it possible to
-        # extract .data() for conversion to SciPy's sparse types later.
-        A = assemble(a1 + a2)
+        inverse = pyamg.smoothed_aggregation_solver(P).aspreconditioner(cycle="V")
 
-    # Compute the preconditioner as described in
-    #
-    #     A robust preconditioned MINRES-solver for time-periodic eddy-current
-    #     problems;
-    #     M. Kolmbauer, U. Langer;
-    #     <http://www.numa.uni-linz.ac.at/Publications/List/2012/2012-02.pdf>.
-    #
-    # For the real-imag system
-    #
-    #     ( K  M )
-    #     (-M  K ),
-    #
-    # Kolmbauer and Langer suggest the preconditioner
-    #
-    #     ( K+M        )
-    #     (     -(K+M) ).
-    #
-    # The diagonal blocks can, for example, be solved with standard AMG
-    # methods.
-    p1 = Constant(0.0) * ur * vr * dx(0)
-    p2 = Constant(0.0) * ur * vr * dx(0)
-    # Diffusive terms.
-    for i in subdomain_indices:
-        p1 += +1.0 / (Mu[i] * r) * dot(grad(r * ur), grad(r * vr)) * 2 * pi * dx(
-            i
-        ) - 1.0 / (Mu[i] * r) * dot(grad(r * ui), grad(r * vi)) * 2 * pi * dx(i)
-        p2 += +om * Constant(Sigma[i]) * ur * vr * 2 * pi * r * dx(i) - om * Constant(
-            Sigma[i]
-        ) * ui * vi * 2 * pi * r * dx(i)
-    P = assemble(p1 + p2)
-
-    # build mass matrix
-    # mm = sum([(ur * vr + ui * vi) * 2*pi*r * dx(i)
-    #           for i in subdomain_indices
-    #           ])
-    mm = Constant(0.0) * ur * vr * dx(0)
-    for i in subdomain_indices:
-        mm += +ur * vr * 2 * pi * r * dx(i) + ui * vi * 2 * pi * r * dx(i)
-    M = assemble(mm)
+    def apply(x):
+        return inverse(x.real) + 1j * inverse(x.imag)
+
+    return apply
+
+
+def _cocg(A, b, x0, M, tol, maxiter):
+    """Preconditioned conjugate orthogonal conjugate gradient method for the
+    complex-symmetric :code:`A`, see :cite:`VM1990`. The same as CG, but with
+    the unconjugated bilinear form :math:`x^T y` in place of the inner
+    product. Returns the solution and the number of iterations; raises a
+    :class:`RuntimeError` if :code:`tol` isn't reached within :code:`maxiter`
+    iterations.
+    """
+    x = x0.copy()
+    r = b - A * x
+    norm_b = numpy.linalg.norm(b)
+    if norm_b == 0.0:
+        return numpy.zeros_like(x), 0
+    z = M(r)
+    p = z.copy()
+    rho = numpy.dot(r, z)
+    for k in range(maxiter):
+        if numpy.linalg.norm(r) < tol * norm_b:
+            return x, k
+        q = A * p
+        alpha = rho / numpy.dot(p, q)
+        x += alpha * p
+        r -= alpha * q
+        z = M(r)
+        rho_new = numpy.dot(r, z)
+        p = z + (rho_new / rho) * p
+        rho = rho_new
+    residual = numpy.linalg.norm(r) / norm_b
+    if residual < tol:
+        return x, maxiter
+    raise RuntimeError(
+        "COCG did not converge in {} iterations (relative residual {:e}).".format(
+            maxiter, residual
+        )
+    )
 
-    # Apply boundary conditions.
-    if bcs:
-        bcs.apply(A)
-        bcs.apply(P)
-        bcs.apply(M)
-        for b in b_list:
-            bcs.apply(b)
+
+def _gmres(A, b, x0, M, tol, maxiter):
+    """Preconditioned GMRES from SciPy with the same interface as
+    :func:`_cocg`.
+    """
+    import scipy.sparse.linalg
+
+    n = len(b)
+    M = scipy.sparse.linalg.LinearOperator((n, n), matvec=M, dtype=complex)
+    kwargs = dict(
+        x0=x0, atol=0.0, restart=maxiter, maxiter=1, M=M, callback_type="pr_norm",
+    )
+    # SciPy 1.12 renamed the relative tolerance from `tol` to `rtol`, and
+    # later versions dropped `tol`.
+    try:
+        iterations = []
+        x, info = scipy.sparse.linalg.gmres(
+            A, b, rtol=tol, callback=iterations.append, **kwargs
+        )
+    except TypeError:
+        iterations = []
+        x, info = scipy.sparse.linalg.gmres(
+            A, b, tol=tol, callback=iterations.append, **kwargs
+        )
+    if info != 0:
+        raise RuntimeError(
+            "GMRES did not converge in {} iterations (info {}).".format(
+                len(iterations), info
+            )
+        )
+    return x, len(iterations)
+
+
+def build_system(V, dx, Mu, Sigma, omega, f_list, f_degree, convections, bcs):
+    """Build FEM system for
+
+    .. math::
+         \\div\\left(\\frac{1}{\\mu r} \\nabla(r\\phi)\\right)
+         + \\left\\langle u, \\frac{1}{r} \\nabla(r\\phi)\\right\\rangle
+         + \\text{i} \\sigma \\omega \\phi
+            = f
+
+    by multiplying with :math:`2\\pi r v` and integrating over the domain and
+    the preconditioner given by :cite:`KL2012`; see :class:`MaxwellSystem`.
+    """
+    system = MaxwellSystem(V, dx, Mu, Sigma, f_list, f_degree, convections, bcs)
+    A, P = system.assemble_at(omega)
 
     # helpers.show_matrix(A)
     # print(helpers.get_eigenvalues(A))
     # helpers.show_matrix(M)
     # helpers.show_matrix(P)
 
-    return A, P, b_list, M, W
+    return A, P, system.b_list, system.M, system.W
 
 
 # def prescribe_current(A, b, coil_rings, current):
@@ -491,38 +1737,55 @@ def prescribe_voltage(A, b, coil_rings, voltage, v_ref, J):
 
 
 def compute_potential(
-    coils, V, dx, mu, sigma, omega, convections, verbose=True, io_submesh=None
+    coils,
+    V,
+    dx,
+    mu,
+    sigma,
+    omega,
+    convections,
+    verbose=True,
+    io_submesh=None,
+    cache_dir=None,
+    ds=None,
+    impedance=None,
 ):
     """Compute the magnetic potential :math:`\\Phi` with
     :math:`A = \\exp(\\text{i} \\omega t) \\Phi e_{\\theta}` for a number of
     coils.
+
+    If :code:`cache_dir` is given, the reference potentials of the coil rings
+    and the voltage--current matrix are stored there and reused by all
+    subsequent calls with the same mesh, subdomains, materials, frequency,
+    and discretization; only the coil voltages may differ. (The cache isn't
+    used with convections.)
+
+    If :code:`impedance` is given, the coil rings aren't subdomains of
+    :code:`dx`, but boundaries of :code:`ds` with impedance conditions, see
+    :class:`MaxwellSystem`; :code:`impedance` holds their
+    :math:`(\\mu, \\sigma)` per boundary index. (The cache isn't used then
+    either.)
     """
-    # Index all coil rings consecutively, starting with 0.
-    # This makes them easier to handle for the equation system.
-    physical_indices = []
-    new_coils = []
-    k = 0
-    for coil in coils:
-        new_coils.append([])
-        for coil_ring in coil["rings"]:
-            new_coils[-1].append(k)
-            physical_indices.append(coil_ring)
-            k += 1
+    physical_indices, new_coils = _index_coil_rings([coil["rings"] for coil in coils])
 
     # Set arbitrary reference voltage.
     v_ref = 1.0
 
-    r = SpatialCoordinate(V.mesh())[0]
-
-    # Compute reference potentials for all coil rings.
-    # Prepare the right-hand sides according to :cite:`Cha97`.
-    f_list = []
-    for k in physical_indices:
-        # Real an imaginary parts.
-        f_list.append({k: (v_ref * sigma[k] / (2 * pi * r), Constant(0.0))})
-    # Solve.
-    phi_list = solve(
-        V, dx, mu, sigma, omega, f_list, convections, tol=1.0e-12, verbose=True
+    tol = 1.0e-12
+
+    phi_list, J = _reference_potentials(
+        V,
+        dx,
+        mu,
+        sigma,
+        omega,
+        convections,
+        physical_indices,
+        v_ref,
+        tol,
+        cache_dir,
+        ds=ds,
+        impedance=impedance,
     )
 
     # Write out these `phi`s to files.
@@ -532,8 +1795,12 @@ def compute_potential(
         from dolfin import interpolate, XDMFFile
 
         for k, phi in enumerate(phi_list):
-            # Restrict to workpiece submesh.
-            phi_out = interpolate(phi, W_submesh)
+            # Restrict to workpiece submesh. The reference potentials of the
+            # magnetostatic problem are real.
+            if isinstance(phi, DCPotential):
+                phi_out = interpolate(phi.real, V_submesh)
+            else:
+                phi_out = interpolate(phi, W_submesh)
             phi_out.rename("phi{:02d}".format(k), "phi{:02d}".format(k))
             # Write to file
             with XDMFFile(mpi_comm_world(), "phi{:02d}.xdmf".format(k)) as xdmf_file:
@@ -542,26 +1809,11 @@ def compute_potential(
             # interactive()
 
     # Compute weights for the individual coils.
-    # First get the voltage--coil-current mapping.
-    J = get_voltage_current_matrix(phi_list, physical_indices, dx, sigma, omega, v_ref)
-
-    num_coil_rings = len(phi_list)
-    A = numpy.empty((num_coil_rings, num_coil_rings), dtype=J.dtype)
-    b = numpy.empty(num_coil_rings, dtype=J.dtype)
-    for k, coil in enumerate(new_coils):
-        weight_type = coils[k]["c_type"]
-        target_value = coils[k]["c_value"]
-        # if weight_type == 'current':
+    for coil in coils:
+        # if coil["c_type"] == 'current':
         #     A, b = prescribe_current(A, b, coil, target_value)
-        assert weight_type == "voltage"
-        A, b = prescribe_voltage(A, b, coil, target_value, v_ref, J)
-
-    # # TODO write out the equation system to a file
-    # if io_submesh:
-    #     numpy.savetxt('matrix.dat', A)
-
-    # Solve the system for the weights.
-    weights = numpy.linalg.solve(A, b)
+        assert coil["c_type"] == "voltage"
+    weights = _voltage_weights(new_coils, [coil["c_value"] for coil in coils], v_ref, J)
 
     # # Prescribe total power.
     # target_total_power = 4.0e3
@@ -618,58 +1870,325 @@ def compute_potential(
     # The function Phi is guaranteed to fulfill the PDE as well (iff the
     # the boundary conditions are linear in phi too).
     #
-    # Form $\sum_l c_l \\phi_l$.
-    # https://answers.launchpad.net/dolfin/+question/214172
-    #
-    # Unfortunately, one cannot just use
-    #     Phi[0].vector()[:] += c.real * phi[0].vector()
-    # since phi is from the FunctionSpace V*V and thus .vector() is not
-    # available for the individual components.
-    #
-    Phi = [Constant(0.0), Constant(0.0)]
+    # Since phi is from the FunctionSpace V*V (or a DCPotential), the real
+    # and imaginary parts are first copied into functions on V; the linear
+    # combination is then carried out on the coefficient vectors of V. This
+    # is exact, other than projecting the UFL expression of the sum.
+    Phi = [Function(V), Function(V)]
     for phi, c in zip(phi_list, weights):
+        phi_r, phi_i = _potential_vectors(phi, V)
+        # Convert to proper `float`s, cf. heat.Heat.eval_alpha_M_beta_F.
+        c = complex(c)
         # Phi += c * phi
-        Phi[0] += c.real * phi[0] - c.imag * phi[1]
-        Phi[1] += c.imag * phi[0] + c.real * phi[1]
-
-    # Project the components down to V. This makes various subsequent
-    # computations with Phi faster.
-    Phi[0] = project(Phi[0], V)
+        Phi[0].vector().axpy(c.real, phi_r)
+        Phi[1].vector().axpy(c.imag, phi_r)
+        if phi_i is not None:
+            Phi[0].vector().axpy(-c.imag, phi_i)
+            Phi[1].vector().axpy(c.real, phi_i)
     Phi[0].rename("Re(Phi)", "Re(Phi)")
-    Phi[1] = project(Phi[1], V)
     Phi[1].rename("Im(Phi)", "Im(Phi)")
     return Phi, voltages
 
 
+def _index_coil_rings(coil_rings):
+    """Index all coil rings consecutively, starting with 0. This makes them
+    easier to handle for the equation system. Returns the subdomain indices
+    of all rings and the lists of new indices per coil.
+    """
+    physical_indices = []
+    new_coils = []
+    k = 0
+    for rings in coil_rings:
+        new_coils.append([])
+        for coil_ring in rings:
+            new_coils[-1].append(k)
+            physical_indices.append(coil_ring)
+            k += 1
+    return physical_indices, new_coils
+
+
+def _reference_potentials(
+    V,
+    dx,
+    mu,
+    sigma,
+    omega,
+    convections,
+    physical_indices,
+    v_ref,
+    tol,
+    cache_dir,
+    ds=None,
+    impedance=None,
+):
+    """The potentials of all coil rings at voltage :code:`v_ref`, and the
+    voltage--current matrix.
+    """
+    # The reference potentials and the voltage--current mapping don't depend
+    # on the coil voltages; look them up in the cache first.
+    phi_list = None
+    J = None
+    cache_path = None
+    if cache_dir is not None and not convections and not impedance:
+        cache_path = os.path.join(
+            cache_dir,
+            _reference_potentials_key(
+                V, dx, mu, sigma, omega, physical_indices, v_ref, tol
+            ),
+        )
+        phi_list, J = _load_reference_potentials(cache_path, V)
+
+    if phi_list is None:
+        # Compute reference potentials for all coil rings.
+        # The right-hand sides according to :cite:`Cha97` are assembled in one
+        # go.
+        if impedance:
+            system = MaxwellSystem(
+                V,
+                dx,
+                mu,
+                sigma,
+                [],
+                None,
+                convections,
+                _axis_bcs(V),
+                ds=ds,
+                impedance=impedance,
+            )
+            system.add_surface_ring_loads(physical_indices, v_ref, omega)
+            phi_list = system.solve_at([omega], tol=tol, verbose=True)[0]
+            J = get_surface_voltage_current_matrix(
+                phi_list, physical_indices, ds, impedance, omega, v_ref
+            )
+        else:
+            if omega == 0.0 and not convections:
+                r = SpatialCoordinate(V.mesh())[0]
+                f_list = [
+                    {k: (sigma[k] * v_ref / (2 * pi * r), Constant(0.0))}
+                    for k in physical_indices
+                ]
+                phi_list = _solve_dc(
+                    V, dx, mu, f_list, None, _axis_bcs(V), tol=tol, verbose=True
+                )[0]
+            else:
+                system = MaxwellSystem(
+                    V, dx, mu, sigma, [], None, convections, _axis_bcs(V)
+                )
+                system.add_ring_loads(physical_indices, v_ref)
+                # Solve.
+                phi_list = system.solve_at([omega], tol=tol, verbose=True)[0]
+
+            # Get the voltage--coil-current mapping.
+            J = get_voltage_current_matrix(
+                phi_list, physical_indices, dx, sigma, omega, v_ref
+            )
+
+        if cache_path is not None:
+            _save_reference_potentials(cache_path, phi_list, J)
+
+    return phi_list, J
+
+
+def _voltage_weights(new_coils, voltages, v_ref, J):
+    """Weights of the ring potentials for the given coil voltages.
+    """
+    num_coil_rings = J.shape[0]
+    A = numpy.empty((num_coil_rings, num_coil_rings), dtype=J.dtype)
+    b = numpy.empty(num_coil_rings, dtype=J.dtype)
+    for coil, voltage in zip(new_coils, voltages):
+        A, b = prescribe_voltage(A, b, coil, voltage, v_ref, J)
+
+    # # TODO write out the equation system to a file
+    # if io_submesh:
+    #     numpy.savetxt('matrix.dat', A)
+
+    # Solve the system for the weights.
+    return numpy.linalg.solve(A, b)
+
+
+def _reference_potentials_key(V, dx, mu, sigma, omega, physical_indices, v_ref, tol):
+    """Hash of everything the reference potentials depend on.
+    """
+    mesh = V.mesh()
+    comm = mesh.mpi_comm()
+    h = hashlib.sha1()
+    h.update(mesh.coordinates().tobytes())
+    h.update(mesh.cells().tobytes())
+    subdomains = dx.subdomain_data()
+    if subdomains is not None:
+        h.update(subdomains.array().tobytes())
+    data = [
+        sorted(mu.items()),
+        sorted(sigma.items()),
+        omega,
+        physical_indices,
+        v_ref,
+        tol,
+        str(V.ufl_element()),
+        MPI.size(comm),
+        MPI.rank(comm),
+    ]
+    h.update(repr(data).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _load_reference_potentials(path, V):
+    """Load reference potentials and the voltage--current matrix stored by
+    :func:`_save_reference_potentials`. The potentials are memory-mapped and
+    copied into the functions directly. Values on :code:`V` (instead of
+    :math:`V\\times V`) are the real potentials of the magnetostatic
+    problem, see :class:`DCPotential`. Returns :code:`(None, None)` if
+    there's nothing in the cache.
+    """
+    phi_file = os.path.join(path, "phi.npy")
+    J_file = os.path.join(path, "J.npy")
+    if not (os.path.isfile(phi_file) and os.path.isfile(J_file)):
+        return None, None
+
+    values = numpy.load(phi_file, mmap_mode="r")
+    is_dc = values.shape[1] == V.dim()
+    if not is_dc:
+        W = FunctionSpace(V.mesh(), V.ufl_element() * V.ufl_element())
+    phi_list = []
+    for k, value in enumerate(values):
+        phi = Function(V) if is_dc else Function(W)
+        phi.vector().set_local(numpy.asarray(value))
+        phi.vector().apply("insert")
+        if is_dc:
+            phi = DCPotential(phi)
+        phi.rename("phi{}".format(k), "phi{}".format(k))
+        phi_list.append(phi)
+    return phi_list, numpy.load(J_file)
+
+
+def _save_reference_potentials(path, phi_list, J):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    values = []
+    for phi in phi_list:
+        if isinstance(phi, DCPotential):
+            # Real potentials of the magnetostatic problem are stored on V.
+            assert phi.is_real
+            values.append(phi.real.vector().get_local())
+        else:
+            values.append(phi.vector().get_local())
+    values = numpy.array(values)
+    # Write J last and atomically; it marks the entry as complete.
+    numpy.save(os.path.join(path, "phi.npy"), values)
+    tmp = os.path.join(path, "J.tmp.npy")
+    numpy.save(tmp, J)
+    os.rename(tmp, os.path.join(path, "J.npy"))
+    return
+
+
 def get_voltage_current_matrix(phi, physical_indices, dx, Sigma, omega, v_ref):
     """Compute the matrix that relates the voltages with the currents in the
     coil rings. (The relationship is indeed linear.)
 
     This is according to :cite:`KP02`.
 
-    The entry :math:`J_{k,l}` in the resulting matrix is the contribution of
-    the potential generated by coil :math:`l` to the current in coil :math:`k`.
+    The entry :math:`J_{k,j}` in the resulting matrix is the contribution of
+    the potential generated by coil :math:`j` to the current in coil :math:`k`.
     """
-    mesh = phi[0].function_space().mesh()
-
+    V = _scalar_space(phi[0])
+    mesh = V.mesh()
     r = SpatialCoordinate(mesh)[0]
+    subdomains = dx.subdomain_data()
+
+    # The currents are linear functionals of the potentials,
+    #
+    #    -1i*omega*int_{coil_k} sigma phi.
+    #
+    # Instead of assembling them ring by ring, the matrix
+    #
+    #    C_{cj} = int_c sigma u_j
+    #
+    # for the DG0 basis functions (i.e., cells) c and the basis functions u_j
+    # of V is assembled in one pass. The functional of ring k is then C^T
+    # times the indicator vector of its cells, and it applies to the real and
+    # the imaginary part alike.
+    DG = FunctionSpace(mesh, "DG", 0)
+    cell_dofs = helpers.dg0_cell_dofs(DG)
+    sigma = _dg0_field(
+        subdomains, {i: Sigma[i] for i in physical_indices}, cell_dofs=cell_dofs
+    )
+    q = TestFunction(DG)
+    C = assemble(sigma * TrialFunction(V) * q * dx)
+    # v_ref/(2*pi) * int_{coil_k} sigma/r for the diagonal. 1/r doesn't
+    # explode since sigma vanishes outside of the coils, where r!=0.
+    c_inv_r = assemble(v_ref / (2 * pi) * sigma / r * q * dx)
+
+    markers = subdomains.array()
+    indicator = Function(DG).vector()
+    functional = Function(V).vector()
+    # The buffers hold the DOFs local to this process.
+    F = numpy.empty((len(physical_indices), functional.local_size()))
+    diagonal = numpy.empty(len(physical_indices))
+    for k, index in enumerate(physical_indices):
+        values = numpy.zeros(indicator.local_size())
+        values[cell_dofs[markers == index]] = 1.0
+        indicator.set_local(values)
+        indicator.apply("insert")
+        C.transpmult(indicator, functional)
+        F[k] = functional.get_local()
+        diagonal[k] = c_inv_r.inner(indicator)
+
+    # All entries of J in one dense product with the stacked potentials,
+    # summed over the processes
+    X = numpy.column_stack([_potential_values(phi_j, V) for phi_j in phi])
+    FX = numpy.dot(F, X)
+    comm = mesh.mpi_comm()
+    FX = numpy.array(
+        [
+            MPI.sum(comm, float(z.real)) + 1j * MPI.sum(comm, float(z.imag))
+            for z in FX.flat
+        ]
+    ).reshape(FX.shape)
+    J = -1j * omega * FX
+    J[numpy.diag_indices_from(J)] += diagonal
+    return J
+
+
+def get_surface_voltage_current_matrix(
+    phi, boundary_indices, ds, impedance, omega, v_ref
+):
+    """Like :func:`get_voltage_current_matrix` for coil rings given as
+    impedance boundaries (see :meth:`MaxwellSystem.add_surface_ring_loads`).
+    Within the skin depth :math:`\\delta` behind the boundary
+    :math:`\\Gamma_k`, the current density is
+    :math:`-\\text{i}\\omega\\sigma(\\phi-\\phi_\\infty)
+    \\exp(-(1+\\text{i})x/\\delta)`. Integrated over the depth, and with
+    :math:`\\sigma\\omega\\delta/2 = \\kappa`, the current in ring :math:`k`
+    is
+
+    .. math::
+        I_k = -(1+\\text{i}) \\kappa_k
+            \\int_{\\Gamma_k} \\phi - \\phi_\\infty.
+    """
+    if omega <= 0.0:
+        raise ValueError(
+            "Impedance boundaries need omega > 0, got omega={}.".format(omega)
+        )
+    W = phi[0].function_space()
+    r = SpatialCoordinate(W.mesh())[0]
+    vr, vi = TestFunctions(W)
 
     num_coil_rings = len(phi)
-    J = numpy.empty((num_coil_rings, num_coil_rings), dtype=numpy.complex)
-    for l, pi0 in enumerate(physical_indices):
-        partial_phi_r, partial_phi_i = phi[l].split()
-        for k, pi1 in enumerate(physical_indices):
-            # -1i*omega*int_{coil_k} sigma phi.
-            int_r = assemble(Sigma[pi1] * partial_phi_r * dx(pi1))
-            int_i = assemble(Sigma[pi1] * partial_phi_i * dx(pi1))
-            J[k][l] = -1j * omega * (int_r + 1j * int_i)
-        # v_ref/(2*pi) * int_{coil_l} sigma/r.
-        # 1/r doesn't explode since we only evaluate it in the coils where
-        # r!=0.
-        # For assemble() to work, a mesh needs to be supplied either implicitly
-        # by the integrand, or explicitly. Since the integrand doesn't contain
-        # mesh information here, pass it through explicitly.
-        J[l][l] += v_ref / (2 * pi) * assemble(Sigma[pi0] / r * dx(pi0))
+    J = numpy.empty((num_coil_rings, num_coil_rings), dtype=complex)
+    for k, index in enumerate(boundary_indices):
+        ds_k = ds(index)
+        mu, sigma = impedance[index]
+        kappa = numpy.sqrt(0.5 * sigma * omega / mu)
+        functional_r = assemble(vr * ds_k)
+        functional_i = assemble(vi * ds_k)
+        for j, phi_j in enumerate(phi):
+            int_r = functional_r.inner(phi_j.vector())
+            int_i = functional_i.inner(phi_j.vector())
+            J[k][j] = -(1 + 1j) * kappa * (int_r + 1j * int_i)
+        # (1+i) kappa int_{Gamma_k} phi_infty
+        J[k][k] += (
+            (1 - 1j) * kappa * v_ref / (2 * numpy.pi * omega) * assemble(1.0 / r * ds_k)
+        )
     return J
 
 
@@ -861,3 +2380,140 @@ def compute_lorentz(Phi, omega, sigma):
         / r
         * (+Phi[1] * grad(r * Phi[0]) - Phi[0] * grad(r * Phi[1]))
     )
+
+
+class Superposition(object):
+    """Lorentz force and Joule heat in the workpiece for any set of coil
+    voltages, without solving the PDE again.
+
+    With the ring potentials :math:`\\phi_k` (see :func:`compute_potential`),
+    the potential for given voltages is :math:`\\Phi = \\sum_k c_k\\phi_k`
+    where the complex weights :math:`c` depend linearly on the voltages. In
+    the workpiece, :math:`E = -\\text{i}\\omega\\Phi`, so the time-averaged
+    Joule heat and Lorentz force (see :func:`compute_joule`,
+    :func:`compute_lorentz`) are
+
+    .. math::
+
+        \\begin{align*}
+        s &= \\frac{\\sigma\\omega^2}{2} |\\Phi|^2,\\\\
+        \\overline{F_L} &= \\frac{\\sigma\\omega}{2r}
+            \\Im\\left(\\Phi \\nabla(r\\Phi^*)\\right)
+          = \\frac{\\sigma\\omega}{2} \\Im\\left(\\Phi \\nabla\\Phi^*\\right)
+        \\end{align*}
+
+    (the :math:`1/r`-term cancels since :math:`\\Phi\\Phi^*` is real).
+
+    On construction, the nodal values of all :math:`\\phi_k` on the
+    workpiece submesh are stored as the columns of a dense complex matrix
+    :math:`B`, and likewise the nodal values of their gradients (recovered by
+    a lumped :math:`L^2` projection) as :math:`G_r`, :math:`G_z`. For new
+    voltages, the DOF vectors of the Joule heat and the Lorentz force are
+    then merely computed from :math:`Bc`, :math:`G_r c`, :math:`G_z c`.
+    Only piecewise linear potentials are supported.
+    """
+
+    def __init__(
+        self,
+        coil_rings,
+        V,
+        dx,
+        mu,
+        sigma,
+        omega,
+        submesh,
+        subdomain_index,
+        cache_dir=None,
+    ):
+        assert V.ufl_element().degree() == 1
+        self.omega = omega
+        self.sigma = sigma[subdomain_index]
+        self._physical_indices, self._new_coils = _index_coil_rings(coil_rings)
+        self._v_ref = 1.0
+        phi_list, self.J = _reference_potentials(
+            V,
+            dx,
+            mu,
+            sigma,
+            omega,
+            {},
+            self._physical_indices,
+            self._v_ref,
+            1.0e-12,
+            cache_dir,
+        )
+
+        self.V_submesh = FunctionSpace(submesh, "CG", 1)
+        self.W_submesh = VectorFunctionSpace(submesh, "CG", 1, dim=2)
+
+        # Map from submesh DOFs to the DOFs of V
+        parent_dofs = helpers.SubMeshTransfer(V, self.V_submesh).parent_dofs
+
+        # Nodal values of the ring potentials on the submesh
+        num_rings = len(phi_list)
+        num_dofs = self.V_submesh.dim()
+        self._B = numpy.empty((num_dofs, num_rings), dtype=complex)
+        for k, phi in enumerate(phi_list):
+            self._B[:, k] = _potential_values(phi, V)[parent_dofs]
+
+        # Nodal values of the gradients, G = M_lumped^{-1} D B.
+        u = TrialFunction(self.V_submesh)
+        v = TestFunction(self.V_submesh)
+        dx_submesh = Measure("dx", domain=submesh)
+        m_lumped = assemble(v * dx_submesh).get_local()
+        work = Function(self.V_submesh).vector()
+        self._G = []
+        for d in range(2):
+            D = assemble(u.dx(d) * v * dx_submesh)
+            G = numpy.empty_like(self._B)
+            for k in range(num_rings):
+                work.set_local(self._B[:, k].real)
+                work.apply("insert")
+                G[:, k] = (D * work).get_local()
+                work.set_local(self._B[:, k].imag)
+                work.apply("insert")
+                G[:, k] += 1j * (D * work).get_local()
+            self._G.append(G / m_lumped[:, None])
+
+        # Component d of the vector function space at the DOFs of V_submesh
+        vertex_dofs = vertex_to_dof_map(self.W_submesh).reshape(-1, 2)
+        self._W_dofs = vertex_dofs[dof_to_vertex_map(self.V_submesh)]
+        return
+
+    def weights(self, voltages):
+        """Complex weights of the ring potentials for the coil voltages.
+        """
+        return _voltage_weights(self._new_coils, voltages, self._v_ref, self.J)
+
+    def joule(self, voltages, out=None):
+        """Joule heat source in the workpiece as a :class:`Function` on the
+        submesh.
+        """
+        Phi = numpy.dot(self._B, self.weights(voltages))
+        values = 0.5 * self.sigma * self.omega ** 2 * abs(Phi) ** 2
+        if out is None:
+            out = Function(self.V_submesh)
+        out.vector().set_local(values)
+        out.vector().apply("insert")
+        return out
+
+    def lorentz(self, voltages, out=None):
+        """Lorentz force in the workpiece as a vector :class:`Function` on the
+        submesh.
+        """
+        c = self.weights(voltages)
+        Phi = numpy.dot(self._B, c)
+        values = numpy.empty(self.W_submesh.dim())
+        for d in range(2):
+            grad_Phi = numpy.dot(self._G[d], c)
+            values[self._W_dofs[:, d]] = (
+                0.5
+                * self.sigma
+                * self.omega
+                * (Phi.imag * grad_Phi.real - Phi.real * grad_Phi.imag)
+            )
+        if out is None:
+            out = Function(self.W_submesh)
+        out.vector().set_local(values)
+        out.vector().apply("insert")
+        return out
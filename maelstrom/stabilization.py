@@ -5,11 +5,21 @@ Stabilization techniques for PDEs with dominating convection.
 The classical article about SUPG is :cite:`brooks`; for an overview
 of methods, see :cite:`sold1`, :cite:`sold2`, and :cite:`bgs2004`.
 """
-from dolfin import Expression
+from dolfin import FunctionSpace, Function, TestFunction, Form, assemble, dx
+import numpy
+
+from . import helpers
 
 
 def supg(mesh, convection, diffusion, element_degree):
-    """For each cell, this function return the expression
+    """Convenience wrapper around :class:`Supg`; returns the DG0 function
+    :math:`\\tau`.
+    """
+    return Supg(mesh, convection, diffusion, element_degree).tau
+
+
+class Supg(object):
+    """For each cell, this class computes
 
     ..math::
 
@@ -32,111 +42,97 @@ def supg(mesh, convection, diffusion, element_degree):
 
     for :math:`Pe\\approx 0`. This Taylor expansion (with a few more terms) is
     made use of in the code.
+
+    :math:`\\tau` is stored as a DG0 function (:code:`self.tau`), computed
+    with vectorized NumPy operations from the cell averages of the
+    convection. When the values of the convection change, call
+    :meth:`update`; forms containing :code:`self.tau` need not be rebuilt.
+    Since :math:`\\tau` is piecewise constant, the quadrature degree of the
+    stabilization terms isn't raised either.
     """
-    cppcode = """#include <dolfin/mesh/Vertex.h>
-
-class SupgStab : public Expression {
-public:
-double epsilon;
-int p;
-std::shared_ptr<GenericFunction> convection;
-std::shared_ptr<Mesh> mesh;
-
-SupgStab(): Expression()
-{}
-
-void eval(
-  Array<double>& tau,
-  const Array<double>& x,
-  const ufc::cell& c
-  ) const
-{
-  Array<double> v(x.size());
-  convection->eval(v, x, c);
-  double conv_norm = 0.0;
-  for (uint i = 0; i < v.size(); ++i)
-    conv_norm += v[i]*v[i];
-  conv_norm = sqrt(conv_norm);
-
-  Cell cell(*mesh, c.index);
-
-  //// The alternative for the lazy:
-  //const double h = cell.diameter();
-
-  // Compute the directed diameter of the cell, cf. :cite:`sold2`.
-  //
-  //    diam(cell, s) = 2*||s|| / sum_{nodes n_i} |s.\\grad\\psi|
-  //
-  // where \\psi is the P_1 basis function of n_i.
-  //
-  const double area = cell.volume();
-  const unsigned int* vertices = cell.entities(0);
-  assert(vertices);
-  double sum = 0.0;
-  for (int i=0; i<3; i++) {
-    for (int j=i+1; j<3; j++) {
-      // Get edge coords.
-      const dolfin::Vertex v0(*mesh, vertices[i]);
-      const dolfin::Vertex v1(*mesh, vertices[j]);
-      const Point p0 = v0.point();
-      const Point p1 = v1.point();
-      const double e0 = p0[0] - p1[0];
-      const double e1 = p0[1] - p1[1];
-
-      // Note that
-      //
-      //     \\grad\\psi = ortho_edge / edgelength / height
-      //               = ortho_edge / (2*area)
-      //
-      // so
-      //
-      //   (v.\\grad\\psi) = (v.ortho_edge) / (2*area).
-      //
-      // Move the constant factors out of the summation.
-      //
-      // It would be really nice if we could just do
-      //    edge.dot((-v[1], v[0]))
-      // but unfortunately, edges just dot with other edges.
-      sum += fabs(e1*v[0] - e0*v[1]);
-    }
-  }
-  const double h = 4 * conv_norm * area / sum;
-
-  // Just a little sanity check here.
-  assert(h <= cell.diameter());
-
-  const double Pe = 0.5*conv_norm * h/(p*epsilon);
-  assert(Pe > 0.0);
-
-  // We'd like to compute `xi = (1.0/tanh(Pe) - 1.0/Pe) / Pe`. This expression
-  // can hardly be evaluated for small Pe, see
-  // <https://stackoverflow.com/a/43279491/353337>. Hence, use its Taylor
-  // expansion around 0.
-  const double xi = Pe > 1.0e-5 ?
-      (1.0/tanh(Pe) - 1.0/Pe) / Pe :
-      1.0/3.0 - Pe*Pe / 45.0 + 2.0/945.0 * Pe*Pe*Pe*Pe;
-  // const double xi =  (Pe > 1.0 ? 1.0 - 1.0/Pe : 0.0) / Pe;
-
-  tau[0] = h*h / 4 / epsilon / p * xi;
-
-  if (tau[0] > 1.0e3)
-  {
-    std::cout << "tau   = " << tau[0] << std::endl;
-    std::cout << "||b|| = " << conv_norm << std::endl;
-    std::cout << "Pe    = " << Pe << std::endl;
-    std::cout << "h     = " << h << std::endl;
-    std::cout << "xi    = " << xi << std::endl;
-    throw 1;
-  }
-
-  return;
-}
-};
-"""
-    # TODO set degree
-    tau = Expression(cppcode, degree=5)
-    tau.convection = convection
-    tau.mesh = mesh
-    tau.epsilon = diffusion
-    tau.p = element_degree
-    return tau
+
+    def __init__(self, mesh, convection, diffusion, element_degree):
+        self.convection = convection
+        self.diffusion = diffusion
+        self.element_degree = element_degree
+
+        DG0 = FunctionSpace(mesh, "DG", 0)
+        self.tau = Function(DG0)
+        self.tau.rename("tau", "SUPG stabilization parameter")
+
+        # Map from cells to DG0 degrees of freedom.
+        self._dofs = helpers.dg0_cell_dofs(DG0)
+
+        # The cell-wise integrals of the convection components.
+        w = TestFunction(DG0)
+        self._conv_forms = [Form(convection[k] * w * dx(mesh)) for k in range(2)]
+        self._conv_integrals = [None, None]
+
+        # Cell geometry: the edge vectors e_ij = x_i - x_j and the areas.
+        X = mesh.coordinates()[mesh.cells()]
+        self._edges = numpy.array(
+            [X[:, i] - X[:, j] for i, j in [(0, 1), (0, 2), (1, 2)]]
+        )
+        self._area = 0.5 * abs(
+            self._edges[0, :, 0] * self._edges[1, :, 1]
+            - self._edges[0, :, 1] * self._edges[1, :, 0]
+        )
+        self._diameter = numpy.max(
+            numpy.sqrt(numpy.sum(self._edges ** 2, axis=2)), axis=0
+        )
+
+        self.update()
+        return
+
+    def update(self):
+        """Recompute :math:`\\tau` from the current values of the convection.
+        """
+        # Cell averages of the convection
+        b = numpy.empty((len(self._dofs), 2))
+        for k in range(2):
+            self._conv_integrals[k] = assemble(
+                self._conv_forms[k], tensor=self._conv_integrals[k]
+            )
+            b[:, k] = self._conv_integrals[k].get_local()[self._dofs] / self._area
+        conv_norm = numpy.sqrt(numpy.einsum("ij,ij->i", b, b))
+
+        # Compute the directed diameter of the cell, cf. :cite:`sold2`.
+        #
+        #    diam(cell, s) = 2*||s|| / sum_{nodes n_i} |s.\\grad\\psi|
+        #
+        # where \\psi is the P_1 basis function of n_i. With
+        #
+        #    \\grad\\psi = ortho_edge / edgelength / height
+        #              = ortho_edge / (2*area),
+        #
+        # this is 4 * ||s|| * area / sum_{edges} |s.ortho_edge|.
+        edge_sum = numpy.sum(
+            abs(self._edges[:, :, 1] * b[:, 0] - self._edges[:, :, 0] * b[:, 1]),
+            axis=0,
+        )
+        # Without convection, tau doesn't matter (it's multiplied by b); take
+        # the cell diameter there.
+        is_zero = edge_sum == 0.0
+        h = self._diameter.copy()
+        h[~is_zero] = (
+            4 * conv_norm[~is_zero] * self._area[~is_zero] / edge_sum[~is_zero]
+        )
+
+        p = self.element_degree
+        epsilon = float(self.diffusion)
+        Pe = 0.5 * conv_norm * h / (p * epsilon)
+
+        # We'd like to compute `xi = (1.0/tanh(Pe) - 1.0/Pe) / Pe`. This
+        # expression can hardly be evaluated for small Pe, see
+        # <https://stackoverflow.com/a/43279491/353337>. Hence, use its Taylor
+        # expansion around 0.
+        xi = 1.0 / 3.0 - Pe ** 2 / 45.0 + 2.0 / 945.0 * Pe ** 4
+        is_large = Pe > 1.0e-5
+        Pe_large = Pe[is_large]
+        xi[is_large] = (1.0 / numpy.tanh(Pe_large) - 1.0 / Pe_large) / Pe_large
+
+        tau = numpy.empty(len(self._dofs))
+        tau[self._dofs] = h ** 2 / 4 / epsilon / p * xi
+        self.tau.vector().set_local(tau)
+        self.tau.vector().apply("insert")
+        return
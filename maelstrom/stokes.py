@@ -26,7 +26,11 @@ from . import helpers
 
 # TODO check in depth
 def F(u, p, v, q, f, r, mu, my_dx):
-    mu = Constant(mu)
+    # Keep the viscosity a coefficient so that its value doesn't enter the
+    # form signature, and accept an existing Constant to be updated by
+    # `assign()`.
+    if not isinstance(mu, Constant):
+        mu = Constant(mu)
     # Momentum equation (without the nonlinear Navier term).
     F0 = (
         mu * inner(r * grad(u), grad(v)) * 2 * pi * my_dx
@@ -51,7 +55,7 @@ def F(u, p, v, q, f, r, mu, my_dx):
 
 def stokes_solve(up_out, mu, u_bcs, p_bcs, f, my_dx=dx):
     # Some initial sanity checks.
-    assert mu > 0.0
+    assert float(mu) > 0.0
 
     WP = up_out.function_space()
 
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+#
+from __future__ import print_function
+
+from dolfin import (
+    FunctionSpace,
+    VectorFunctionSpace,
+    UnitSquareMesh,
+    Expression,
+    DirichletBC,
+    Constant,
+    Function,
+    interpolate,
+    errornorm,
+    norm,
+)
+import pytest
+
+from maelstrom import heat
+
+
+def _setup(n=16):
+    mesh = UnitSquareMesh(n, n, "left/right")
+    Q = FunctionSpace(mesh, "CG", 1)
+    W = VectorFunctionSpace(mesh, "CG", 1)
+    conv = interpolate(Constant((1.0, 2.0)), W)
+    bcs = [DirichletBC(Q, 0.0, "on_boundary")]
+    return Q, W, conv, bcs
+
+
+def _heat(Q, conv, bcs, source, stabilization=None):
+    return heat.Heat(
+        Q,
+        kappa=2.0,
+        rho=3.0,
+        cp=5.0,
+        convection=conv,
+        source=source,
+        dirichlet_bcs=bcs,
+        stabilization=stabilization,
+    )
+
+
+def test_update():
+    """Updating a long-lived Heat object must give the same solution as
+    building a new one.
+    """
+    Q, W, conv, bcs = _setup()
+    source = Expression("sin(pi*x[0]) * sin(pi*x[1])", degree=3)
+    prob = _heat(Q, conv, bcs, source)
+    prob.solve_stationary()
+
+    # Change the convection in place.
+    conv.assign(interpolate(Constant((-3.0, 0.5)), W))
+    prob.update(convection=conv)
+    theta1 = prob.solve_stationary()
+
+    theta_ref = _heat(Q, conv, bcs, source).solve_stationary()
+    assert errornorm(theta_ref, theta1) < 1.0e-6 * norm(theta_ref)
+    return
+
+
+def test_update_parameters():
+    """New parameter values are assigned to the Constants in the existing
+    forms; no form is created (and hence compiled) anew.
+    """
+    Q, W, conv, bcs = _setup()
+    source = Expression("sin(pi*x[0]) * sin(pi*x[1])", degree=3)
+    prob = _heat(Q, conv, bcs, source, stabilization="supg")
+    prob.solve_stationary()
+    forms = [prob._a_fixed, prob._L_fixed, prob._a_conv, prob._L_conv]
+
+    prob.update(convection=conv, kappa=4.0, rho=2.0, cp=Constant(7.0))
+    theta1 = prob.solve_stationary()
+    new_forms = [prob._a_fixed, prob._L_fixed, prob._a_conv, prob._L_conv]
+    assert all(f1 is f0 for f0, f1 in zip(forms, new_forms))
+
+    ref = heat.Heat(
+        Q,
+        kappa=4.0,
+        rho=2.0,
+        cp=7.0,
+        convection=conv,
+        source=source,
+        dirichlet_bcs=bcs,
+        stabilization="supg",
+    )
+    theta_ref = ref.solve_stationary()
+    assert errornorm(theta_ref, theta1) < 1.0e-6 * norm(theta_ref)
+
+    # The parameter values don't enter the form signatures: A problem built
+    # with other values has the same compiled forms, i.e., it's a JIT cache
+    # hit.
+    ref_forms = [ref._a_fixed, ref._L_fixed, ref._a_conv, ref._L_conv]
+    for form, ref_form in zip(new_forms, ref_forms):
+        signature = form._compiled_form.signature()
+        assert signature == ref_form._compiled_form.signature()
+
+    # Only numbers and Constants can be assigned.
+    with pytest.raises(ValueError):
+        prob.update(kappa=Expression("1.0 + x[0]", degree=1))
+    return
+
+
+def test_solver_cache():
+    Q, W, conv, bcs = _setup()
+    prob = _heat(Q, conv, bcs, Constant(1.0))
+
+    theta0 = interpolate(Constant(0.0), Q)
+    dt = 1.0e-2
+    b = prob.M * theta0.vector()
+    theta1 = prob.solve_alpha_M_beta_F(1.0, -dt, b, 0.0)
+    assert prob.solver_cache_misses == 1
+    assert prob.solver_cache_hits == 0
+
+    # Same step size: reuse the factorization.
+    theta2 = prob.solve_alpha_M_beta_F(1.0, -dt, b, 0.0)
+    assert prob.solver_cache_misses == 1
+    assert prob.solver_cache_hits == 1
+    assert errornorm(theta1, theta2) < 1.0e-12
+
+    # A new source leaves the operator, and hence the cached solver, intact.
+    prob.update(source=Constant(1.0))
+    prob.solve_alpha_M_beta_F(1.0, -dt, b, 0.0)
+    assert prob.solver_cache_misses == 1
+    assert prob.solver_cache_hits == 2
+
+    # A changed operator invalidates the cached solver.
+    conv.assign(interpolate(Constant((-3.0, 0.5)), W))
+    prob.update(convection=conv)
+    theta3 = prob.solve_alpha_M_beta_F(1.0, -dt, b, 0.0)
+    assert prob.solver_cache_misses == 2
+    theta_ref = _heat(Q, conv, bcs, Constant(1.0)).solve_alpha_M_beta_F(
+        1.0, -dt, b, 0.0
+    )
+    assert errornorm(theta_ref, theta3) < 1.0e-6 * norm(theta_ref)
+    return
+
+
+def test_lu_fallback():
+    """If the Krylov solver fails, all solvers, cached or not, switch to LU.
+    """
+    Q, W, conv, bcs = _setup()
+    prob = heat.Heat(
+        Q,
+        kappa=2.0,
+        rho=3.0,
+        cp=5.0,
+        convection=conv,
+        source=Constant(1.0),
+        dirichlet_bcs=bcs,
+        supg_preconditioner=True,
+    )
+    dt = 1.0e-2
+    b = prob.M * interpolate(Constant(0.0), Q).vector()
+    prob.solve_stationary()
+    prob.solve_alpha_M_beta_F(1.0, -dt, b, 0.0)
+    # Make the Krylov solver of the stationary problem fail.
+    prob._solver_cache[(0.0, 1.0)]["solver"].parameters["maximum_iterations"] = 1
+
+    conv.assign(interpolate(Constant((-3.0, 0.5)), W))
+    prob.update(convection=conv)
+    with pytest.warns(UserWarning):
+        theta1 = prob.solve_stationary()
+    theta2 = prob.solve_alpha_M_beta_F(1.0, -dt, b, 0.0)
+    assert prob.convection_solver == "lu"
+    assert all(entry["kind"] == "lu" for entry in prob._solver_cache.values())
+
+    # The LU entries are refilled after another update.
+    prob.update(convection=conv)
+    theta3 = prob.solve_stationary()
+    assert errornorm(theta1, theta3) < 1.0e-10 * norm(theta1)
+
+    ref = _heat(Q, conv, bcs, Constant(1.0))
+    theta_ref = ref.solve_alpha_M_beta_F(1.0, -dt, b, 0.0)
+    assert errornorm(theta_ref, theta2) < 1.0e-6 * norm(theta_ref)
+    return
+
+
+def test_in_place():
+    Q, W, conv, bcs = _setup()
+    prob = _heat(Q, conv, bcs, Constant(1.0))
+    theta0 = interpolate(Expression("x[0] * x[1]", degree=2), Q)
+    dt = 1.0e-2
+
+    b = prob.eval_alpha_M_beta_F(1.0, -dt, theta0, 0.0)
+    theta1 = prob.solve_alpha_M_beta_F(1.0, -dt, b, 0.0)
+
+    out = prob.b.copy()
+    theta2 = Function(Q)
+    assert prob.eval_alpha_M_beta_F(1.0, -dt, theta0, 0.0, out=out) is out
+    assert (out - b).norm("l2") < 1.0e-12 * b.norm("l2")
+    assert prob.solve_alpha_M_beta_F(1.0, -dt, out, 0.0, out=theta2) is theta2
+    assert errornorm(theta1, theta2) < 1.0e-10 * norm(theta1)
+    return
+
+
+def test_solve_stationary_many():
+    Q, W, conv, bcs = _setup()
+    sources = [
+        Expression("sin(pi*x[0]) * sin(pi*x[1])", degree=3),
+        Expression("x[0] * x[1]", degree=2),
+    ]
+    prob = _heat(Q, conv, bcs, Constant(1.0))
+
+    # Sources as expressions and as functions on the temperature space
+    for srcs in [sources, [interpolate(source, Q) for source in sources]]:
+        thetas = prob.solve_stationary_many(srcs)
+        for source, theta in zip(srcs, thetas):
+            theta_ref = _heat(Q, conv, bcs, source).solve_stationary()
+            assert errornorm(theta_ref, theta) < 1.0e-6 * norm(theta_ref)
+
+    # A zero source gives an empty load form.
+    (theta,) = prob.solve_stationary_many([0])
+    assert norm(theta) < 1.0e-10
+
+    # The solver was set up only once.
+    assert prob.solver_cache_misses == 1
+    return
+
+
+def test_rkc():
+    """For small time steps, RKC and implicit Euler must roughly agree.
+    """
+    mesh = UnitSquareMesh(16, 16, "left/right")
+    Q = FunctionSpace(mesh, "CG", 1)
+    bcs = [DirichletBC(Q, 0.0, "on_boundary")]
+    prob = heat.Heat(
+        Q,
+        kappa=2.0,
+        rho=3.0,
+        cp=5.0,
+        convection=None,
+        source=Constant(1.0),
+        dirichlet_bcs=bcs,
+    )
+    assert prob.spectral_radius() > 0.0
+
+    theta0 = interpolate(Constant(0.0), Q)
+    dt = 1.0e-5
+    stepper = heat.RKC(prob)
+    theta1 = stepper.step(theta0, 0.0, dt)
+    assert stepper.num_stages >= 2
+
+    b = prob.M * theta0.vector()
+    theta_ref = prob.solve_alpha_M_beta_F(1.0, -dt, b, 0.0)
+    assert errornorm(theta_ref, theta1) < 1.0e-2 * norm(theta_ref)
+    return
+
+
+def test_adaptive_implicit_euler():
+    """Adaptive steps must track fixed small steps with far fewer steps.
+    """
+    mesh = UnitSquareMesh(16, 16, "left/right")
+    Q = FunctionSpace(mesh, "CG", 1)
+    bcs = [DirichletBC(Q, 0.0, "on_boundary")]
+    prob = heat.Heat(
+        Q,
+        kappa=2.0,
+        rho=3.0,
+        cp=5.0,
+        convection=None,
+        source=Constant(100.0),
+        dirichlet_bcs=bcs,
+    )
+    theta0 = interpolate(Constant(0.0), Q)
+    t_end = 1.0
+
+    stepper = heat.AdaptiveImplicitEuler(prob, atol=1.0e-3, rtol=1.0e-3)
+    theta1, _ = stepper.integrate(theta0, 0.0, t_end, 1.0e-3)
+
+    num_steps = 200
+    dt = t_end / num_steps
+    theta_ref = interpolate(Constant(0.0), Q)
+    for _ in range(num_steps):
+        b = prob.M * theta_ref.vector()
+        theta_ref.assign(prob.solve_alpha_M_beta_F(1.0, -dt, b, 0.0))
+
+    assert stepper.num_accepted < num_steps
+    assert errornorm(theta_ref, theta1) < 5.0e-2 * norm(theta_ref)
+    return
+
+
+def test_nonlinear_constant_coefficients():
+    """With constant coefficients, the nonlinear solver must reproduce the
+    linear one.
+    """
+    Q, W, conv, bcs = _setup()
+    source = Expression("sin(pi*x[0]) * sin(pi*x[1])", degree=3)
+    prob = heat.NonlinearHeat(
+        Q,
+        kappa=lambda theta: 2.0,
+        rho=3.0,
+        cp=lambda theta: 5.0,
+        convection=conv,
+        source=source,
+        dirichlet_bcs=bcs,
+    )
+    theta = prob.solve_stationary()
+
+    theta_ref = _heat(Q, conv, bcs, source).solve_stationary()
+    assert errornorm(theta_ref, theta) < 1.0e-6 * norm(theta_ref)
+    return
+
+
+def test_nonlinear_jacobian_reuse():
+    mesh = UnitSquareMesh(16, 16, "left/right")
+    Q = FunctionSpace(mesh, "CG", 1)
+    bcs = [DirichletBC(Q, 1.0, "on_boundary")]
+    prob = heat.NonlinearHeat(
+        Q,
+        kappa=lambda theta: 1.0 + theta ** 2,
+        rho=lambda theta: 3.0 - 0.1 * theta,
+        cp=5.0,
+        convection=None,
+        source=Constant(10.0),
+        dirichlet_bcs=bcs,
+    )
+
+    theta = interpolate(Constant(1.0), Q)
+    dt = 1.0e-2
+    for k in range(5):
+        theta.assign(prob.step(theta, k * dt, dt))
+
+    # The Jacobian is reused across iterations and time steps.
+    assert prob.num_jacobian_assemblies < sum(prob.num_iterations)
+    # The source heats up the interior.
+    assert theta.vector().max() > 1.0
+    return
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+#
+from __future__ import print_function
+
+from dolfin import (
+    CellFunction,
+    CompiledSubDomain,
+    Expression,
+    FunctionSpace,
+    SubMesh,
+    UnitSquareMesh,
+    VectorFunctionSpace,
+    interpolate,
+)
+import numpy
+import pytest
+
+from maelstrom.helpers import SubMeshTransfer, dg0_cell_dofs
+
+
+@pytest.mark.parametrize(
+    "space", [("CG", 1, False), ("CG", 2, False), ("DG", 0, False), ("CG", 1, True)]
+)
+def test_submesh_transfer(space):
+    family, degree, is_vector = space
+    mesh = UnitSquareMesh(8, 8)
+    subdomains = CellFunction("size_t", mesh, 0)
+    CompiledSubDomain("x[0] < 0.5 + DOLFIN_EPS").mark(subdomains, 1)
+    submesh = SubMesh(mesh, subdomains, 1)
+
+    if is_vector:
+        V = VectorFunctionSpace(mesh, family, degree)
+        V_submesh = VectorFunctionSpace(submesh, family, degree)
+        f = Expression(("x[0] * x[1]", "x[1] * x[1]"), degree=2)
+    else:
+        V = FunctionSpace(mesh, family, degree)
+        V_submesh = FunctionSpace(submesh, family, degree)
+        f = Expression("x[0] * x[1]", degree=2)
+    transfer = SubMeshTransfer(V, V_submesh)
+
+    # Restriction is exact.
+    f_submesh = transfer.restrict(interpolate(f, V))
+    ref = interpolate(f, V_submesh).vector().get_local()
+    assert numpy.allclose(f_submesh.vector().get_local(), ref)
+
+    # Prolongation, then restriction gives back the original function.
+    g = transfer.prolong(f_submesh)
+    assert numpy.allclose(transfer.restrict(g).vector().get_local(), ref)
+    assert abs(g.vector().sum() - f_submesh.vector().sum()) < 1.0e-12
+    return
+
+
+def test_dg0_cell_dofs():
+    mesh = UnitSquareMesh(8, 8)
+    DG = FunctionSpace(mesh, "DG", 0)
+    dofmap = DG.dofmap()
+    ref = [dofmap.cell_dofs(k)[0] for k in range(mesh.num_cells())]
+    assert numpy.array_equal(dg0_cell_dofs(DG), ref)
+    return
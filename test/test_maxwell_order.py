@@ -28,6 +28,12 @@ from dolfin import (
     FiniteElement,
     sqrt,
     SpatialCoordinate,
+    CompiledSubDomain,
+    RectangleMesh,
+    Point,
+    interpolate,
+    as_backend_type,
+    assemble,
 )
 import matplotlib.pyplot as plt
 import numpy
@@ -133,6 +139,28 @@ def problem_coscos():
     return mesh_generator, solution, rhs, triangle
 
 
+def _xzero(x, on_boundary):
+    return on_boundary and abs(x[0]) < DOLFIN_EPS
+
+
+def _subdomain_problem(nx, markers=(), ny=None):
+    """The unit square with :code:`nx` times :code:`ny` (default: :code:`nx`)
+    cells, subdomains 1, 2, ... marked by the conditions :code:`markers` (in
+    this order), the spaces V and W = V*V, and the Dirichlet conditions at
+    x = 0 on W.
+    """
+    mesh = UnitSquareMesh(nx, nx if ny is None else ny, "left/right")
+    subdomains = MeshFunction("size_t", mesh, mesh.topology().dim())
+    subdomains.set_all(0)
+    for k, marker in enumerate(markers):
+        CompiledSubDomain(marker).mark(subdomains, k + 1)
+    dx = Measure("dx", subdomain_data=subdomains)
+    V = FunctionSpace(mesh, "CG", 1)
+    W = FunctionSpace(mesh, V.ufl_element() * V.ufl_element())
+    bcs = DirichletBC(W, (0.0, 0.0), _xzero)
+    return V, W, dx, bcs
+
+
 def _build_residuals(V, dx, phi, omega, Mu, Sigma, convections, Rhs, rhs_degree):
     r = SpatialCoordinate(V.mesh())[0]
 
@@ -173,11 +201,8 @@ def _build_residuals(V, dx, phi, omega, Mu, Sigma, convections, Rhs, rhs_degree)
     R_i = Function(V)
 
     # TODO don't hard code the boundary conditions like this
-    def xzero(x, on_boundary):
-        return on_boundary and abs(x[0]) < DOLFIN_EPS
-
-    solve(a == r_r, R_r, bcs=DirichletBC(V, 0.0, xzero))
-    solve(a == r_i, R_i, bcs=DirichletBC(V, 0.0, xzero))
+    solve(a == r_r, R_r, bcs=DirichletBC(V, 0.0, _xzero))
+    solve(a == r_i, R_i, bcs=DirichletBC(V, 0.0, _xzero))
 
     # from dolfin import plot, interactive
     # plot(R_r, title='R_r')
@@ -278,6 +303,540 @@ def test_residual(problem):
     return
 
 
+@pytest.mark.parametrize("problem", [problem_coscos])
+def test_recycle(problem):
+    """Initial guesses from previous solutions must not change the solutions,
+    but save iterations for correlated right-hand sides.
+    """
+    mesh_generator, _, f, _ = problem()
+    mesh, dx, _ = mesh_generator(16)
+    V = FunctionSpace(mesh, "CG", 1)
+
+    f_r, f_i = f["value"]
+    f_list = [{0: (f_r, f_i)}, {0: (2 * f_r, 2 * f_i)}, {0: (f_r, 2 * f_i)}]
+    solutions = []
+    for recycle in [False, True]:
+        phi_list, iterations = maxwell.solve(
+            V,
+            dx,
+            Mu={0: 1.0},
+            Sigma={0: 1.0},
+            omega=1.0,
+            f_list=f_list,
+            f_degree=f["degree"],
+            convections={},
+            tol=1.0e-12,
+            recycle=recycle,
+            return_iterations=True,
+        )
+        assert len(iterations) == len(f_list)
+        solutions.append((phi_list, iterations))
+
+    (phi_ref, it_ref), (phi_rec, it_rec) = solutions
+    for phi0, phi1 in zip(phi_ref, phi_rec):
+        assert errornorm(phi0, phi1) < 1.0e-8 * norm(phi0)
+    # The second right-hand side is a multiple of the first.
+    assert it_rec[1] < it_ref[1]
+    assert sum(it_rec) < sum(it_ref)
+    return
+
+
+@pytest.mark.parametrize("problem", [problem_coscos])
+def test_frequency_sweep(problem):
+    """A sweep with one system must give the same results as separate
+    solves.
+    """
+    _, _, f, _ = problem()
+    V, _, dx, bcs = _subdomain_problem(16)
+
+    omegas = [1.0, 10.0]
+    system = maxwell.MaxwellSystem(
+        V,
+        dx,
+        Mu={0: 1.0},
+        Sigma={0: 1.0},
+        f_list=[{0: f["value"]}],
+        f_degree=f["degree"],
+        convections={},
+        bcs=bcs,
+    )
+    phi_sweep = system.solve_at(omegas)
+    for omega, phi_list in zip(omegas, phi_sweep):
+        phi_ref = maxwell.solve(
+            V,
+            dx,
+            Mu={0: 1.0},
+            Sigma={0: 1.0},
+            omega=omega,
+            f_list=[{0: f["value"]}],
+            f_degree=f["degree"],
+            convections={},
+            tol=1.0e-12,
+            bcs=bcs,
+        )
+        assert errornorm(phi_ref[0], phi_list[0]) < 1.0e-8 * norm(phi_ref[0])
+    return
+
+
+def test_ring_loads():
+    """The ring right-hand sides assembled in one pass must equal the
+    separately assembled ones.
+    """
+    V, _, dx, _ = _subdomain_problem(
+        8, ["x[1] > 0.5 - DOLFIN_EPS", "x[0] > 0.5 - DOLFIN_EPS"]
+    )
+    mesh = V.mesh()
+    Mu = {0: 1.0, 1: 2.0, 2: 3.0}
+    Sigma = {0: 1.0, 1: 5.0, 2: 7.0}
+
+    r = SpatialCoordinate(mesh)[0]
+    rings = [1, 2]
+    f_list = [{k: (2.0 * Sigma[k] / (2 * pi * r), Constant(0.0))} for k in rings]
+    system = maxwell.MaxwellSystem(V, dx, Mu, Sigma, f_list, None, {}, None)
+    system.add_ring_loads(rings, 2.0)
+    for b_ref, b in zip(system.b_list[: len(rings)], system.b_list[len(rings) :]):
+        assert (b - b_ref).norm("l2") < 1.0e-12 * b_ref.norm("l2")
+    return
+
+
+def test_voltage_current_matrix():
+    """The current functionals from the one-pass assembly must equal the
+    ring-wise integrals.
+    """
+    mesh = RectangleMesh(Point(0.5, 0.0), Point(1.5, 1.0), 8, 8, "left/right")
+    subdomains = MeshFunction("size_t", mesh, mesh.topology().dim())
+    subdomains.set_all(0)
+    CompiledSubDomain("x[1] > 0.5 - DOLFIN_EPS").mark(subdomains, 1)
+    CompiledSubDomain("x[0] > 1.0 - DOLFIN_EPS").mark(subdomains, 2)
+    dx = Measure("dx", subdomain_data=subdomains)
+    V = FunctionSpace(mesh, "CG", 1)
+    W = FunctionSpace(mesh, V.ufl_element() * V.ufl_element())
+    Sigma = {0: 1.0, 1: 5.0, 2: 7.0}
+    omega = 3.0
+    v_ref = 2.0
+
+    rings = [1, 2]
+    phi = [
+        interpolate(Expression(("x[0] * x[1]", "x[0] + x[1]"), degree=2), W),
+        interpolate(Expression(("sin(x[0])", "x[1] * x[1]"), degree=2), W),
+    ]
+    J = maxwell.get_voltage_current_matrix(phi, rings, dx, Sigma, omega, v_ref)
+
+    r = SpatialCoordinate(mesh)[0]
+    for k, i in enumerate(rings):
+        for j, phi_j in enumerate(phi):
+            ref = (
+                -1j
+                * omega
+                * Sigma[i]
+                * (assemble(phi_j[0] * dx(i)) + 1j * assemble(phi_j[1] * dx(i)))
+            )
+            if j == k:
+                ref += v_ref / (2 * pi) * Sigma[i] * assemble(1.0 / r * dx(i))
+            assert abs(J[k, j] - ref) < 1.0e-12 * abs(ref)
+    return
+
+
+def test_update_materials():
+    """New material values assigned in place must give the same matrices as
+    a new system.
+    """
+    V, _, dx, _ = _subdomain_problem(8, ["x[1] > 0.5 - DOLFIN_EPS"])
+
+    system = maxwell.MaxwellSystem(
+        V, dx, {0: 1.0, 1: 2.0}, {0: 1.0, 1: 5.0}, [], None, {}, None
+    )
+    forms = list(system._forms)
+    system.update_materials(Mu={0: 3.0, 1: 4.0}, Sigma={0: 0.0, 1: 7.0})
+    assert all(f1 is f0 for f0, f1 in zip(forms, system._forms))
+
+    ref = maxwell.MaxwellSystem(
+        V, dx, {0: 3.0, 1: 4.0}, {0: 0.0, 1: 7.0}, [], None, {}, None
+    )
+    for A, A_ref in [(system.K, ref.K), (system.M_sigma, ref.M_sigma)]:
+        A_ref.axpy(-1.0, A, True)
+        assert A_ref.norm("frobenius") < 1.0e-12 * A.norm("frobenius")
+    return
+
+
+@pytest.mark.parametrize("problem", [problem_coscos])
+def test_incremental_update(problem):
+    """Updating sigma in one subdomain and adding a convection must give the
+    same solution as a new system; warm starts must save iterations.
+    """
+    _, _, f, _ = problem()
+    V, _, dx, bcs = _subdomain_problem(16, ["x[1] > 0.5 - DOLFIN_EPS"])
+    f_list = [{0: f["value"], 1: f["value"]}]
+    Mu = {0: 1.0, 1: 1.0}
+
+    system = maxwell.MaxwellSystem(
+        V, dx, Mu, {0: 1.0, 1: 1.0}, f_list, f["degree"], {}, bcs
+    )
+    _, it0 = system.solve_at([10.0], return_iterations=True)[0]
+
+    conv = {1: Constant((0.0, 1.0e-2))}
+    system.update_materials(Sigma={1: 1.05}, subdomain_indices=[1])
+    _, work = system._delta_forms[(1,)]
+    # A second update of the same subdomain reuses the work tensors.
+    system.update_materials(Sigma={1: 1.1}, subdomain_indices=[1])
+    assert all(a is b for a, b in zip(system._delta_forms[(1,)][1], work))
+    system.update_convections(conv)
+    phi, it1 = system.solve_at([10.0], return_iterations=True, warm_start=True)[0]
+
+    ref = maxwell.MaxwellSystem(
+        V, dx, Mu, {0: 1.0, 1: 1.1}, f_list, f["degree"], conv, bcs
+    )
+    phi_ref = ref.solve_at([10.0])[0]
+    assert errornorm(phi_ref[0], phi[0]) < 1.0e-8 * norm(phi_ref[0])
+    assert it1[0] < it0[0]
+    return
+
+
+@pytest.mark.parametrize("problem", [problem_coscos])
+def test_block_amg(problem):
+    """One AMG hierarchy for both diagonal blocks of the preconditioner must
+    give the same solution as BoomerAMG on the full preconditioner.
+    """
+    pytest.importorskip("petsc4py")
+    _, _, f, _ = problem()
+    V, _, dx, bcs = _subdomain_problem(16)
+    system = maxwell.MaxwellSystem(
+        V,
+        dx,
+        Mu={0: 1.0},
+        Sigma={0: 1.0},
+        f_list=[{0: f["value"]}],
+        f_degree=f["degree"],
+        convections={},
+        bcs=bcs,
+    )
+    phi_ref = system.solve_at([10.0], block_amg=False)[0]
+    phi, iterations = system.solve_at([10.0], return_iterations=True)[0]
+    assert iterations[0] < 100
+    assert errornorm(phi_ref[0], phi[0]) < 1.0e-8 * norm(phi_ref[0])
+    return
+
+
+def test_block_amg_dirichlet_rows():
+    """With exact solves for the diagonal blocks, the block preconditioner
+    must be the exact inverse of P, also for vectors which don't vanish on
+    the Dirichlet DOFs.
+    """
+    PETSc = pytest.importorskip("petsc4py.PETSc")
+    V, W, dx, bcs = _subdomain_problem(8)
+    system = maxwell.MaxwellSystem(V, dx, {0: 1.0}, {0: 1.0}, [], None, {}, bcs)
+    _, P = system.assemble_at(10.0)
+
+    bc_dofs = list(bcs.get_boundary_values().keys())
+    context = maxwell._BlockAMG(P, maxwell._complex_dofs(V, W), bc_dofs)
+    context._amg.setType("lu")
+    context._amg.setUp()
+
+    P = as_backend_type(P).mat()
+    x = P.createVecLeft()
+    x.setArray(numpy.random.RandomState(0).rand(W.dim()))
+    y = P.createVecLeft()
+    context.apply(None, x, y)
+
+    ksp = PETSc.KSP().create(P.getComm())
+    ksp.setType("preonly")
+    ksp.getPC().setType("lu")
+    ksp.setOperators(P)
+    y_ref = P.createVecLeft()
+    ksp.solve(x, y_ref)
+    y_ref.axpy(-1.0, y)
+    assert y_ref.norm() < 1.0e-10 * y.norm()
+    return
+
+
+@pytest.mark.parametrize("problem", [problem_coscos])
+@pytest.mark.parametrize("convection", [None, (0.0, 1.0e-1)])
+def test_complex_backend(problem, convection):
+    """The complex-valued formulation must reproduce the real block
+    formulation, with COCG for the symmetric and GMRES for the convective
+    system.
+    """
+    pytest.importorskip("scipy")
+    mesh_generator, _, f, _ = problem()
+    mesh, dx, _ = mesh_generator(16)
+    V = FunctionSpace(mesh, "CG", 1)
+    convections = {} if convection is None else {0: Constant(convection)}
+
+    solutions = []
+    for backend in ["petsc", "scipy"]:
+        phi_list, iterations = maxwell.solve(
+            V,
+            dx,
+            Mu={0: 1.0},
+            Sigma={0: 1.0},
+            omega=10.0,
+            f_list=[{0: f["value"]}],
+            f_degree=f["degree"],
+            convections=convections,
+            tol=1.0e-12,
+            return_iterations=True,
+            backend=backend,
+        )
+        assert len(iterations) == 1
+        solutions.append(phi_list[0])
+
+    phi_ref, phi = solutions
+    assert errornorm(phi_ref, phi) < 1.0e-8 * norm(phi_ref)
+    return
+
+
+@pytest.mark.parametrize("problem", [problem_coscos])
+def test_dc(problem):
+    """For omega=0, the scalar magnetostatic solve must reproduce the block
+    formulation, and a zero imaginary source must give a zero imaginary part.
+    """
+    mesh_generator, _, f, _ = problem()
+    mesh, dx, _ = mesh_generator(16)
+    V = FunctionSpace(mesh, "CG", 1)
+
+    f_r, f_i = f["value"]
+    f_list = [{0: (f_r, f_i)}, {0: (f_r, Constant(0.0))}]
+    phi_list, iterations = maxwell.solve(
+        V,
+        dx,
+        Mu={0: 1.0},
+        Sigma={0: 1.0},
+        omega=0.0,
+        f_list=f_list,
+        f_degree=f["degree"],
+        convections={},
+        tol=1.0e-12,
+        return_iterations=True,
+    )
+    assert len(iterations) == len(f_list)
+    # Only the real part is solved for and stored.
+    assert iterations[1] < iterations[0]
+    assert not phi_list[0].is_real
+    assert phi_list[1].is_real
+    assert phi_list[1].imag is None
+
+    system = maxwell.MaxwellSystem(
+        V,
+        dx,
+        Mu={0: 1.0},
+        Sigma={0: 1.0},
+        f_list=f_list,
+        f_degree=f["degree"],
+        convections={},
+        bcs=maxwell._axis_bcs(V),
+    )
+    phi_ref = system.solve_at([0.0])[0]
+    for phi0, phi1 in zip(phi_ref, phi_list):
+        for k in range(2):
+            part = phi0.sub(k, deepcopy=True)
+            if k == 1 and phi1.is_real:
+                assert norm(part) < 1.0e-8 * norm(phi0)
+            else:
+                assert errornorm(part, phi1[k]) < 1.0e-8 * norm(phi0)
+
+    # The Joule heat can be computed from the real potentials, too.
+    joule = maxwell.compute_joule(phi_list[1], {}, 1.0, {0: 1.0}, {0: 1.0}, [0])
+    assert assemble(joule[0] * dx(0)) > 0.0
+    return
+
+
+def test_complex_solvers_nonconvergence():
+    """Without convergence within maxiter iterations, the complex solvers must
+    raise like PETScKrylovSolver does.
+    """
+    scipy_sparse = pytest.importorskip("scipy.sparse")
+    n = 50
+    A = scipy_sparse.diags(
+        numpy.linspace(1.0, 1.0e3, n) + 1.0j * numpy.linspace(0.0, 1.0, n)
+    ).tocsr()
+    b = numpy.ones(n, dtype=complex)
+    x0 = numpy.zeros(n, dtype=complex)
+
+    def identity(x):
+        return x
+
+    # _gmres must pass its tolerance in the keyword of the installed SciPy.
+    for method in [maxwell._cocg, maxwell._gmres]:
+        x, num_steps = method(A, b, x0, identity, 1.0e-10, n)
+        assert 0 < num_steps <= n
+        assert numpy.linalg.norm(A * x - b) < 1.0e-8 * numpy.linalg.norm(b)
+        with pytest.raises(RuntimeError):
+            method(A, b, x0, identity, 1.0e-10, 2)
+    return
+
+
+def _impedance_problem(n):
+    """The conductor x > 0.5 (sigma = 5e3, skin depth 0.02 at omega=1) as
+    impedance boundary at x = 0.5.
+    """
+    mesh = RectangleMesh(Point(0.0, 0.0), Point(0.5, 1.0), n // 2, n // 10)
+    boundaries = MeshFunction("size_t", mesh, mesh.topology().dim() - 1)
+    boundaries.set_all(0)
+    CompiledSubDomain("on_boundary && x[0] > 0.5 - DOLFIN_EPS").mark(boundaries, 1)
+    subdomains = MeshFunction("size_t", mesh, mesh.topology().dim())
+    subdomains.set_all(0)
+    dx = Measure("dx", subdomain_data=subdomains)
+    ds = Measure("ds", subdomain_data=boundaries)
+    return mesh, dx, ds, {1: (1.0, 5.0e3)}
+
+
+def test_impedance():
+    """The impedance condition must reproduce the solution in front of a
+    conductor whose skin layer is resolved by the mesh.
+    """
+    n = 400
+    f_list = [{0: (Constant(1.0), Constant(0.0))}]
+
+    # Conductor in the mesh
+    V, _, dx, _ = _subdomain_problem(n, ["x[0] > 0.5 - DOLFIN_EPS"], ny=n // 10)
+    phi_ref = maxwell.solve(
+        V,
+        dx,
+        Mu={0: 1.0, 1: 1.0},
+        Sigma={0: 0.0, 1: 5.0e3},
+        omega=1.0,
+        f_list=f_list,
+        convections={},
+    )[0]
+
+    # Conductor as impedance boundary
+    mesh, dx, ds, impedance = _impedance_problem(n)
+    V = FunctionSpace(mesh, "CG", 1)
+    phi = maxwell.solve(
+        V,
+        dx,
+        Mu={0: 1.0},
+        Sigma={0: 0.0},
+        omega=1.0,
+        f_list=f_list,
+        convections={},
+        ds=ds,
+        impedance=impedance,
+    )[0]
+
+    # The mesh vertices coincide for x < 0.5.
+    phi_ref = interpolate(phi_ref, phi.function_space())
+    assert errornorm(phi_ref, phi) < 5.0e-2 * norm(phi)
+    return
+
+
+def test_impedance_complex_backend():
+    pytest.importorskip("scipy")
+    mesh, dx, ds, impedance = _impedance_problem(40)
+    V = FunctionSpace(mesh, "CG", 1)
+    solutions = []
+    for backend in ["petsc", "scipy"]:
+        solutions.append(
+            maxwell.solve(
+                V,
+                dx,
+                Mu={0: 1.0},
+                Sigma={0: 1.0},
+                omega=10.0,
+                f_list=[{0: (Constant(1.0), Constant(0.0))}],
+                convections={},
+                backend=backend,
+                ds=ds,
+                impedance=impedance,
+            )[0]
+        )
+    phi_ref, phi = solutions
+    assert errornorm(phi_ref, phi) < 1.0e-8 * norm(phi_ref)
+    return
+
+
+def test_impedance_dc():
+    """Impedance conditions are undefined for omega=0; the coil-ring loads
+    and currents must raise instead of dividing by zero.
+    """
+    mesh, dx, ds, impedance = _impedance_problem(40)
+    V = FunctionSpace(mesh, "CG", 1)
+    system = maxwell.MaxwellSystem(
+        V,
+        dx,
+        {0: 1.0},
+        {0: 0.0},
+        [],
+        None,
+        {},
+        maxwell._axis_bcs(V),
+        ds=ds,
+        impedance=impedance,
+    )
+    with pytest.raises(ValueError):
+        system.add_surface_ring_loads([1], 1.0, 0.0)
+    assert not system.b_list
+
+    system.add_surface_ring_loads([1], 1.0, 1.0)
+    phi_list = system.solve_at([1.0])[0]
+    with pytest.raises(ValueError):
+        maxwell.get_surface_voltage_current_matrix(
+            phi_list, [1], ds, impedance, 0.0, 1.0
+        )
+    return
+
+
+@pytest.mark.parametrize("problem", [problem_coscos])
+def test_adapt(problem):
+    """Adaptive refinement must reduce the error with fewer cells than
+    uniform refinement, with an estimate that decreases with each level.
+    """
+    mesh_generator, solution, f, cell_type = problem()
+    sol = Expression(
+        (helpers.ccode(solution["value"][0]), helpers.ccode(solution["value"][1])),
+        degree=MAX_DEGREE,
+        cell=cell_type,
+    )
+    mesh, dx, _ = mesh_generator(8)
+    f_list = [{0: f["value"]}]
+
+    # Since adapt() is deterministic, the runs with fewer levels give the
+    # intermediate levels of the longest one.
+    estimates = []
+    for max_levels in range(4):
+        phi_list, subdomains = maxwell.adapt(
+            dx.subdomain_data(),
+            Mu={0: 1.0},
+            Sigma={0: 1.0},
+            omega=1.0,
+            f_list=f_list,
+            convections={},
+            f_degree=f["degree"],
+            tol=0.0,
+            max_levels=max_levels,
+            verbose=False,
+        )
+        eta2 = maxwell.error_indicators(
+            phi_list[0], f_list[0], f["degree"], subdomains, {0: 1.0}, {0: 1.0}, 1.0, {}
+        )
+        estimates.append(numpy.sqrt(numpy.sum(eta2)))
+    assert all(e1 < e0 for e0, e1 in zip(estimates, estimates[1:]))
+
+    # Uniform refinement would give 4**3 times as many cells.
+    num_cells = subdomains.mesh().num_cells()
+    assert mesh.num_cells() < num_cells < 4 ** 3 * mesh.num_cells()
+
+    errors, _ = _compute_errors(problem, [8])
+    assert errornorm(sol, phi_list[0]) < errors[0]
+    return
+
+
+def test_doerfler_marking():
+    """The marked cells must carry at least the fraction theta of the
+    estimate, and no smaller set of cells must do so.
+    """
+    mesh = UnitSquareMesh(8, 8)
+    eta2 = numpy.random.RandomState(0).rand(mesh.num_cells())
+    for theta in [0.1, 0.5, 0.9]:
+        markers = maxwell.doerfler_marking(mesh, eta2, theta)
+        is_marked = markers.array().astype(bool)
+        assert numpy.sum(eta2[is_marked]) >= theta * numpy.sum(eta2)
+        # Dropping the smallest marked indicator falls short of theta.
+        smallest = numpy.min(eta2[is_marked])
+        assert numpy.sum(eta2[is_marked]) - smallest < theta * numpy.sum(eta2)
+    return
+
+
 @pytest.mark.parametrize("problem", [problem_coscos])
 def test_order(problem):
     """Assert the correct discretization order.